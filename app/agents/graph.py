@@ -1,10 +1,29 @@
-from typing import TypedDict, List, Dict, Any
+from typing import TypedDict, List, Dict, Any, Optional, Annotated
+import asyncio
 import json
-from utils.helpers import safe_load_json
-from utils.prompts import MCQ_GENERATOR_PROMPT, EVALUATOR_PROMPT
-from langgraph.graph import StateGraph, END
+import logging
+import math
+from utils.prompts import MCQ_GENERATOR_PROMPT, EVALUATOR_PROMPT, MCQ_SHARD_HINT, MCQ_AVOID_HINT
+from langgraph.config import get_stream_writer
+from langgraph.graph import StateGraph, START, END
+from langgraph.types import Send
 from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
+from app.core.config import settings
+from app.core.observability import record_llm_call, record_llm_usage, span
+from app.core.structured import chat_response_format, parse_reply
+from app.schemas.llm import QuestionBatch, QuestionEvaluation
 from app.services.llm_service import LLMService
+from app.services.question_bank import filter_near_duplicates
+
+logger = logging.getLogger(__name__)
+
+
+def _accumulate(existing: Optional[List[Any]], new: Optional[List[Any]]) -> List[Any]:
+    # parallel shards append to the same channel; an explicit None resets it between rounds
+    if new is None:
+        return []
+    return (existing or []) + new
 
 
 class AgentState(TypedDict):
@@ -16,107 +35,239 @@ class AgentState(TypedDict):
     passed: bool
     target: int
     valid_questions: List[str]
+    # per-round outputs of the parallel shards, merged by collect_node
+    candidates: Annotated[List[str], _accumulate]
+    evaluations: Annotated[List[Dict[str, Any]], _accumulate]
+
+
+class ShardState(TypedDict):
+    query: str
+    context: str
+    count: int
+    shard_number: int
+    shard_total: int
+    accepted: List[str]
+
+
+class Admission:
+    """The questions one run has accepted so far, shared by its shards through the run config
+    (``{"configurable": {"admission": ...}}``).
+
+    Shards admit each candidate as soon as its evaluation passes, so the duplicate checks and the
+    target cap apply in the order questions are accepted, and collect_node reports this list
+    instead of re-deciding the round.
+    """
+
+    def __init__(self, accepted: List[str], target: int):
+        self.accepted = list(accepted)
+        self.target = target
+        # embeddings of ``accepted``, filled on the first near-duplicate check
+        self.vectors: Optional[List[List[float]]] = None
+        self.lock = asyncio.Lock()
+
+    @property
+    def full(self) -> bool:
+        return len(self.accepted) >= self.target
+
+
+def _admission(config: Optional[RunnableConfig]) -> Optional[Admission]:
+    return ((config or {}).get("configurable") or {}).get("admission")
+
 
 class QuestionAgents:
-    def __init__(self):
-        self.llm_service = LLMService()
+    def __init__(self, llm_service: Optional[LLMService] = None, embeddings=None):
+        self.llm_service = llm_service or LLMService()
         self.llm = self.llm_service.get_agent_llm()
-    def _extract_json_list(self, text: str) -> List[str]:
-        parsed = safe_load_json(text)
-        if isinstance(parsed, list):
-            return parsed
-        if isinstance(parsed, dict):
-            for v in parsed.values():
-                if isinstance(v, list):
-                    return v
-        items = [line.strip() for line in text.split("\n\n") if line.strip()]
-        return items
-
-    def generator_node(self, state: AgentState):
-        context = state["context"]
-        query = state["query"]
-        target = state.get("target", 1)
-        valid = state.get("valid_questions", []) or []
-        remaining = max(0, target - len(valid))
-        if remaining <= 0:
-            return {
-                "questions": [],
-                "iterations": state.get("iterations", 0)
-            }
-        print(f"Generating {remaining} questions. Context length: {len(context)}")
-        # format the centralized generator prompt
-        prompt = MCQ_GENERATOR_PROMPT.format(remaining=remaining, context=context, query=query)
-        response = self.llm.invoke([
+        # optional; when set, paraphrased duplicates are rejected by embedding similarity
+        self.embeddings = embeddings
+
+    async def _drop_near_duplicates(self, candidates: List[str], accepted: List[str]) -> List[str]:
+        if self.embeddings is None or not candidates:
+            return candidates
+        vectors = await self.embeddings.aembed_documents(accepted + candidates)
+        kept = filter_near_duplicates(vectors[len(accepted):], vectors[:len(accepted)])
+        return [candidates[i] for i in kept]
+
+    async def admit(self, admission: Admission, question: str) -> bool:
+        """Accept ``question`` unless the target is met or it repeats an accepted question."""
+        if admission.full or question in admission.accepted:
+            return False
+        if self.embeddings is not None:
+            async with admission.lock:
+                if admission.vectors is None:
+                    admission.vectors = await self.embeddings.aembed_documents(admission.accepted) if admission.accepted else []
+            vector = (await self.embeddings.aembed_documents([question]))[0]
+            # nothing below awaits, so concurrent shards can't both pass the checks for one slot
+            if admission.full or question in admission.accepted:
+                return False
+            if not filter_near_duplicates([vector], admission.vectors):
+                return False
+            admission.vectors.append(vector)
+        admission.accepted.append(question)
+        return True
+
+    async def _call(self, operation: str, messages, schema=None):
+        response_format = chat_response_format(schema) if schema is not None else None
+        options = {"response_format": response_format} if response_format else {}
+        with span(operation):
+            try:
+                response = await self.llm.ainvoke(messages, **options)
+            except Exception:
+                record_llm_call(self.llm_service.model_name, operation, "error")
+                raise
+        usage = getattr(response, "usage_metadata", None) or {}
+        record_llm_usage(
+            self.llm_service.model_name,
+            operation,
+            prompt_tokens=usage.get("input_tokens", 0),
+            completion_tokens=usage.get("output_tokens", 0),
+            cached_tokens=(usage.get("input_token_details") or {}).get("cache_read", 0),
+        )
+        return response
+
+    async def _generate(self, state: ShardState) -> List[str]:
+        prompt = MCQ_GENERATOR_PROMPT.format(remaining=state["count"], context=state["context"], query=state["query"])
+        if state["shard_total"] > 1:
+            prompt += MCQ_SHARD_HINT.format(shard_number=state["shard_number"], shard_total=state["shard_total"])
+        if state["accepted"]:
+            prompt += MCQ_AVOID_HINT.format(accepted_json=json.dumps(state["accepted"]))
+        response = await self._call("generator", [
             SystemMessage(content="You generate high-quality MCQ assessment questions based on provided context."),
             HumanMessage(content=prompt)
-        ])
+        ], QuestionBatch)
+        parsed = parse_reply(response.content, QuestionBatch)
+        return parsed.questions if parsed is not None else []
+
+    async def _evaluate(self, context: str, question: str) -> Dict[str, Any]:
+        prompt = EVALUATOR_PROMPT.format(context=context, questions_json=json.dumps([question]))
+        response = await self._call("evaluator", [
+            SystemMessage(content="You are a strict quality controller for educational content."),
+            HumanMessage(content=prompt)
+        ], QuestionEvaluation)
+        parsed = parse_reply(response.content, QuestionEvaluation)
+        if parsed is None:
+            # an unreadable verdict doesn't pass the question
+            return {"question": question, "passed": False, "evaluation": response.content}
+        return {"question": question, "passed": bool(parsed.passed_questions), "evaluation": parsed.evaluation or response.content}
 
-        questions = self._extract_json_list(response.content)
+    async def shard_node(self, state: ShardState, config: RunnableConfig):
+        """Generate one slice of the remaining questions and evaluate each candidate on its own.
+
+        Shards run in parallel, and within a shard the per-question evaluator calls run
+        concurrently as soon as that shard's candidates arrive. With an ``Admission`` in the run
+        config, each candidate is admitted as soon as it passes and written to the custom stream
+        as ``{"question": ...}``.
+        """
+        admission = _admission(config)
+        write = get_stream_writer()
+        try:
+            questions = await self._generate(state)
+        except Exception as e:
+            logger.warning(
+                "Generator shard failed",
+                extra={"shard": state["shard_number"], "shards": state["shard_total"], "error": str(e)},
+            )
+            questions = []
+        logger.debug(
+            "Shard generated candidates",
+            extra={"shard": state["shard_number"], "shards": state["shard_total"], "candidates": len(questions)},
+        )
+
+        async def judge(question: str) -> Dict[str, Any]:
+            result = await self._evaluate(state["context"], question)
+            if result["passed"] and admission is not None and await self.admit(admission, question):
+                write({"question": question})
+            return result
+
+        results = await asyncio.gather(*(judge(q) for q in questions), return_exceptions=True)
+        evaluations = [r for r in results if isinstance(r, dict)]
         return {
-            "questions": questions,
-            "iterations": state.get("iterations", 0) + 1
+            "candidates": [r["question"] for r in evaluations if r["passed"]],
+            # always report the shard so a round with no candidates still counts as an iteration
+            "evaluations": evaluations or [{"question": None, "passed": False, "evaluation": "No candidates generated."}],
         }
 
-    def evaluator_node(self, state: AgentState):
-        questions = state.get("questions", []) or []
-        context = state["context"]
+    async def collect_node(self, state: AgentState, config: RunnableConfig):
         target = state.get("target", 1)
-        valid_acc = state.get("valid_questions", []) or []
+        valid_acc = list(state.get("valid_questions", []) or [])
+        evaluations = state.get("evaluations", []) or []
+        iterations = state.get("iterations", 0) + (1 if evaluations else 0)
 
-        # format the centralized evaluator prompt
-        prompt = EVALUATOR_PROMPT.format(context=context, questions_json=json.dumps(questions))
-        response = self.llm.invoke([
-            SystemMessage(content="You are a strict quality controller for educational content."),
-            HumanMessage(content=prompt)
-        ])
-
-        passed_questions = []
-        evaluation_text = response.content
-        parsed = safe_load_json(response.content)
-        if isinstance(parsed, dict):
-            passed_questions = parsed.get("passed_questions", []) or []
-            evaluation_text = parsed.get("evaluation", response.content)
-        elif isinstance(parsed, list):
-            passed_questions = parsed
+        admission = _admission(config)
+        if admission is not None:
+            # the shards already admitted this round's candidates as they passed
+            valid_acc = list(admission.accepted)
         else:
-            if response.content.strip().startswith("PASSED"):
-                passed_questions = questions
-
-        new_added = []
-        for q in passed_questions:
-            if q not in valid_acc:
+            candidates = []
+            for q in state.get("candidates", []) or []:
+                if q not in valid_acc and q not in candidates:
+                    candidates.append(q)
+            for q in await self._drop_near_duplicates(candidates, valid_acc):
+                if len(valid_acc) >= target:
+                    break
                 valid_acc.append(q)
-                new_added.append(q)
 
-        passed_flag = len(valid_acc) >= target
+        evaluated = [e for e in evaluations if e.get("question")]
+        evaluation_text = state.get("evaluation", "")
+        if evaluations:
+            accepted = sum(1 for e in evaluated if e["passed"])
+            notes = [str(e["evaluation"]) for e in evaluated if not e["passed"] and e.get("evaluation")]
+            evaluation_text = f"Round {iterations}: {accepted} of {len(evaluated)} candidates passed evaluation."
+            if notes:
+                evaluation_text += "\n" + "\n".join(notes)
 
         return {
             "evaluation": evaluation_text,
-            "passed": passed_flag,
+            "passed": len(valid_acc) >= target,
             "valid_questions": valid_acc,
             "questions": [],
-            "iterations": state.get("iterations", 0)
+            "iterations": iterations,
+            "candidates": None,
+            "evaluations": None,
         }
 
+
+def plan_shards(remaining: int) -> List[int]:
+    """Split ``remaining`` questions (plus oversampling) into per-shard counts for one round."""
+    if remaining <= 0:
+        return []
+    to_generate = math.ceil(remaining * max(1.0, settings.GENERATION_OVERSAMPLE))
+    fanout = max(1, settings.GENERATION_MAX_FANOUT)
+    shard_size = max(1, settings.GENERATION_SHARD_SIZE, math.ceil(to_generate / fanout))
+    shards = math.ceil(to_generate / shard_size)
+    base, extra = divmod(to_generate, shards)
+    return [base + (1 if i < extra else 0) for i in range(shards)]
+
+
 def should_continue(state: AgentState):
     target = state.get("target", 1)
     valid = state.get("valid_questions", []) or []
     iterations = state.get("iterations", 0)
-    MAX_ITER = 10
-    if len(valid) >= target or iterations >= MAX_ITER:
-        state["passed"] = len(valid) >= target
+    if len(valid) >= target or iterations >= settings.MAX_ITERATIONS:
         return END
-    return "generator"
+    counts = plan_shards(target - len(valid))
+    return [
+        Send("shard", {
+            "query": state["query"],
+            "context": state["context"],
+            "count": count,
+            "shard_number": i + 1,
+            "shard_total": len(counts),
+            "accepted": valid,
+        })
+        for i, count in enumerate(counts)
+    ]
 
-def create_graph():
-    agents = QuestionAgents()
+def create_graph(agents: Optional[QuestionAgents] = None):
+    agents = agents or QuestionAgents()
     workflow = StateGraph(AgentState)
-    
-    workflow.add_node("generator", agents.generator_node)
-    workflow.add_node("evaluator", agents.evaluator_node)
-    
-    workflow.set_entry_point("generator")
-    workflow.add_edge("generator", "evaluator")
-    workflow.add_conditional_edges("evaluator", should_continue)
-    
+
+    workflow.add_node("shard", agents.shard_node)
+    workflow.add_node("collect", agents.collect_node)
+
+    # collect runs first so a request already satisfied (e.g. from the question bank) ends immediately
+    workflow.add_edge(START, "collect")
+    workflow.add_edge("shard", "collect")
+    workflow.add_conditional_edges("collect", should_continue, ["shard", END])
+
     return workflow.compile()
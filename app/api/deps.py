@@ -0,0 +1,14 @@
+from fastapi import Request
+from app.core.registry import ClientRegistry
+
+
+def get_registry(request: Request) -> ClientRegistry:
+    return request.app.state.registry
+
+
+def get_job_manager(request: Request):
+    return get_registry(request).job_manager
+
+
+def get_question_service(request: Request):
+    return get_registry(request).question_service
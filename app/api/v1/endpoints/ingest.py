@@ -1,25 +1,69 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from app.services.ingest_service import IngestService
-from app.schemas.ingest import IngestResponse
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request, Depends
+from fastapi.concurrency import run_in_threadpool
+from app.api.deps import get_job_manager
+from app.schemas.ingest import IngestJobResponse, IngestJobStatus
+from typing import List, Optional
+from app.core.config import settings
+import tempfile
 import shutil
 import os
 
 router = APIRouter()
-ingest_service = IngestService()
 
-@router.post("/", response_model=IngestResponse)
-async def ingest_pdf(file: UploadFile = File(...)):
+
+def _save_upload(file: UploadFile) -> str:
+    # UploadFile is already spooled; copy it in bounded chunks to a uniquely named temp file
+    with tempfile.NamedTemporaryFile(
+        prefix="ingest_", suffix=".pdf", dir=settings.INGEST_UPLOAD_DIR, delete=False
+    ) as buffer:
+        try:
+            shutil.copyfileobj(file.file, buffer, length=1024 * 1024)
+        except Exception:
+            buffer.close()
+            os.remove(buffer.name)
+            raise
+        return buffer.name
+
+
+@router.post("/", response_model=IngestJobResponse, status_code=202)
+async def ingest_pdf(
+    request: Request,
+    file: UploadFile = File(...),
+    source: Optional[str] = Form(None),
+    replace: bool = Form(False),
+    job_manager=Depends(get_job_manager),
+):
     if not file.filename.endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
-    
-    temp_file = f"temp_{file.filename}"
-    with open(temp_file, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+
     try:
-        toc = ingest_service.process_pdf_simple_v2(temp_file)
-        return IngestResponse(message="PDF ingested successfully", table_of_contents=toc)
+        temp_file = await run_in_threadpool(_save_upload, file)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
+    job = job_manager.submit(temp_file, file.filename, source=source.strip() if source and source.strip() else None, replace=replace)
+    return IngestJobResponse(
+        job_id=job.id,
+        status=job.status,
+        status_url=str(request.url_for("get_ingest_job", job_id=job.id)),
+    )
+
+
+@router.get("/jobs", response_model=List[IngestJobStatus])
+async def list_ingest_jobs(job_manager=Depends(get_job_manager)):
+    return [IngestJobStatus(**job.to_dict()) for job in job_manager.list()]
+
+
+@router.get("/jobs/{job_id}", response_model=IngestJobStatus)
+async def get_ingest_job(job_id: str, job_manager=Depends(get_job_manager)):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Ingest job not found")
+    return IngestJobStatus(**job.to_dict())
+
+
+@router.delete("/jobs/{job_id}", response_model=IngestJobStatus)
+async def cancel_ingest_job(job_id: str, job_manager=Depends(get_job_manager)):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Ingest job not found")
+    return IngestJobStatus(**job.to_dict())
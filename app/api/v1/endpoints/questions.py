@@ -1,23 +1,93 @@
-from fastapi import APIRouter, HTTPException
-from app.services.questions_service import QuestionService
-from app.schemas.questions import QuestionRequest, QuestionResponse
+import json
+import logging
+import time
+from typing import Any, AsyncIterator, Dict
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+from app.api.deps import get_question_service, get_registry
+from app.core.observability import Usage, track_usage
+from app.schemas.questions import QuestionRequest, QuestionResponse, SemanticCacheStats
 
 router = APIRouter()
-question_service = QuestionService()
+logger = logging.getLogger(__name__)
 
 
-@router.post("/", response_model=QuestionResponse)
-async def generate_questions(request: QuestionRequest):
+def _validate_query(request: QuestionRequest):
     if not request.query or len(request.query) > 250:
         raise HTTPException(status_code=400, detail="Query too long; please enter a shorter query (max 250 characters).")
 
-    try:
-        result = await question_service.generate_questions(request.query, request.num_questions)
-        return QuestionResponse(
-            questions=result.get("questions", []),
-            evaluation=result.get("evaluation", ""),
-            iterations=result.get("iterations", 0),
-            passed=result.get("passed", False)
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+
+def _to_response(result: Dict[str, Any]) -> QuestionResponse:
+    return QuestionResponse(
+        questions=result.get("questions", []),
+        evaluation=result.get("evaluation", ""),
+        iterations=result.get("iterations", 0),
+        passed=result.get("passed", False),
+        cached=result.get("cached", False),
+    )
+
+
+def _log_request(operation: str, request: QuestionRequest, usage: Usage, started: float, result: Dict[str, Any]):
+    logger.info("Question request finished", extra={
+        "operation": operation,
+        "num_questions": request.num_questions,
+        "returned": len(result.get("questions", [])),
+        "cached": result.get("cached", False),
+        "elapsed_s": round(time.perf_counter() - started, 3),
+        **usage.as_fields(),
+    })
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/", response_model=QuestionResponse)
+async def generate_questions(request: QuestionRequest, question_service=Depends(get_question_service)):
+    _validate_query(request)
+
+    started = time.perf_counter()
+    with track_usage("generate_questions") as usage:
+        try:
+            result = await question_service.generate_questions(request.query, request.num_questions, request.filters())
+        except Exception as e:
+            logger.exception("Question generation failed")
+            raise HTTPException(status_code=500, detail=str(e))
+    _log_request("generate_questions", request, usage, started, result)
+    return _to_response(result)
+
+
+@router.post("/stream")
+async def stream_questions(request: QuestionRequest, question_service=Depends(get_question_service)):
+    """Server-Sent Events version of ``POST /``.
+
+    Emits ``question`` events as questions pass evaluation, ``progress`` events per round and a
+    final ``summary`` event with the same body as ``POST /``. Failures after the stream has started
+    are reported as an ``error`` event.
+    """
+    _validate_query(request)
+
+    async def events() -> AsyncIterator[str]:
+        started = time.perf_counter()
+        with track_usage("stream_questions") as usage:
+            try:
+                async for event, data in question_service.stream_questions(request.query, request.num_questions, request.filters()):
+                    if event == "summary":
+                        _log_request("stream_questions", request, usage, started, data)
+                        data = _to_response(data).model_dump()
+                    yield _sse(event, data)
+            except Exception as e:
+                logger.exception("Question stream failed")
+                yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # keep proxies from buffering the stream, which would defeat the early events
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/cache/stats", response_model=SemanticCacheStats)
+async def semantic_cache_stats(registry=Depends(get_registry)):
+    return SemanticCacheStats(**registry.semantic_cache.stats())
@@ -0,0 +1,139 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Union
+
+
+def make_cache_key(*parts: Union[str, bytes, float, int, None]) -> str:
+    """Build a stable sha256 key from heterogeneous parts.
+
+    Each part is length-prefixed so ("ab", "c") and ("a", "bc") never collide.
+    """
+    h = hashlib.sha256()
+    for part in parts:
+        if part is None:
+            data = b"\x00"
+        elif isinstance(part, bytes):
+            data = part
+        else:
+            data = str(part).encode("utf-8")
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+class SQLiteCache:
+    """Small disk-backed key/value cache shared by every process pointing at the same file.
+
+    Uses WAL mode and a busy timeout so several uvicorn workers can read and write
+    concurrently. Entries expire after ``ttl_seconds`` and the least recently used
+    entries are evicted once a namespace grows past ``max_entries``.
+    """
+
+    _EVICT_EVERY = 256
+
+    def __init__(self, path: str, namespace: str, ttl_seconds: Optional[int] = None, max_entries: Optional[int] = None):
+        self.path = path
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " namespace TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " value BLOB NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_lru ON cache (namespace, accessed_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite connections may not cross threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str, touch: bool = True) -> Optional[bytes]:
+        """The value stored under ``key``; ``touch=False`` skips the LRU write, for hot reads of
+        small values that eviction never needs to keep."""
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT value, created_at FROM cache WHERE namespace = ? AND key = ?",
+            (self.namespace, key),
+        ).fetchone()
+        now = time.time()
+        if row is None:
+            self.misses += 1
+            return None
+        value, created_at = row
+        if self.ttl_seconds and now - created_at > self.ttl_seconds:
+            conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+            self.misses += 1
+            return None
+        if touch:
+            conn.execute(
+                "UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key),
+            )
+        self.hits += 1
+        return bytes(value)
+
+    def set(self, key: str, value: bytes) -> None:
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (namespace, key, value, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (self.namespace, key, sqlite3.Binary(value), now, now),
+        )
+        self._writes += 1
+        if self._writes % self._EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop expired entries and trim the namespace to ``max_entries``; returns rows removed."""
+        conn = self._connect()
+        removed = 0
+        if self.ttl_seconds:
+            cur = conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND created_at < ?",
+                (self.namespace, time.time() - self.ttl_seconds),
+            )
+            removed += cur.rowcount
+        if self.max_entries:
+            cur = conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND key IN ("
+                " SELECT key FROM cache WHERE namespace = ? ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.namespace, self.namespace, self.max_entries),
+            )
+            removed += cur.rowcount
+        return removed
+
+    def clear(self) -> None:
+        self._connect().execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+
+    def stats(self) -> dict:
+        entries = self._connect().execute(
+            "SELECT COUNT(*) FROM cache WHERE namespace = ?", (self.namespace,)
+        ).fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "namespace": self.namespace,
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -1,27 +1,143 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, List, Optional
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "Agentic RAG Question Service"
     API_V1_STR: str = "/api/v1"
     
     OPENAI_API_KEY: str
+    OPENAI_BASE_URL: Optional[str] = None
     
     QDRANT_URL: str = "http://localhost:6333"
     QDRANT_API_KEY: Optional[str] = None
     QDRANT_COLLECTION_NAME: str = "educational_contents"
     QDRANT_COLLECTION_NAME_OLD: str = "questions_rag"
+    QDRANT_POOL_SIZE: int = 32
+    QDRANT_LOCAL_PATH: Optional[str] = None
+
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP_TIMEOUT: float = 120.0
+    STARTUP_WARMUP: bool = True
     
     MODEL_NAME: str = "gpt-4.1"
     EMBEDDING_MODEL: str = "text-embedding-3-small"
     EMBEDDING_DIMENSION: int = 1536
+    EMBEDDING_PROVIDER: str = "openai"
+    EMBEDDING_BATCH_SIZE: int = 256
+    EMBEDDING_CHECK_CTX_LENGTH: bool = True
+    LOCAL_EMBEDDING_MODEL: str = "BAAI/bge-small-en-v1.5"
+    LOCAL_EMBEDDING_THREADS: Optional[int] = None
+    LOCAL_EMBEDDING_CACHE_DIR: Optional[str] = None
     TEMPERATURE: float = 0.5
     
-    MAX_ITERATIONS: int = 3
+    MAX_ITERATIONS: int = 10
     TOP_K_CONTEXT: int = 5
+    CONTEXT_MAX_TOKENS: int = 3000
+    CONTEXT_FETCH_K: int = 20
+    CONTEXT_MMR_LAMBDA: float = 0.7
+    CONTEXT_MIN_OVERLAP_CHARS: int = 40
+
+    QDRANT_ON_DISK_PAYLOAD: bool = True
+    QDRANT_ON_DISK_VECTORS: bool = True
+    QDRANT_QUANTIZATION: str = "scalar"
+    QDRANT_QUANTIZATION_ALWAYS_RAM: bool = True
+    QDRANT_RESCORE: bool = True
+    QDRANT_OVERSAMPLING: float = 2.0
+
+    HYBRID_SEARCH_ENABLED: bool = True
+    SPARSE_VECTOR_NAME: str = "bm25"
+    HYBRID_PREFETCH_K: int = 40
+    BM25_K1: float = 1.2
+    BM25_B: float = 0.75
+    BM25_AVG_DOC_LENGTH: float = 100.0
+    GENERATION_SHARD_SIZE: int = 2
+    GENERATION_MAX_FANOUT: int = 8
+    GENERATION_OVERSAMPLE: float = 1.0
+
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 1000
+    SEMANTIC_CACHE_TTL_SECONDS: int = 3600
+    # how long a process trusts its last read of the collection's content version; its own writes
+    # are seen at once, other workers' within this many seconds
+    CONTENT_VERSION_TTL_SECONDS: float = 2.0
 
+    QUESTION_BANK_ENABLED: bool = True
+    QUESTION_BANK_COLLECTION_NAME: str = "question_bank"
+    QUESTION_BANK_MIN_SCORE: float = 0.5
+    QUESTION_DEDUP_THRESHOLD: float = 0.9
+    QUESTION_BANK_PREGENERATE: bool = False
+    QUESTION_BANK_PREGENERATE_PER_SUBTOPIC: int = 5
+
+    # "structural": token-sized chunks from one pass over the book (app/rag/splitter.py);
+    # "recursive": RAG_CHUNK_SIZE-character chunks split page by page
+    RAG_SPLITTER: str = "structural"
+    RAG_CHUNK_TOKENS: int = 200
+    RAG_CHUNK_OVERLAP_TOKENS: int = 24
     RAG_CHUNK_SIZE: int = 768
     RAG_CHUNK_OVERLAP: int = 100
+
+    INGEST_CONCURRENCY: int = 8
+    INGEST_WORKERS: int = 2
+    INGEST_JOB_HISTORY: int = 100
+    INGEST_BATCH_SIZE: int = 64
+    INGEST_UPLOAD_DIR: Optional[str] = None
+    # chunk-text tokens per packed enrichment call (PAGE_CHUNKS_PACKED_PROMPT); 0 = one call per chunk
+    ENRICH_PACK_TOKENS: int = 3000
+    ENRICH_PACK_MAX_CHUNKS: int = 12
+    # take chunk taxonomy from the PDF outline (or TOC + page labels) by page; the model only
+    # classifies chunks the outline can't place, and not at all with INGEST_LLM_TAXONOMY off
+    INGEST_OUTLINE_TAXONOMY: bool = True
+    INGEST_LLM_TAXONOMY: bool = True
+    # re-uploads of a source only process pages whose text changed (app/rag/manifest.py) and
+    # delete the points of pages that are gone; an identical file is skipped
+    INGEST_INCREMENTAL: bool = True
+    # a re-upload sharing fewer of its pages with the manifest than this is refused as a different
+    # document unless it is sent with replace=true
+    INGEST_REVISION_MIN_SHARED: float = 0.2
+    # visual ingest: pages are rendered VISUAL_RENDER_WINDOW at a time in VISUAL_RENDER_WORKERS
+    # processes (0 renders in a thread); longest side capped at VISUAL_MAX_IMAGE_SIDE pixels
+    VISUAL_RENDER_DPI: int = 100
+    VISUAL_MAX_IMAGE_SIDE: Optional[int] = 1600
+    VISUAL_IMAGE_FORMAT: str = "jpeg"
+    VISUAL_IMAGE_QUALITY: int = 80
+    VISUAL_RENDER_WORKERS: int = 2
+    VISUAL_RENDER_WINDOW: int = 4
+    # enriched ingest jobs also send figure-heavy pages to the vision model (app/rag/classifier.py)
+    INGEST_VISUAL_ROUTING: bool = False
+    VISUAL_MIN_IMAGE_PIXELS: int = 40_000
+    VISUAL_MIN_DRAWING_OPS: int = 400
+    VISUAL_MIN_MATH_RATIO: float = 0.15
+    VISUAL_SPARSE_TEXT_CHARS: int = 300
+    LLM_MAX_RETRIES: int = 5
+    LLM_RETRY_BASE_DELAY: float = 1.0
+    LLM_RETRY_MAX_DELAY: float = 30.0
+    # send each prompt's JSON schema (app/schemas/llm.py) so the provider only returns matching JSON;
+    # turn off for OpenAI-compatible servers or models without json_schema structured outputs
+    LLM_STRUCTURED_OUTPUTS: bool = True
+
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"
+    # USD per million tokens: [input, cached input, output]; models not listed are counted at 0
+    LLM_PRICES_PER_MILLION: Dict[str, List[float]] = {
+        "gpt-4.1": [2.00, 0.50, 8.00],
+        "gpt-4.1-mini": [0.40, 0.10, 1.60],
+        "gpt-4.1-nano": [0.10, 0.025, 0.40],
+        "gpt-4o": [2.50, 1.25, 10.00],
+        "gpt-4o-mini": [0.15, 0.075, 0.60],
+        "text-embedding-3-small": [0.02, 0.02, 0.0],
+        "text-embedding-3-large": [0.13, 0.13, 0.0],
+        "text-embedding-ada-002": [0.10, 0.10, 0.0],
+    }
+
+    CACHE_DB_PATH: str = ".cache/rag_cache.sqlite3"
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_TTL_SECONDS: int = 30 * 24 * 3600
+    LLM_CACHE_MAX_ENTRIES: int = 200_000
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 1_000_000
     
     class Config:
         env_file = ".env"
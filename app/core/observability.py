@@ -0,0 +1,218 @@
+"""Structured logging, stage timing and token/cost accounting.
+
+- ``configure_logging`` sends the ``app`` and ``scripts`` loggers to stdout, one JSON object per
+  line (LOG_FORMAT=json) or plain text. Fields passed as ``extra=`` become keys of the record.
+- ``span(stage)`` times a block into the ``rag_stage_duration_seconds`` histogram.
+- ``record_llm_usage`` counts tokens and estimated cost per model (LLM_PRICES_PER_MILLION);
+  ``record_embedding_usage`` does the same for embedding calls, which are counted apart from
+  model calls.
+- ``track_usage(operation)`` collects the tokens, cost and stage time of everything inside it,
+  e.g. one API request or one ingest job, including work in tasks and threads it starts.
+
+The metrics are exposed by ``GET /metrics`` in ``main.py``.
+"""
+import contextvars
+import json
+import logging
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, Optional
+from prometheus_client import Counter, Histogram
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+def _fields(record: logging.LogRecord) -> Dict[str, Any]:
+    return {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **_fields(record),
+        }
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = f"{self.formatTime(record)} {record.levelname} {record.name}: {record.getMessage()}"
+        fields = _fields(record)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None, stream=None):
+    """Install the stdout handler on the app's own loggers; library loggers are left alone."""
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JsonFormatter() if (fmt or settings.LOG_FORMAT).lower() == "json" else TextFormatter())
+    for name in ("app", "scripts"):
+        log = logging.getLogger(name)
+        log.handlers = [handler]
+        log.setLevel((level or settings.LOG_LEVEL).upper())
+        log.propagate = False
+
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_duration_seconds",
+    "Time spent in each pipeline stage",
+    ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+LLM_CALLS = Counter("rag_llm_calls_total", "Model calls by operation and outcome", ["model", "operation", "outcome"])
+EMBEDDING_CALLS = Counter("rag_embedding_calls_total", "Embedding backend calls by model", ["model"])
+EMBEDDING_TEXTS = Counter("rag_embedding_texts_total", "Texts sent to the embedding backend by model", ["model"])
+LLM_TOKENS = Counter("rag_llm_tokens_total", "Tokens by model and kind (prompt, cached_prompt, completion)", ["model", "kind"])
+LLM_COST = Counter("rag_llm_cost_usd_total", "Estimated spend in USD by model", ["model"])
+OPERATION_TOKENS = Histogram(
+    "rag_operation_tokens",
+    "Tokens used per API request or ingest job",
+    ["operation"],
+    buckets=(100, 500, 1_000, 2_500, 5_000, 10_000, 25_000, 50_000, 100_000, 250_000, 1_000_000),
+)
+OPERATION_COST = Histogram(
+    "rag_operation_cost_usd",
+    "Estimated spend in USD per API request or ingest job",
+    ["operation"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+LLM_PARSES = Counter(
+    "rag_llm_parse_total",
+    "Model replies parsed against a schema, by how (strict, extracted, repaired) or why not (invalid, failed)",
+    ["schema", "outcome"],
+)
+PAGE_ROUTES = Counter("rag_page_routes_total", "Ingested pages by route (text, visual) and reason", ["route", "reason"])
+HTTP_SECONDS = Histogram(
+    "rag_http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+
+
+@dataclass
+class Usage:
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+    calls: int = 0
+    embedding_calls: int = 0
+    # seconds per stage; stages running concurrently add up to more than wall time
+    stages: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def as_fields(self) -> Dict[str, Any]:
+        return {
+            "llm_calls": self.calls,
+            "embedding_calls": self.embedding_calls,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost_usd": round(self.cost_usd, 6),
+            "stage_seconds": {k: round(v, 4) for k, v in sorted(self.stages.items())},
+        }
+
+
+_usage: contextvars.ContextVar[Optional[Usage]] = contextvars.ContextVar("usage", default=None)
+
+
+@contextmanager
+def track_usage(operation: str) -> Iterator[Usage]:
+    usage = Usage()
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        try:
+            _usage.reset(token)
+        except ValueError:
+            # a streaming response closed from another context; nothing to restore there
+            pass
+        OPERATION_TOKENS.labels(operation).observe(usage.total_tokens)
+        OPERATION_COST.labels(operation).observe(usage.cost_usd)
+
+
+@contextmanager
+def span(stage: str, **fields):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.labels(stage).observe(elapsed)
+        usage = _usage.get()
+        if usage is not None:
+            usage.stages[stage] = usage.stages.get(stage, 0.0) + elapsed
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("span", extra={"stage": stage, "duration_ms": round(elapsed * 1000, 2), **fields})
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    prices = settings.LLM_PRICES_PER_MILLION
+    # dated snapshots (gpt-4.1-2025-04-14) are priced like their base model
+    key = model if model in prices else max((k for k in prices if model.startswith(k)), key=len, default=None)
+    if key is None:
+        return 0.0
+    input_price, cached_price, output_price = (list(prices[key]) + [0.0, 0.0, 0.0])[:3]
+    uncached = max(prompt_tokens - cached_tokens, 0)
+    return (uncached * input_price + cached_tokens * cached_price + completion_tokens * output_price) / 1_000_000
+
+
+def record_llm_call(model: str, operation: str, outcome: str):
+    LLM_CALLS.labels(model, operation, outcome).inc()
+
+
+def record_parse(schema: str, outcome: str):
+    LLM_PARSES.labels(schema, outcome).inc()
+
+
+def _record_tokens(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int) -> Optional[Usage]:
+    cost = estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens)
+    LLM_TOKENS.labels(model, "prompt").inc(prompt_tokens)
+    LLM_TOKENS.labels(model, "cached_prompt").inc(cached_tokens)
+    LLM_TOKENS.labels(model, "completion").inc(completion_tokens)
+    LLM_COST.labels(model).inc(cost)
+    usage = _usage.get()
+    if usage is not None:
+        usage.prompt_tokens += prompt_tokens
+        usage.cached_tokens += cached_tokens
+        usage.completion_tokens += completion_tokens
+        usage.cost_usd += cost
+    return usage
+
+
+def record_llm_usage(model: str, operation: str, prompt_tokens: int = 0, completion_tokens: int = 0, cached_tokens: int = 0):
+    """Count one successful model call; ``cached_tokens`` is the part of the prompt served from
+    the provider's prompt cache."""
+    LLM_CALLS.labels(model, operation, "ok").inc()
+    usage = _record_tokens(model, int(prompt_tokens or 0), int(completion_tokens or 0), int(cached_tokens or 0))
+    if usage is not None:
+        usage.calls += 1
+
+
+def record_embedding_usage(model: str, texts: int, prompt_tokens: int = 0):
+    """Count one embedding backend call: its tokens and cost go with the model calls' (under the
+    embedding model), the call itself only to ``rag_embedding_calls_total``."""
+    EMBEDDING_CALLS.labels(model).inc()
+    EMBEDDING_TEXTS.labels(model).inc(texts)
+    usage = _record_tokens(model, int(prompt_tokens or 0), 0, 0)
+    if usage is not None:
+        usage.embedding_calls += 1
@@ -0,0 +1,82 @@
+"""Qdrant client construction for server and embedded mode.
+
+By default both clients talk to the server at QDRANT_URL. With QDRANT_LOCAL_PATH set
+(":memory:" or a directory) Qdrant runs in-process instead, which is meant for tests and offline
+benchmarks. The embedded engine keeps separate stores for sync and async clients and does no
+locking of its own. In that mode one sync client is therefore shared: its calls are serialised,
+and the async client is an adapter that runs them in a worker thread.
+"""
+import asyncio
+import functools
+import inspect
+import threading
+from typing import Optional
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from app.core.config import settings
+
+
+def _serialized(method):
+    @functools.wraps(method)
+    def call(self, *args, **kwargs):
+        with self._serial_lock:
+            return method(self, *args, **kwargs)
+    return call
+
+
+class SerializedQdrantClient(QdrantClient):
+    """Embedded-mode client whose public methods run one at a time.
+
+    The lock sits on the public methods, so it doesn't depend on how the client is built
+    inside; methods calling each other re-enter it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._serial_lock = threading.RLock()
+        super().__init__(*args, **kwargs)
+
+
+for _name in dir(QdrantClient):
+    if not _name.startswith("_") and inspect.isfunction(getattr(QdrantClient, _name)):
+        setattr(SerializedQdrantClient, _name, _serialized(getattr(QdrantClient, _name)))
+
+
+class ThreadedAsyncQdrantClient:
+    """Async facade over a sync QdrantClient: every method runs in a worker thread."""
+
+    def __init__(self, client: QdrantClient):
+        self._sync = client
+
+    def __getattr__(self, name):
+        attr = getattr(self._sync, name)
+        if not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(attr, *args, **kwargs)
+        return call
+
+    async def close(self, **kwargs):
+        # the shared sync client owns the store and is closed by its owner
+        return None
+
+
+def is_local() -> bool:
+    return bool(settings.QDRANT_LOCAL_PATH)
+
+
+def make_qdrant_client(pool_size: Optional[int] = None) -> QdrantClient:
+    if is_local():
+        path = settings.QDRANT_LOCAL_PATH
+        return SerializedQdrantClient(location=":memory:") if path == ":memory:" else SerializedQdrantClient(path=path)
+    kwargs = {"pool_size": pool_size} if pool_size else {}
+    return QdrantClient(url=settings.QDRANT_URL, api_key=settings.QDRANT_API_KEY, **kwargs)
+
+
+def make_async_qdrant_client(client: Optional[QdrantClient] = None, pool_size: Optional[int] = None):
+    """Async client for QDRANT_URL; in embedded mode an adapter over ``client``, which must be given."""
+    if is_local():
+        if client is None:
+            raise ValueError("Embedded Qdrant (QDRANT_LOCAL_PATH) needs the shared sync client")
+        return ThreadedAsyncQdrantClient(client)
+    kwargs = {"pool_size": pool_size} if pool_size else {}
+    return AsyncQdrantClient(url=settings.QDRANT_URL, api_key=settings.QDRANT_API_KEY, **kwargs)
@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+import httpx
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _pool_stats(http_client) -> Dict[str, Any]:
+    # httpx doesn't expose pool metrics publicly; read them off the httpcore pool when present
+    pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+    if pool is None:
+        return {}
+    connections = list(getattr(pool, "connections", []))
+    idle = sum(1 for c in connections if c.is_idle())
+    return {
+        "connections": len(connections),
+        "idle": idle,
+        "active": len(connections) - idle,
+        "queued_requests": len(getattr(pool, "_requests", [])),
+        "max_connections": getattr(pool, "_max_connections", None),
+        "max_keepalive_connections": getattr(pool, "_max_keepalive_connections", None),
+    }
+
+
+class ClientRegistry:
+    """App-scoped holder for network clients and services.
+
+    Everything is built lazily on first access and shared afterwards, so the process keeps one
+    keep-alive connection pool per backend instead of one per service or per call. Heavy modules
+    (langchain, qdrant, langgraph, pypdf) are imported inside the factories so that importing
+    the app and running the lifespan hook stay cheap.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._instances: Dict[str, Any] = {}
+        self.created_at = time.time()
+        # the server event loop; background work that uses the async clients is scheduled onto it
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+
+    def _get(self, name: str, factory: Callable[[], Any]):
+        instance = self._instances.get(name)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(name)
+                if instance is None:
+                    instance = factory()
+                    self._instances[name] = instance
+        return instance
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+        )
+
+    @property
+    def http_client(self) -> httpx.Client:
+        return self._get("http_client", lambda: httpx.Client(limits=self._limits(), timeout=settings.HTTP_TIMEOUT))
+
+    @property
+    def http_async_client(self) -> httpx.AsyncClient:
+        # bound to the event loop that first touches it, which is the server loop in practice
+        return self._get(
+            "http_async_client",
+            lambda: httpx.AsyncClient(limits=self._limits(), timeout=settings.HTTP_TIMEOUT),
+        )
+
+    @property
+    def qdrant_client(self):
+        def build():
+            from app.core.qdrant import make_qdrant_client
+            return make_qdrant_client(pool_size=settings.QDRANT_POOL_SIZE)
+        return self._get("qdrant_client", build)
+
+    @property
+    def async_qdrant_client(self):
+        def build():
+            from app.core.qdrant import is_local, make_async_qdrant_client
+            # embedded Qdrant can't share a store between two clients, so wrap the sync one
+            return make_async_qdrant_client(self.qdrant_client if is_local() else None, pool_size=settings.QDRANT_POOL_SIZE)
+        return self._get("async_qdrant_client", build)
+
+    @property
+    def embeddings(self):
+        def build():
+            from app.rag.embeddings import get_embeddings
+            return get_embeddings(http_client=self.http_client, http_async_client=self.http_async_client)
+        return self._get("embeddings", build)
+
+    @property
+    def vectorstore(self):
+        def build():
+            from app.rag.vectorstore import VectorStoreManager
+            return VectorStoreManager(
+                client=self.qdrant_client,
+                async_client=self.async_qdrant_client,
+                embeddings=self.embeddings,
+            )
+        return self._get("vectorstore", build)
+
+    @property
+    def llm_service(self):
+        def build():
+            from app.services.llm_service import LLMService
+            return LLMService(http_client=self.http_client, http_async_client=self.http_async_client)
+        return self._get("llm_service", build)
+
+    @property
+    def ingest_service(self):
+        def build():
+            from app.services.ingest_service import IngestService
+            return IngestService(vectorstore=self.vectorstore, llm_service=self.llm_service)
+        return self._get("ingest_service", build)
+
+    @property
+    def job_manager(self):
+        def build():
+            from app.services.ingest_jobs import IngestJobManager
+            return IngestJobManager(self.ingest_service, on_complete=self._on_ingest_complete)
+        return self._get("job_manager", build)
+
+    def _on_ingest_complete(self, job):
+        if not (settings.QUESTION_BANK_ENABLED and settings.QUESTION_BANK_PREGENERATE):
+            return
+        if self.loop is None or not job.subtopics:
+            return
+        subtopics = sorted(job.subtopics)
+        logger.info("Scheduling question pre-generation", extra={"subtopics": len(subtopics), "filename": job.filename})
+        asyncio.run_coroutine_threadsafe(
+            self.question_service.pregenerate(subtopics, settings.QUESTION_BANK_PREGENERATE_PER_SUBTOPIC),
+            self.loop,
+        )
+
+    @property
+    def question_bank(self):
+        def build():
+            from app.services.question_bank import QuestionBank
+            return QuestionBank(
+                client=self.qdrant_client,
+                async_client=self.async_qdrant_client,
+                embeddings=self.embeddings,
+            )
+        return self._get("question_bank", build)
+
+    @property
+    def semantic_cache(self):
+        def build():
+            from app.services.semantic_cache import SemanticCache
+            return SemanticCache(version_fn=self.vectorstore.content_version)
+        return self._get("semantic_cache", build)
+
+    @property
+    def question_service(self):
+        def build():
+            from app.agents.graph import QuestionAgents, create_graph
+            from app.services.questions_service import QuestionService
+            question_bank = self.question_bank if settings.QUESTION_BANK_ENABLED else None
+            return QuestionService(
+                vectorstore=self.vectorstore,
+                graph=create_graph(QuestionAgents(
+                    llm_service=self.llm_service,
+                    embeddings=self.embeddings if settings.QUESTION_BANK_ENABLED else None,
+                )),
+                semantic_cache=self.semantic_cache if settings.SEMANTIC_CACHE_ENABLED else None,
+                question_bank=question_bank,
+            )
+        return self._get("question_service", build)
+
+    def warm_up(self):
+        """Build the services ahead of the first request; safe to run in a background thread."""
+        started = time.perf_counter()
+        try:
+            self.ingest_service
+            self.question_service
+            logger.info("Service warm-up finished", extra={"elapsed_s": round(time.perf_counter() - started, 2)})
+        except Exception as e:
+            logger.warning("Service warm-up failed; services will be built on first request", extra={"error": str(e)})
+
+    def pool_stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {"initialized": sorted(self._instances)}
+        if "http_client" in self._instances:
+            stats["http"] = _pool_stats(self._instances["http_client"])
+        if "http_async_client" in self._instances:
+            stats["http_async"] = _pool_stats(self._instances["http_async_client"])
+        if "qdrant_client" in self._instances:
+            stats["qdrant"] = {"pool_size": settings.QDRANT_POOL_SIZE}
+        return stats
+
+    async def aclose(self):
+        instances = self._instances
+        if "job_manager" in instances:
+            instances["job_manager"].shutdown()
+        if "http_async_client" in instances:
+            await instances["http_async_client"].aclose()
+        if "async_qdrant_client" in instances:
+            await instances["async_qdrant_client"].close()
+        if "http_client" in instances:
+            instances["http_client"].close()
+        if "qdrant_client" in instances:
+            instances["qdrant_client"].close()
+        self._instances = {}
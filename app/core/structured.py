@@ -0,0 +1,84 @@
+"""Typed parsing of model replies against the schemas in app/schemas/llm.py.
+
+Replies are read with ``load_json`` (strict parse, then JSON embedded in text, then json_repair)
+and validated against the schema; every reply is counted in ``rag_llm_parse_total`` by how it
+was read or why it wasn't. With LLM_STRUCTURED_OUTPUTS the schema is also sent to the provider,
+which then only returns JSON that matches it.
+"""
+import logging
+import re
+from typing import Any, Callable, Dict, Optional, Type, TypeVar
+from pydantic import BaseModel, ValidationError
+from app.core.config import settings
+from app.core.observability import record_parse
+from app.schemas.llm import json_schema
+from utils.helpers import load_json
+
+logger = logging.getLogger(__name__)
+
+M = TypeVar("M", bound=BaseModel)
+_CAMEL = re.compile(r"(?<!^)(?=[A-Z])")
+
+
+def schema_name(model: Type[BaseModel]) -> str:
+    return _CAMEL.sub("_", model.__name__).lower()
+
+
+def _record(schema: str, outcome: str, text: str, error: Optional[str] = None):
+    record_parse(schema, outcome)
+    if outcome in ("invalid", "failed"):
+        logger.warning("Unusable model reply", extra={"schema": schema, "outcome": outcome, "chars": len(text), "error": error})
+
+
+def _fits(model: Type[BaseModel], value: Any) -> bool:
+    try:
+        model.model_validate(value)
+    except ValidationError:
+        return False
+    return True
+
+
+def load_reply(text: Optional[str], schema: str, accept: Optional[Callable[[Any], bool]] = None) -> Any:
+    """The reply as plain JSON, for callers that validate parts of it themselves.
+
+    ``accept`` picks the reply's JSON out of prose that holds several values (see ``load_json``).
+    """
+    if text is None:
+        # the call itself failed, which rag_llm_calls_total already counts
+        return None
+    value, how = load_json(text, accept=accept)
+    _record(schema, how, text)
+    return value
+
+
+def parse_reply(text: Optional[str], model: Type[M]) -> Optional[M]:
+    """The reply validated as ``model``; None when it isn't JSON or doesn't fit the schema."""
+    if text is None:
+        return None
+    name = schema_name(model)
+    value, how = load_json(text, accept=lambda v: _fits(model, v))
+    if how == "failed":
+        _record(name, how, text)
+        return None
+    try:
+        parsed = model.model_validate(value)
+    except ValidationError as e:
+        _record(name, "invalid", text, f"{e.error_count()} validation errors, first: {e.errors()[0]['msg']}")
+        return None
+    _record(name, how, text)
+    return parsed
+
+
+def response_format(model: Type[BaseModel]) -> Optional[Dict[str, Any]]:
+    """``text.format`` for the Responses API, or None with LLM_STRUCTURED_OUTPUTS off."""
+    if not settings.LLM_STRUCTURED_OUTPUTS:
+        return None
+    return {"type": "json_schema", "name": schema_name(model), "schema": json_schema(model), "strict": True}
+
+
+def chat_response_format(model: Type[BaseModel]) -> Optional[Dict[str, Any]]:
+    """``response_format`` for Chat Completions, or None with LLM_STRUCTURED_OUTPUTS off."""
+    fmt = response_format(model)
+    if fmt is None:
+        return None
+    return {"type": "json_schema", "json_schema": {"name": fmt["name"], "schema": fmt["schema"], "strict": True}}
@@ -0,0 +1,48 @@
+import logging
+import math
+from functools import lru_cache
+from typing import Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# rough average for English text, used only when tiktoken's encoding files can't be loaded
+_CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=8)
+def get_encoding(model_name: Optional[str] = None):
+    """tiktoken encoding for ``model_name`` (default ``MODEL_NAME``), or None if it can't be loaded.
+
+    tiktoken downloads its BPE files on first use; offline hosts need ``TIKTOKEN_CACHE_DIR``
+    pointing at a pre-populated cache, otherwise counts fall back to a character estimate.
+    """
+    model_name = model_name or settings.MODEL_NAME
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning("tiktoken encoding unavailable; estimating tokens from character counts", extra={"error": type(e).__name__})
+        return None
+
+
+def count_tokens(text: str, model_name: Optional[str] = None) -> int:
+    if not text:
+        return 0
+    encoding = get_encoding(model_name)
+    if encoding is None:
+        return math.ceil(len(text) / _CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model_name: Optional[str] = None) -> str:
+    if max_tokens <= 0 or not text:
+        return ""
+    encoding = get_encoding(model_name)
+    if encoding is None:
+        return text[:max_tokens * _CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
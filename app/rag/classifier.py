@@ -0,0 +1,125 @@
+"""Cheap per-page routing between the text pipeline and the vision model.
+
+Pages are profiled from their PDF content stream with pypdf, without rendering or text
+extraction:
+
+- ``images``: image XObjects and inline images drawn on the page that are at least
+  VISUAL_MIN_IMAGE_PIXELS big, so logos and rules don't count;
+- ``drawing_ops``: vector path construction operators (lines, curves, rectangles), which is
+  what charts, diagrams and tables are made of;
+- ``text_chars``: bytes of shown text, a proxy for text density;
+- ``math_ratio``: the share of that text set in math fonts (Computer Modern math, Symbol,
+  STIX, Cambria Math and similar).
+
+``route`` sends a page to vision when it has a real image, many drawing operators, a high
+math ratio, or little text next to some drawing.
+"""
+import re
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterator, Optional
+from pypdf import PdfReader
+from pypdf.generic import ContentStream
+from app.core.config import settings
+
+PATH_OPERATORS = {b"m", b"l", b"c", b"v", b"y", b"re"}
+TEXT_OPERATORS = {b"Tj", b"TJ", b"'", b'"'}
+MATH_FONT = re.compile(r"CMMI|CMSY|CMEX|MSAM|MSBM|Math|Symbol|STIX|Euclid|MTExtra|Mathematica", re.I)
+# Form XObjects can nest; deeper levels are rare and not worth the parse
+MAX_FORM_DEPTH = 3
+
+
+@dataclass
+class PageProfile:
+    page: int
+    images: int = 0
+    drawing_ops: int = 0
+    text_chars: int = 0
+    math_chars: int = 0
+    route: str = "text"
+    reason: str = "text"
+
+    @property
+    def math_ratio(self) -> float:
+        return self.math_chars / self.text_chars if self.text_chars else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "math_ratio": round(self.math_ratio, 3)}
+
+
+def _resolve(obj):
+    return obj.get_object() if obj is not None else None
+
+
+def _text_length(operands, operator: bytes) -> int:
+    if operator == b"TJ":
+        return sum(len(item) for item in (operands[0] if operands else []) if isinstance(item, (str, bytes)))
+    text = operands[-1] if operands else b""
+    return len(text) if isinstance(text, (str, bytes)) else 0
+
+
+def _scan(content, resources, reader: PdfReader, profile: PageProfile, depth: int = 0):
+    resources = _resolve(resources) or {}
+    fonts = _resolve(resources.get("/Font")) or {}
+    xobjects = _resolve(resources.get("/XObject")) or {}
+    math_font = False
+    stream = content if isinstance(content, ContentStream) else ContentStream(content, reader)
+    for operands, operator in stream.operations:
+        if operator in PATH_OPERATORS:
+            profile.drawing_ops += 1
+        elif operator in TEXT_OPERATORS:
+            length = _text_length(operands, operator)
+            profile.text_chars += length
+            if math_font:
+                profile.math_chars += length
+        elif operator == b"Tf" and operands:
+            font = _resolve(fonts.get(operands[0])) or {}
+            math_font = bool(MATH_FONT.search(str(font.get("/BaseFont", ""))))
+        elif operator == b"Do" and operands:
+            xobject = _resolve(xobjects.get(operands[0]))
+            if xobject is None:
+                continue
+            subtype = xobject.get("/Subtype")
+            if subtype == "/Image":
+                if int(xobject.get("/Width", 0)) * int(xobject.get("/Height", 0)) >= settings.VISUAL_MIN_IMAGE_PIXELS:
+                    profile.images += 1
+            elif subtype == "/Form" and depth < MAX_FORM_DEPTH:
+                _scan(xobject, xobject.get("/Resources", resources), reader, profile, depth + 1)
+        elif operator == b"INLINE IMAGE":
+            image = operands.get("settings", {}) if isinstance(operands, dict) else {}
+            width = image.get("/W", image.get("/Width", 0))
+            height = image.get("/H", image.get("/Height", 0))
+            if int(width) * int(height) >= settings.VISUAL_MIN_IMAGE_PIXELS:
+                profile.images += 1
+
+
+def route(profile: PageProfile) -> PageProfile:
+    if profile.images:
+        profile.route, profile.reason = "visual", "images"
+    elif profile.drawing_ops >= settings.VISUAL_MIN_DRAWING_OPS:
+        profile.route, profile.reason = "visual", "drawings"
+    elif profile.text_chars and profile.math_ratio >= settings.VISUAL_MIN_MATH_RATIO:
+        profile.route, profile.reason = "visual", "equations"
+    elif profile.text_chars < settings.VISUAL_SPARSE_TEXT_CHARS and profile.drawing_ops >= settings.VISUAL_MIN_DRAWING_OPS // 4:
+        profile.route, profile.reason = "visual", "sparse_text"
+    else:
+        profile.route, profile.reason = "text", "text"
+    return profile
+
+
+def profile_page(reader: PdfReader, index: int) -> PageProfile:
+    profile = PageProfile(page=index)
+    page = reader.pages[index]
+    content = page.get_contents()
+    if content is not None:
+        _scan(content, page.get("/Resources"), reader, profile)
+    return route(profile)
+
+
+def classify_pages(file_path: str, reader: Optional[PdfReader] = None) -> Iterator[PageProfile]:
+    """Yield a routed PageProfile per page (0-based). A page that can't be parsed is routed to text."""
+    reader = reader or PdfReader(file_path)
+    for index in range(len(reader.pages)):
+        try:
+            yield profile_page(reader, index)
+        except Exception:
+            yield PageProfile(page=index, reason="unparsed")
@@ -0,0 +1,180 @@
+import hashlib
+import re
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from app.core.config import settings
+from app.core.tokens import count_tokens, truncate_to_tokens
+
+SEPARATOR = "\n\n"
+
+
+@dataclass
+class BuiltContext:
+    text: str
+    documents: List[Document]
+    tokens: int
+    # tokens of the plain join of the top ``max_chunks`` hits, i.e. what the context cost before
+    raw_tokens: int
+    candidates: int
+
+
+def document_text(doc: Document) -> str:
+    # points written before the compact payload layout kept the full text in metadata.full_content
+    return (doc.metadata or {}).get("full_content") or doc.page_content or ""
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def _suffix_prefix_overlap(left: str, right: str, min_chars: int) -> int:
+    """Length of the longest suffix of ``left`` that is also a prefix of ``right`` (0 if shorter than ``min_chars``)."""
+    if len(left) < min_chars or len(right) < min_chars:
+        return 0
+    head = right[:min_chars]
+    idx = left.find(head, max(0, len(left) - len(right)))
+    while idx != -1:
+        if right.startswith(left[idx:]):
+            return len(left) - idx
+        idx = left.find(head, idx + 1)
+    return 0
+
+
+def trim_overlaps(text: str, selected: List[str], min_chars: int) -> str:
+    """Drop the spans of ``text`` already covered by ``selected``: containment, or a shared
+    head/tail left behind by the splitter's chunk overlap. Returns "" when nothing new remains."""
+    for other in selected:
+        if _normalize(text) in _normalize(other):
+            return ""
+        cut = _suffix_prefix_overlap(other, text, min_chars)
+        if cut:
+            text = text[cut:].lstrip()
+        cut = _suffix_prefix_overlap(text, other, min_chars)
+        if cut:
+            text = text[:len(text) - cut].rstrip()
+    return text
+
+
+def mmr_order(relevance: np.ndarray, similarity: np.ndarray, lambda_mult: float) -> List[int]:
+    """Greedy maximal-marginal-relevance ranking of every candidate."""
+    selected: List[int] = []
+    remaining = list(range(len(relevance)))
+    while remaining:
+        if selected:
+            redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining))
+        scores = lambda_mult * relevance[remaining] - (1 - lambda_mult) * redundancy
+        best = remaining[int(np.argmax(scores))]
+        selected.append(best)
+        remaining.remove(best)
+    return selected
+
+
+def _lexical_similarity(texts: List[str]) -> np.ndarray:
+    words = [set(_normalize(t).split()) for t in texts]
+    n = len(texts)
+    matrix = np.eye(n, dtype=np.float32)
+    for i in range(n):
+        for j in range(i + 1, n):
+            union = len(words[i] | words[j])
+            matrix[i, j] = matrix[j, i] = len(words[i] & words[j]) / union if union else 0.0
+    return matrix
+
+
+def _position_key(doc: Document, text: str) -> Tuple[Any, ...]:
+    # document order where the payload has it, otherwise the content-derived point id, so the
+    # same retrieval always yields byte-identical context
+    metadata = doc.metadata or {}
+    page = metadata.get("page")
+    return (
+        str(metadata.get("source") or ""),
+        page if isinstance(page, int) else -1,
+        str(metadata.get("_id") or hashlib.sha256(text.encode("utf-8")).hexdigest()),
+    )
+
+
+class ContextBuilder:
+    """Assemble retrieved chunks into one prompt context under a token budget.
+
+    Exact duplicates and spans repeated by the splitter's chunk overlap are removed, chunks are
+    picked by MMR (relevance from the Qdrant score, redundancy from the stored vectors or, without
+    them, word overlap) until ``max_chunks`` or ``max_tokens`` is reached, and the result is
+    emitted in document order so identical retrievals produce an identical prompt prefix.
+    """
+
+    def __init__(
+        self,
+        max_tokens: Optional[int] = None,
+        max_chunks: Optional[int] = None,
+        mmr_lambda: Optional[float] = None,
+        min_overlap_chars: Optional[int] = None,
+    ):
+        self.max_tokens = max_tokens or settings.CONTEXT_MAX_TOKENS
+        self.max_chunks = max_chunks or settings.TOP_K_CONTEXT
+        self.mmr_lambda = mmr_lambda if mmr_lambda is not None else settings.CONTEXT_MMR_LAMBDA
+        self.min_overlap_chars = min_overlap_chars or settings.CONTEXT_MIN_OVERLAP_CHARS
+
+    def _rank(self, docs: List[Document], texts: List[str]) -> List[int]:
+        metadata = [d.metadata or {} for d in docs]
+        if all(m.get("_score") is not None for m in metadata):
+            relevance = np.array([m["_score"] for m in metadata], dtype=np.float32)
+            # fused (RRF) scores are tiny next to cosine similarities; rescale so lambda means the same
+            if relevance.max() > 0:
+                relevance = relevance / relevance.max()
+        else:
+            relevance = 1.0 - np.arange(len(docs), dtype=np.float32) / len(docs)
+        if all(m.get("_vector") is not None for m in metadata):
+            vectors = np.asarray([m["_vector"] for m in metadata], dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            vectors = vectors / norms
+            similarity = vectors @ vectors.T
+        else:
+            similarity = _lexical_similarity(texts)
+        return mmr_order(relevance, similarity, self.mmr_lambda)
+
+    def build(self, documents: List[Document]) -> BuiltContext:
+        raw_tokens = count_tokens(SEPARATOR.join(document_text(d) for d in documents[:self.max_chunks]))
+        docs: List[Document] = []
+        texts: List[str] = []
+        seen = set()
+        for doc in documents:
+            text = document_text(doc).strip()
+            key = hashlib.sha256(_normalize(text).encode("utf-8")).hexdigest()
+            if text and key not in seen:
+                seen.add(key)
+                docs.append(doc)
+                texts.append(text)
+        if not docs:
+            return BuiltContext(text="", documents=[], tokens=0, raw_tokens=raw_tokens, candidates=len(documents))
+
+        chosen: List[Tuple[int, str]] = []
+        used = 0
+        for i in self._rank(docs, texts):
+            if len(chosen) >= self.max_chunks:
+                break
+            text = trim_overlaps(texts[i], [t for _, t in chosen], self.min_overlap_chars)
+            if not text:
+                continue
+            tokens = count_tokens(text) + (1 if chosen else 0)
+            if used + tokens > self.max_tokens:
+                if chosen:
+                    # a smaller, less relevant chunk may still fit
+                    continue
+                text = truncate_to_tokens(text, self.max_tokens)
+                tokens = count_tokens(text)
+            chosen.append((i, text))
+            used += tokens
+
+        chosen.sort(key=lambda item: _position_key(docs[item[0]], item[1]))
+        text = SEPARATOR.join(t for _, t in chosen)
+        return BuiltContext(
+            text=text,
+            documents=[docs[i] for i, _ in chosen],
+            tokens=count_tokens(text),
+            raw_tokens=raw_tokens,
+            candidates=len(documents),
+        )
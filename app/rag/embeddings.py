@@ -0,0 +1,225 @@
+import asyncio
+from array import array
+from typing import Callable, Dict, List, Optional, Tuple
+from langchain_core.embeddings import Embeddings
+from app.core.cache import SQLiteCache, make_cache_key
+from app.core.config import settings
+from app.core.observability import record_embedding_usage, span
+from app.core.tokens import count_tokens
+
+
+def _encode(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _decode(blob: bytes) -> List[float]:
+    values = array("f")
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an Embeddings backend with a persistent cache keyed by model and text hash.
+
+    Only texts missing from the cache are sent to the backend, and duplicates within one
+    call are embedded once.
+    """
+
+    def __init__(self, underlying: Embeddings, model_key: str, cache: SQLiteCache):
+        self.underlying = underlying
+        self.model_key = model_key
+        self.cache = cache
+
+    def _key(self, kind: str, text: str) -> str:
+        return make_cache_key(self.model_key, kind, text)
+
+    def _lookup(self, texts: List[str]):
+        results: List[Optional[List[float]]] = []
+        missing: dict = {}
+        for i, text in enumerate(texts):
+            cached = self.cache.get(self._key("document", text))
+            if cached is not None:
+                results.append(_decode(cached))
+            else:
+                results.append(None)
+                missing.setdefault(text, []).append(i)
+        return results, missing
+
+    def _fill(self, results, missing: dict, vectors: List[List[float]]) -> List[List[float]]:
+        for (text, positions), vector in zip(missing.items(), vectors):
+            self.cache.set(self._key("document", text), _encode(vector))
+            for i in positions:
+                results[i] = vector
+        return results
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        results, missing = self._lookup(texts)
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing))
+            results = self._fill(results, missing, vectors)
+        return results
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        # SQLite calls can wait on other writers (busy timeout), so they stay off the event loop
+        results, missing = await asyncio.to_thread(self._lookup, texts)
+        if missing:
+            vectors = await self.underlying.aembed_documents(list(missing))
+            results = await asyncio.to_thread(self._fill, results, missing, vectors)
+        return results
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key("query", text)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return _decode(cached)
+        vector = self.underlying.embed_query(text)
+        self.cache.set(key, _encode(vector))
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self._key("query", text)
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            return _decode(cached)
+        vector = await self.underlying.aembed_query(text)
+        await asyncio.to_thread(self.cache.set, key, _encode(vector))
+        return vector
+
+
+class InstrumentedEmbeddings(Embeddings):
+    """Times backend calls as the ``embed`` stage and counts them with their (estimated) input
+    tokens, apart from model calls."""
+
+    def __init__(self, underlying: Embeddings, model: str):
+        self.underlying = underlying
+        self.model = model
+
+    def _record(self, texts: List[str]):
+        record_embedding_usage(self.model, len(texts), prompt_tokens=sum(count_tokens(t) for t in texts))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with span("embed", texts=len(texts)):
+            vectors = self.underlying.embed_documents(texts)
+        self._record(texts)
+        return vectors
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        with span("embed", texts=len(texts)):
+            vectors = await self.underlying.aembed_documents(texts)
+        self._record(texts)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        with span("embed", texts=1):
+            vector = self.underlying.embed_query(text)
+        self._record([text])
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        with span("embed", texts=1):
+            vector = await self.underlying.aembed_query(text)
+        self._record([text])
+        return vector
+
+
+class LocalEmbeddings(Embeddings):
+    """CPU embeddings computed in-process with fastembed (ONNX Runtime), no network round trip.
+
+    The model is downloaded once into ``cache_dir`` and loaded at construction. Documents are
+    encoded in ``batch_size`` batches on ``threads`` ONNX threads (default: all cores); the async
+    methods run inference in a worker thread so the event loop stays free.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        batch_size: int = 256,
+        threads: Optional[int] = None,
+        cache_dir: Optional[str] = None,
+        dimension: Optional[int] = None,
+    ):
+        try:
+            from fastembed import TextEmbedding
+        except ImportError as e:
+            raise ImportError("EMBEDDING_PROVIDER=local requires the fastembed package: pip install fastembed") from e
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.model = TextEmbedding(model_name=model_name, threads=threads, cache_dir=cache_dir)
+        size = len(self.embed_query("dimension probe"))
+        if dimension is not None and size != dimension:
+            raise ValueError(
+                f"Local embedding model '{model_name}' produces {size}-dimensional vectors but "
+                f"EMBEDDING_DIMENSION is {dimension}; set EMBEDDING_DIMENSION={size}."
+            )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return [v.tolist() for v in self.model.passage_embed(texts, batch_size=self.batch_size)]
+
+    def embed_query(self, text: str) -> List[float]:
+        return next(iter(self.model.query_embed(text))).tolist()
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await asyncio.to_thread(self.embed_query, text)
+
+
+def _openai_embeddings(http_client=None, http_async_client=None) -> Tuple[Embeddings, str]:
+    from langchain_openai import OpenAIEmbeddings
+
+    embeddings = OpenAIEmbeddings(
+        model=settings.EMBEDDING_MODEL,
+        # text-embedding-3 models return shortened vectors natively; older models don't accept it
+        dimensions=settings.EMBEDDING_DIMENSION if settings.EMBEDDING_MODEL.startswith("text-embedding-3") else None,
+        chunk_size=settings.EMBEDDING_BATCH_SIZE,
+        base_url=settings.OPENAI_BASE_URL,
+        # OpenAI-compatible servers other than OpenAI usually expect plain text, not token ids
+        check_embedding_ctx_length=settings.EMBEDDING_CHECK_CTX_LENGTH,
+        http_client=http_client,
+        http_async_client=http_async_client,
+    )
+    return embeddings, f"{settings.EMBEDDING_MODEL}:{settings.EMBEDDING_DIMENSION}"
+
+
+def _local_embeddings(http_client=None, http_async_client=None) -> Tuple[Embeddings, str]:
+    embeddings = LocalEmbeddings(
+        model_name=settings.LOCAL_EMBEDDING_MODEL,
+        batch_size=settings.EMBEDDING_BATCH_SIZE,
+        threads=settings.LOCAL_EMBEDDING_THREADS,
+        cache_dir=settings.LOCAL_EMBEDDING_CACHE_DIR,
+        dimension=settings.EMBEDDING_DIMENSION,
+    )
+    return embeddings, f"local:{settings.LOCAL_EMBEDDING_MODEL}:{settings.EMBEDDING_DIMENSION}"
+
+
+EMBEDDING_PROVIDERS: Dict[str, Callable[..., Tuple[Embeddings, str]]] = {
+    "openai": _openai_embeddings,
+    "local": _local_embeddings,
+}
+
+
+def get_embeddings(http_client=None, http_async_client=None, provider: Optional[str] = None, cache: Optional[bool] = None) -> Embeddings:
+    """Build the embeddings backend for ``provider`` (default EMBEDDING_PROVIDER), wrapped in the
+    persistent cache when enabled."""
+    provider = (provider or settings.EMBEDDING_PROVIDER).lower()
+    build = EMBEDDING_PROVIDERS.get(provider)
+    if build is None:
+        raise ValueError(f"Unsupported EMBEDDING_PROVIDER '{provider}'; expected one of {sorted(EMBEDDING_PROVIDERS)}")
+    embeddings, model_key = build(http_client=http_client, http_async_client=http_async_client)
+    embeddings = InstrumentedEmbeddings(
+        embeddings, settings.LOCAL_EMBEDDING_MODEL if provider == "local" else settings.EMBEDDING_MODEL,
+    )
+    if settings.EMBEDDING_CACHE_ENABLED if cache is None else cache:
+        embeddings = CachedEmbeddings(
+            embeddings,
+            model_key=model_key,
+            cache=SQLiteCache(
+                settings.CACHE_DB_PATH,
+                namespace="embeddings",
+                max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES,
+            ),
+        )
+    return embeddings
@@ -1,9 +1,27 @@
 from langchain_community.document_loaders import PyPDFLoader
-from typing import List
+from typing import Iterator, List
 from langchain_core.documents import Document
+from pypdf import PdfReader
+from app.core.observability import span
 
 class PDFLoader:
     @staticmethod
     def load(file_path: str) -> List[Document]:
         loader = PyPDFLoader(file_path)
         return loader.load()
+
+    @staticmethod
+    def lazy_load(file_path: str) -> Iterator[Document]:
+        """Yield one Document per page without materialising the whole book."""
+        pages = PyPDFLoader(file_path).lazy_load()
+        while True:
+            # only the extraction is timed, not the consumer's work between pages
+            with span("load"):
+                page = next(pages, None)
+            if page is None:
+                return
+            yield page
+
+    @staticmethod
+    def page_count(file_path: str) -> int:
+        return len(PdfReader(file_path).pages)
@@ -0,0 +1,163 @@
+"""Per-source ingest manifests for incremental re-ingestion.
+
+A manifest records the sha256 of the uploaded file and of every page's extracted text, keyed by
+collection and source. On a re-upload:
+
+- the same file hash means there is nothing to do;
+- otherwise ``PageDiff`` compares page hashes as the new file streams in. Unchanged pages are
+  skipped, pages that only moved keep their points under the new page number, and only new or
+  edited pages are processed. Points of old pages whose text is gone are deleted afterwards.
+
+Chunks can run into the next page, so the chunks starting on a page depend on its neighbours too
+(see ``StructuralSplitter``). A page is therefore only skipped when the pages before and after
+it are also the same as around its old position; otherwise it is split again.
+
+A source is the uploaded file name unless the upload names one. An upload that shares almost no
+page with the manifest of its source is a different document, not a revision, and is refused
+with ``SourceConflict`` rather than diffed against (and deleting) the other document's points,
+unless it is marked as replacing the source.
+
+Manifests live in the shared SQLite cache file, next to the collection content versions.
+"""
+import hashlib
+import json
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, List, Optional
+from app.core.cache import SQLiteCache
+from app.core.config import settings
+
+MANIFESTS_NAMESPACE = "ingest_manifests"
+
+
+class SourceConflict(Exception):
+    pass
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def page_sha256(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def shared_pages(previous: Dict[str, Any], page_hashes: List[str]) -> float:
+    """Share of the new upload's non-blank pages whose text is also in the ``previous`` manifest."""
+    blank = page_sha256("")
+    pages = [h for h in page_hashes if h != blank]
+    if not pages:
+        return 1.0
+    old = set(previous.get("pages") or [])
+    return sum(1 for h in pages if h in old) / len(pages)
+
+
+class ManifestStore:
+    def __init__(self, collection_name: Optional[str] = None, path: Optional[str] = None):
+        self.collection_name = collection_name or settings.QDRANT_COLLECTION_NAME
+        self._cache = SQLiteCache(path or settings.CACHE_DB_PATH, namespace=MANIFESTS_NAMESPACE)
+
+    def _key(self, source: str) -> str:
+        return f"{self.collection_name}:{source}"
+
+    def get(self, source: str) -> Optional[Dict[str, Any]]:
+        value = self._cache.get(self._key(source))
+        return json.loads(value) if value is not None else None
+
+    def set(self, source: str, file_hash: str, page_hashes: List[str], table_of_contents: List[str]):
+        self._cache.set(self._key(source), json.dumps({
+            "file_sha256": file_hash,
+            "pages": page_hashes,
+            "table_of_contents": table_of_contents,
+            "updated_at": time.time(),
+        }).encode("utf-8"))
+
+
+class PageDiff:
+    """Compares the pages of a new upload, in order, with the previous manifest's page hashes."""
+
+    def __init__(self, previous: Optional[Dict[str, Any]] = None):
+        self.old_pages: List[str] = list((previous or {}).get("pages") or [])
+        self._unclaimed: Dict[str, Deque[int]] = defaultdict(deque)
+        for index, page_hash in enumerate(self.old_pages):
+            self._unclaimed[page_hash].append(index)
+        self._claimed: set = set()
+        self.hashes: List[str] = []
+        self.unchanged: List[int] = []
+        # new page -> old page whose points it takes over
+        self.moved: Dict[int, int] = {}
+        self.changed: List[int] = []
+        # same text as an old page, split again because a neighbouring page changed
+        self.resplit: List[int] = []
+        self._old_index: Dict[int, int] = {}
+
+    def _claim(self, page_hash: str, index: Optional[int] = None) -> Optional[int]:
+        candidates = self._unclaimed.get(page_hash)
+        if not candidates:
+            return None
+        if index is not None:
+            if index not in candidates:
+                return None
+            candidates.remove(index)
+        else:
+            index = candidates.popleft()
+        self._claimed.add(index)
+        return index
+
+    def check(self, page: int, text: str) -> bool:
+        """Record page ``page`` of the new upload; True when its text is new.
+
+        Pages must be checked in order, starting at 0.
+        """
+        page_hash = page_sha256(text)
+        self.hashes.append(page_hash)
+        old = self._claim(page_hash, page)
+        if old is None:
+            old = self._claim(page_hash)
+        if old is None:
+            self.changed.append(page)
+            return True
+        self._old_index[page] = old
+        return False
+
+    def _same(self, page: int, old: int) -> bool:
+        new_hash = self.hashes[page] if 0 <= page < len(self.hashes) else None
+        old_hash = self.old_pages[old] if 0 <= old < len(self.old_pages) else None
+        return new_hash == old_hash
+
+    def decide(self, page: int) -> bool:
+        """True when ``page`` has to be split again.
+
+        Call once the next page has been checked, or after the last page.
+        """
+        old = self._old_index.get(page)
+        if old is None:
+            return True
+        if self._same(page - 1, old - 1) and self._same(page + 1, old + 1):
+            if old == page:
+                self.unchanged.append(page)
+            else:
+                self.moved[page] = old
+            return False
+        # its old points are replaced along with the neighbour's
+        self._claimed.discard(old)
+        self.resplit.append(page)
+        return True
+
+    def stale_pages(self) -> List[int]:
+        """Old pages whose content no new page reuses; their points are deleted."""
+        return [i for i in range(len(self.old_pages)) if i not in self._claimed]
+
+    def summary(self) -> Dict[str, int]:
+        return {
+            "pages": len(self.hashes),
+            "unchanged_pages": len(self.unchanged),
+            "moved_pages": len(self.moved),
+            "changed_pages": len(self.changed),
+            "resplit_pages": len(self.resplit),
+            "stale_pages": len(self.stale_pages()),
+        }
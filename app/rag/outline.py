@@ -0,0 +1,190 @@
+"""Page-based taxonomy from the book's own structure.
+
+``OutlineTaxonomy`` holds a chapter/section tree with the 0-based page where each entry starts.
+The tree comes from the PDF outline (bookmarks) or, for books without one, from the TOC
+extraction when the PDF has page labels to turn printed page numbers into page indexes.
+Chunks are then placed without a model call: the topic is the chapter and the subtopic is the
+deepest section open at the chunk.
+"""
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from langchain_core.documents import Document
+from pypdf import PdfReader
+
+_SPACE = re.compile(r"\s+")
+_NUMBERING = re.compile(r"^(chapter|section|part|unit|lesson)?\s*[\dIVXLC]+(\.\d+)*[.:)]?\s+", re.I)
+
+
+def _normalize(text: str) -> str:
+    return _SPACE.sub(" ", text or "").strip().lower()
+
+
+@dataclass
+class OutlineEntry:
+    title: str
+    level: int
+    page: int
+    parent: Optional[int] = None
+
+
+def _outline_entries(reader: PdfReader) -> List[OutlineEntry]:
+    entries: List[OutlineEntry] = []
+
+    def walk(items, level: int, parent: Optional[int]):
+        last = parent
+        for item in items:
+            if isinstance(item, list):
+                walk(item, level + 1, last)
+                continue
+            try:
+                page = reader.get_destination_page_number(item)
+            except Exception:
+                page = None
+            title = _SPACE.sub(" ", str(item.title or "")).strip()
+            if page is None or page < 0 or not title:
+                continue
+            entries.append(OutlineEntry(title=title, level=level, page=page, parent=parent))
+            last = len(entries) - 1
+
+    walk(reader.outline, 0, None)
+    return entries
+
+
+def _toc_entries(reader: PdfReader, toc_json: Any) -> List[OutlineEntry]:
+    """Chapter/section entries from a TOC_TEXT_EXTRACTOR_PROMPT answer, placed via page labels."""
+    if not isinstance(toc_json, dict) or not toc_json.get("is_table_of_contents"):
+        return []
+    if "/PageLabels" not in reader.trailer["/Root"]:
+        # without labels the offset between printed and physical page numbers is unknown
+        return []
+    label_pages: Dict[str, int] = {}
+    for index, label in enumerate(reader.page_labels):
+        label_pages.setdefault(str(label).strip().lower(), index)
+    entries: List[OutlineEntry] = []
+    chapter: Optional[int] = None
+    for item in toc_json.get("entries") or []:
+        if not isinstance(item, dict):
+            continue
+        page = label_pages.get(str(item.get("page_number") or "").strip().lower())
+        if page is None:
+            continue
+        chapter_title = _SPACE.sub(" ", str(item.get("chapter_title") or "")).strip()
+        section_title = _SPACE.sub(" ", str(item.get("section_title") or "")).strip()
+        if chapter_title and (chapter is None or entries[chapter].title != chapter_title):
+            entries.append(OutlineEntry(title=chapter_title, level=0, page=page))
+            chapter = len(entries) - 1
+        if section_title:
+            entries.append(OutlineEntry(title=section_title, level=1, page=page, parent=chapter))
+    return entries
+
+
+class OutlineTaxonomy:
+    """Places chunks in a chapter/section tree by page.
+
+    ``place`` keeps a cursor and must see a book's chunks in reading order. An entry becomes
+    current on the first chunk of its start page that contains its title (or a later entry's
+    title on that page), otherwise on the next page. A section starting mid-page therefore
+    doesn't claim the chunks before its heading.
+    """
+
+    def __init__(self, entries: List[OutlineEntry], subject: Optional[str] = None, origin: str = "outline"):
+        entries = self._drop_wrappers(entries)
+        order = sorted(range(len(entries)), key=lambda i: (entries[i].page, i))
+        self.entries = [entries[i] for i in order]
+        remap = {old: new for new, old in enumerate(order)}
+        for entry in self.entries:
+            entry.parent = remap.get(entry.parent) if entry.parent is not None else None
+        self.subject = subject
+        self.origin = origin
+        self._titles = [self._match_keys(e.title) for e in self.entries]
+        self._next = 0
+        self._current: Optional[int] = None
+
+    @staticmethod
+    def _drop_wrappers(entries: List[OutlineEntry]) -> List[OutlineEntry]:
+        """Remove a lone top-level entry (usually the book title) so chapters become topics."""
+        while entries and sum(1 for e in entries if e.parent is None) == 1 and len(entries) > 1:
+            root = next(i for i, e in enumerate(entries) if e.parent is None)
+            kept = []
+            index_map = {}
+            for i, e in enumerate(entries):
+                if i == root:
+                    continue
+                index_map[i] = len(kept)
+                kept.append(OutlineEntry(e.title, e.level - 1, e.page, None if e.parent == root else e.parent))
+            for e in kept:
+                e.parent = index_map.get(e.parent) if e.parent is not None else None
+            entries = kept
+        return entries
+
+    @staticmethod
+    def _match_keys(title: str) -> List[str]:
+        keys = [_normalize(title)]
+        stripped = _normalize(_NUMBERING.sub("", title))
+        if stripped and stripped != keys[0] and len(stripped) > 3:
+            keys.append(stripped)
+        return keys
+
+    @classmethod
+    def from_pdf(cls, file_path: str, toc_json: Any = None, reader: Optional[PdfReader] = None) -> Optional["OutlineTaxonomy"]:
+        """Tree from the PDF outline, else from ``toc_json``; None when neither places any page."""
+        reader = reader or PdfReader(file_path)
+        try:
+            entries = _outline_entries(reader)
+            origin = "outline"
+        except Exception:
+            entries = []
+        if not entries:
+            try:
+                entries = _toc_entries(reader, toc_json)
+                origin = "toc"
+            except Exception:
+                entries = []
+        return cls(entries, origin=origin) if entries else None
+
+    def chapters(self) -> List[str]:
+        return [e.title for e in self.entries if e.parent is None]
+
+    def to_json(self, limit: int = 200) -> str:
+        """Compact tree for prompts that still need the book structure (subject, fallback enrichment)."""
+        return json.dumps([
+            {"title": e.title, "level": e.level, "page": e.page + 1} for e in self.entries[:limit]
+        ], ensure_ascii=False)
+
+    def _ancestors(self, index: int) -> List[OutlineEntry]:
+        path = []
+        while index is not None:
+            path.append(self.entries[index])
+            index = self.entries[index].parent
+        return list(reversed(path))
+
+    def place(self, chunk: Document) -> Optional[Dict[str, Any]]:
+        """Taxonomy for the next chunk in reading order, or None without a page number.
+
+        Front matter before the first entry gets the subject only.
+        """
+        page = chunk.metadata.get("page")
+        if not isinstance(page, int):
+            return None
+        text = _normalize(chunk.page_content)
+        while self._next < len(self.entries) and self.entries[self._next].page < page:
+            self._current = self._next
+            self._next += 1
+        # entries starting on this page open at their heading; a later heading in the chunk
+        # also opens the ones before it (a chapter title often isn't repeated in the text)
+        probe = self._next
+        while probe < len(self.entries) and self.entries[probe].page == page:
+            if any(key in text for key in self._titles[probe]):
+                self._current = probe
+                self._next = probe + 1
+            probe += 1
+        if self._current is None:
+            return {"subject": self.subject, "topics": [], "subtopics": []}
+        path = self._ancestors(self._current)
+        return {
+            "subject": self.subject,
+            "topics": [path[0].title],
+            "subtopics": [path[-1].title] if len(path) > 1 else [],
+        }
@@ -0,0 +1,86 @@
+"""Compact point payload shared by every ingest mode.
+
+Each point stores the chunk text once, as ``page_content`` (what gets embedded and what prompts
+are built from), next to a small flat ``metadata`` object:
+
+    source                          original file name of the ingested PDF
+    page                            0-based page number, as reported by the PDF loader; the page a
+                                    chunk starts on
+    page_end, start_offset,
+    end_offset                      page the chunk ends on and character offsets into the start and
+                                    end pages' text (structural splitter only)
+    type                            "text" or "visual"
+    summary                         short vision summary (visual pages only)
+    subject, topic_names,
+    subtopic_names                  taxonomy names (enriched ingest only)
+"""
+import re
+from typing import Any, Dict, Optional
+from langchain_core.documents import Document
+from app.rag.taxonomy import flatten_taxonomy
+
+PAYLOAD_FIELDS = ("source", "page", "page_end", "start_offset", "end_offset", "type", "summary", "subject", "topic_names", "subtopic_names")
+SPAN_FIELDS = ("page_end", "start_offset", "end_offset")
+
+# legacy payloads kept the text a second time as metadata.full_content in this shape
+_LEGACY_FULL_CONTENT = re.compile(r"^Summary: (.*?)\nDescription: (.*)$", re.S)
+_TAXONOMY_KEYS = ("subject", "topics", "subtopics", "topic_names", "subtopic_names")
+
+
+def chunk_document(
+    text: str,
+    source: Optional[str],
+    page: Optional[int],
+    doc_type: str = "text",
+    summary: Optional[str] = None,
+    taxonomy: Optional[Dict[str, Any]] = None,
+    span: Optional[Dict[str, Any]] = None,
+) -> Document:
+    metadata: Dict[str, Any] = {"source": source, "page": page, "type": doc_type}
+    metadata.update(chunk_span(span))
+    summary = (summary or "").strip()
+    # a summary that is just the opening of the text adds nothing
+    if summary and not text.lstrip().startswith(summary):
+        metadata["summary"] = summary
+    if taxonomy:
+        if taxonomy.get("subject"):
+            metadata["subject"] = taxonomy["subject"]
+        if taxonomy.get("topics"):
+            metadata["topic_names"] = taxonomy["topics"]
+        if taxonomy.get("subtopics"):
+            metadata["subtopic_names"] = taxonomy["subtopics"]
+    return Document(page_content=text, metadata=metadata)
+
+
+def chunk_span(metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """The splitter's page_end/offset fields present in ``metadata``."""
+    return {k: metadata[k] for k in SPAN_FIELDS if (metadata or {}).get(k) is not None}
+
+
+def compact_document(doc: Document) -> Document:
+    """Rewrite a document from any earlier payload layout into the compact one.
+
+    Idempotent: a document already in the compact layout comes back unchanged.
+    """
+    metadata = doc.metadata or {}
+    text = doc.page_content or ""
+    summary = metadata.get("summary")
+    page = metadata.get("page")
+    doc_type = metadata.get("type") or "text"
+
+    full_content = metadata.get("full_content")
+    if isinstance(full_content, str):
+        match = _LEGACY_FULL_CONTENT.match(full_content)
+        if match:
+            summary, description = match.group(1), match.group(2)
+            text = description if description.strip() else (summary or text)
+        else:
+            text = full_content
+        if doc_type == "visual" and isinstance(page, int):
+            # legacy visual pages were numbered from 1
+            page -= 1
+    if doc_type != "visual":
+        summary = None
+
+    taxonomy = flatten_taxonomy(metadata) if any(k in metadata for k in _TAXONOMY_KEYS) else None
+    return chunk_document(text, metadata.get("source"), page, doc_type, summary=summary, taxonomy=taxonomy, span=metadata)
@@ -0,0 +1,58 @@
+"""Page rendering for the visual ingest pipeline.
+
+``render_window`` rasterises a few pages, downscales them and returns them encoded,
+so only a few page bitmaps exist at any time. It runs in a worker process: it must stay
+importable without the app settings and return only picklable values.
+"""
+from itertools import groupby
+from typing import Iterable, Iterator, List, Optional, Tuple
+from utils.helpers import pil_image_to_base64
+
+IMAGE_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+    "png": ("PNG", "image/png"),
+}
+
+
+def image_format(name: str) -> Tuple[str, str]:
+    """PIL format and MIME type for a VISUAL_IMAGE_FORMAT value."""
+    try:
+        return IMAGE_FORMATS[name.lower()]
+    except KeyError:
+        raise ValueError(f"Unsupported image format {name!r}; expected one of {sorted(IMAGE_FORMATS)}") from None
+
+
+def page_windows(pages: Iterable[int], window: int) -> Iterator[List[int]]:
+    """Split 0-based page numbers into lists of at most ``window`` pages, in order."""
+    window = max(1, window)
+    pages = sorted(pages)
+    for start in range(0, len(pages), window):
+        yield pages[start:start + window]
+
+
+def encode_page(img, fmt: str = "jpeg", quality: int = 80, max_side: Optional[int] = None) -> str:
+    if max_side and max(img.size) > max_side:
+        img.thumbnail((max_side, max_side))
+    pil_format, _ = image_format(fmt)
+    if pil_format == "JPEG" and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    return pil_image_to_base64(img, fmt=pil_format, quality=None if pil_format == "PNG" else quality)
+
+
+def render_window(file_path: str, pages: List[int], dpi: int, fmt: str = "jpeg",
+                  quality: int = 80, max_side: Optional[int] = None) -> List[Tuple[int, str]]:
+    """Render the given 0-based pages and return ``(page, base64 image)`` pairs.
+
+    Consecutive pages are rendered with one poppler call.
+    """
+    from pdf2image import convert_from_path
+
+    encoded = []
+    for _, run in groupby(enumerate(sorted(pages)), key=lambda item: item[1] - item[0]):
+        run = [page for _, page in run]
+        images = convert_from_path(file_path, dpi=dpi, first_page=run[0] + 1, last_page=run[-1] + 1, thread_count=1)
+        for page, img in zip(run, images):
+            encoded.append((page, encode_page(img, fmt, quality, max_side)))
+            img.close()
+    return encoded
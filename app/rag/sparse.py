@@ -0,0 +1,66 @@
+import re
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional
+from langchain_qdrant import SparseEmbeddings, SparseVector
+from app.core.config import settings
+
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+# kept short on purpose: only words that carry no topical signal in textbook prose
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have in is it its of on or that the this to was were
+which with will not no can into than then there these those they their them we you your our
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def term_index(term: str) -> int:
+    # stable across processes (unlike hash()), so documents and queries agree on indices
+    return zlib.crc32(term.encode("utf-8"))
+
+
+class BM25SparseEmbeddings(SparseEmbeddings):
+    """BM25-style sparse vectors for Qdrant hybrid search.
+
+    Documents get the BM25 term-frequency component, saturated by ``k1`` and length-normalised
+    by ``b`` against ``avg_doc_length``. Queries get a weight of 1 per distinct term. The IDF part
+    is applied by Qdrant at query time (``Modifier.IDF`` on the sparse vector config), so it stays
+    correct as the collection grows without re-encoding stored points.
+    """
+
+    def __init__(self, k1: Optional[float] = None, b: Optional[float] = None, avg_doc_length: Optional[float] = None):
+        self.k1 = k1 if k1 is not None else settings.BM25_K1
+        self.b = b if b is not None else settings.BM25_B
+        self.avg_doc_length = avg_doc_length or settings.BM25_AVG_DOC_LENGTH
+
+    @staticmethod
+    def _to_vector(weights: Dict[int, float]) -> SparseVector:
+        indices = sorted(weights)
+        return SparseVector(indices=indices, values=[weights[i] for i in indices])
+
+    def _embed_document(self, text: str) -> SparseVector:
+        tokens = tokenize(text)
+        norm = self.k1 * (1 - self.b + self.b * len(tokens) / self.avg_doc_length)
+        weights: Dict[int, float] = {}
+        for term, tf in Counter(tokens).items():
+            index = term_index(term)
+            # a crc32 collision merges two terms, which only slightly blurs their weights
+            weights[index] = weights.get(index, 0.0) + tf * (self.k1 + 1) / (tf + norm)
+        return self._to_vector(weights)
+
+    def embed_documents(self, texts: List[str]) -> List[SparseVector]:
+        return [self._embed_document(t) for t in texts]
+
+    def embed_query(self, text: str) -> SparseVector:
+        return self._to_vector({term_index(t): 1.0 for t in set(tokenize(text))})
+
+    async def aembed_documents(self, texts: List[str]) -> List[SparseVector]:
+        # pure CPU and fast; not worth a thread hop
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> SparseVector:
+        return self.embed_query(text)
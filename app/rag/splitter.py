@@ -1,13 +1,419 @@
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from typing import List
+"""Chunking of page streams.
+
+``TextSplitter`` is what the ingest pipeline uses. With RAG_SPLITTER=structural (the default) it
+runs ``StructuralSplitter``; "recursive" keeps LangChain's RecursiveCharacterTextSplitter, which
+sizes chunks in characters and splits every page on its own.
+"""
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 from app.core.config import settings
-class TextSplitter:
-    def __init__(self):
-        self.splitter = RecursiveCharacterTextSplitter(
-            chunk_size=settings.RAG_CHUNK_SIZE,
-            chunk_overlap=settings.RAG_CHUNK_OVERLAP,
+from app.core.observability import span
+from app.core.tokens import count_tokens
+
+# set on pages the splitter reads only for their boundary with the next page; no chunk starts on them
+SPLIT_CONTEXT_KEY = "split_context"
+
+_TERMINATORS = ".!?:;"
+_CLOSERS = "\"')]}”’»"
+_BULLET = re.compile(r"^(?:[•◦▪‣●○■□·*\-–—]|\(?\d{1,2}[.)]|\(?[a-zA-Z][.)]|\(?[ivxIVX]{1,4}[.)])\s+\S")
+_HEADING = re.compile(r"^(?:(?i:chapter|section|part|unit|lesson|appendix)\b|\d+(?:\.\d+)+\.?\s+\S|\d+\s+[A-Z])")
+_FURNITURE = re.compile(r"^(?:page\s+)?(?:\d{1,4}|[ivxlc]{1,6})$", re.I)
+_EQUATION_SYMBOLS = frozenset("=∑∫√≤≥≈≠∞∂∆±→×÷")
+_LONG_WORD = re.compile(r"[A-Za-z]{4,}")
+_SENTENCE_END = re.compile(r"[.!?][\"')\]”’]*\s+(?=[\"'(\[“‘]?[A-Z0-9])")
+_WORDS = re.compile(r"\S+")
+
+
+def _ends_sentence(text: str) -> bool:
+    stripped = text.rstrip().rstrip(_CLOSERS)
+    return bool(stripped) and stripped[-1] in _TERMINATORS
+
+
+def _is_equation(line: str) -> bool:
+    return len(line) <= 100 and any(c in _EQUATION_SYMBOLS for c in line) and len(_LONG_WORD.findall(line)) <= 2
+
+
+def _is_heading(line: str) -> bool:
+    if len(line) > 80 or len(line.split()) > 12 or line[-1] in ".,;":
+        return False
+    if _HEADING.match(line):
+        return True
+    letters = [c for c in line if c.isalpha()]
+    return len(letters) >= 4 and all(c.isupper() for c in letters)
+
+
+@dataclass
+class _Piece:
+    """Smallest unit a chunk boundary may fall between: a sentence, list item, equation or heading."""
+    # position of the piece's page in the stream, which every page has, unlike a page number
+    page: int
+    start: int
+    end: int
+    tokens: int
+    heading: bool = False
+    # an equation and the text right after it stay with what comes before them
+    glued: bool = False
+
+
+@dataclass
+class _Block:
+    kind: str  # "text", "list" or "heading"
+    pieces: List[_Piece]
+    # a text block whose last line doesn't end a sentence may continue on the next page
+    open: bool = False
+
+    @property
+    def tokens(self) -> int:
+        return sum(p.tokens for p in self.pieces)
+
+
+@dataclass
+class _Page:
+    # position in the stream; ``number`` is the "page" metadata, when the page has one
+    position: int
+    number: Optional[int]
+    text: str
+    metadata: Dict[str, Any]
+    blocks: List[_Block] = field(default_factory=list)
+    context: bool = False
+
+
+class StructuralSplitter:
+    """Token-sized chunks from one streaming pass over a book's pages.
+
+    Each page is parsed into headings, paragraphs, list items and equation lines (page-number
+    lines are dropped). Blocks are packed into chunks of at most ``chunk_tokens`` tokens; a block
+    that doesn't fit in the current chunk starts the next one, and only blocks larger than a chunk
+    are split, between sentences, list items or equations. A heading always starts a chunk and is
+    never left at the end of one. Chunks of the same block repeat up to ``overlap_tokens`` tokens
+    of trailing sentences.
+
+    A paragraph that runs over a page break (the page doesn't end a sentence, or the next page
+    starts in lowercase) is joined: its continuation, up to the next paragraph end (or the first
+    sentence end when the paragraph is long), goes into the last chunk of the earlier page. A
+    heading at the foot of a page likewise takes the start of its section along. Apart from that, chunk boundaries restart at every page, so the chunks starting on a page depend only
+    on that page and its two neighbours; incremental re-ingestion relies on this.
+
+    Chunk metadata is the page's metadata plus ``page``/``page_end`` (0-based pages where the
+    chunk starts and ends) and ``start_offset``/``end_offset`` (character offsets into those pages'
+    text).
+    """
+
+    def __init__(self, chunk_tokens: Optional[int] = None, overlap_tokens: Optional[int] = None):
+        self.chunk_tokens = max(16, chunk_tokens or settings.RAG_CHUNK_TOKENS)
+        self.overlap_tokens = settings.RAG_CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+        # a piece and the continuation from the next page always fit in one chunk together
+        self.max_piece_tokens = self.chunk_tokens // 2
+        self.max_head_tokens = self.chunk_tokens // 2
+
+    def split_iter(self, documents: Iterable[Document]) -> Iterator[Document]:
+        pending: Optional[_Page] = None
+        for position, doc in enumerate(documents):
+            with span("split"):
+                page = self._parse(doc, position)
+                chunks = self._finish(pending, page) if pending is not None else []
+            yield from chunks
+            pending = page
+        if pending is not None:
+            with span("split"):
+                chunks = self._finish(pending, None)
+            yield from chunks
+
+    def split(self, documents: List[Document]) -> List[Document]:
+        return list(self.split_iter(documents))
+
+    # parsing
+
+    @staticmethod
+    def _lines(text: str) -> List[Tuple[str, int, int]]:
+        lines, offset = [], 0
+        for raw in text.split("\n"):
+            stripped = raw.strip()
+            start = offset + len(raw) - len(raw.lstrip())
+            lines.append((stripped, start, start + len(stripped)))
+            offset += len(raw) + 1
+        filled = [i for i, (line, _, _) in enumerate(lines) if line]
+        # running page numbers at the top or bottom of the page
+        for i in filled[:1] + filled[-1:]:
+            if _FURNITURE.match(lines[i][0]):
+                lines[i] = ("", lines[i][1], lines[i][1])
+        return lines
+
+    def _parse(self, doc: Document, position: int) -> _Page:
+        metadata = {k: v for k, v in (doc.metadata or {}).items() if k != SPLIT_CONTEXT_KEY}
+        number = metadata.get("page")
+        page = _Page(
+            position=position,
+            number=number if isinstance(number, int) else None,
+            text=doc.page_content or "",
+            metadata=metadata,
+            context=bool((doc.metadata or {}).get(SPLIT_CONTEXT_KEY)),
         )
+        lines = self._lines(page.text)
+        widths = sorted(len(line) for line, _, _ in lines if line)
+        short = 0.75 * widths[int(len(widths) * 0.9)] if widths else 0
+        # runs per block: ("text" | "equation" | "item", start, end)
+        raw_blocks: List[Tuple[str, List[List[Any]]]] = []
+        current: Optional[Tuple[str, List[List[Any]]]] = None
+        previous: Optional[str] = None
+
+        def close():
+            nonlocal current
+            if current is not None:
+                raw_blocks.append(current)
+            current = None
+
+        for line, start, end in lines:
+            if not line:
+                close()
+                previous = None
+                continue
+            ended = previous is None or _ends_sentence(previous)
+            if ended and _is_heading(line) and not _is_equation(line):
+                close()
+                raw_blocks.append(("heading", [["text", start, end]]))
+                previous = None
+                continue
+            if _is_equation(line):
+                if current is None:
+                    current = ("text", [])
+                current[1].append(["equation", start, end])
+            elif _BULLET.match(line):
+                if current is None or current[0] != "list":
+                    close()
+                    current = ("list", [])
+                current[1].append(["item", start, end])
+            else:
+                ended = previous is not None and _ends_sentence(previous)
+                broke = ended and len(previous) < short
+                # wrapped list items continue mid-sentence; a full sentence after an item ends the list
+                if current is not None and (broke or (current[0] == "list" and (ended or current[1][-1][0] != "item"))):
+                    close()
+                if current is None:
+                    current = ("text", [])
+                runs = current[1]
+                if runs and runs[-1][0] in ("text", "item"):
+                    runs[-1][2] = end
+                else:
+                    runs.append(["text", start, end])
+            previous = line
+        close()
+
+        for kind, runs in raw_blocks:
+            pieces: List[_Piece] = []
+            after_equation = False
+            for run_kind, start, end in runs:
+                if run_kind in ("text", "item") and kind != "heading":
+                    spans = self._sentences(page.text, start, end)
+                else:
+                    spans = [(start, end)]
+                for i, (s, e) in enumerate(spans):
+                    # one more token for the separator the piece is joined with
+                    piece = _Piece(page.position, s, e, count_tokens(page.text[s:e]) + 1, heading=kind == "heading",
+                                   glued=bool(pieces) and (run_kind == "equation" or (after_equation and i == 0)))
+                    pieces.extend(self._split_piece(page.text, piece, self.max_piece_tokens))
+                after_equation = run_kind == "equation"
+            last = runs[-1]
+            is_open = kind == "text" and last[0] == "text" and not _ends_sentence(page.text[last[1]:last[2]])
+            page.blocks.append(_Block(kind, pieces, open=is_open))
+        return page
+
+    @staticmethod
+    def _sentences(text: str, start: int, end: int) -> List[Tuple[int, int]]:
+        spans, position = [], start
+        for match in _SENTENCE_END.finditer(text, start, end):
+            spans.append((position, match.start() + len(match.group().rstrip())))
+            position = match.end()
+        if position < end:
+            spans.append((position, end))
+        return spans
+
+    @staticmethod
+    def _split_piece(text: str, piece: _Piece, limit: int) -> List[_Piece]:
+        """Cut a piece over ``limit`` tokens between words into parts of similar length."""
+        if piece.tokens <= limit:
+            return [piece]
+        words = list(_WORDS.finditer(text, piece.start, piece.end))
+        parts = min(len(words), math.ceil(piece.tokens / limit))
+        if parts <= 1:
+            return [piece]
+        size = math.ceil(len(words) / parts)
+        result = []
+        for i in range(0, len(words), size):
+            group = words[i:i + size]
+            s, e = group[0].start(), group[-1].end()
+            result.append(_Piece(piece.page, s, e, count_tokens(text[s:e]) + 1, piece.heading, piece.glued and not result))
+        return result
+
+    # page boundaries and packing
+
+    def _take_head(self, page: _Page) -> List[_Piece]:
+        """Remove and return the start of ``page`` that continues the previous page's paragraph."""
+        block = page.blocks[0]
+        if block.tokens <= self.max_head_tokens:
+            page.blocks.pop(0)
+            return block.pieces
+        first = self._split_piece(page.text, block.pieces[0], self.max_head_tokens)
+        head, rest = first[:1], first[1:] + block.pieces[1:]
+        # an equation ending the sentence comes along, with the text right after it
+        while rest and rest[0].glued and sum(p.tokens for p in head) + rest[0].tokens <= self.max_head_tokens:
+            head.append(rest.pop(0))
+        block.pieces = rest
+        if not block.pieces:
+            page.blocks.pop(0)
+        return head
+
+    def _finish(self, page: _Page, following: Optional[_Page]) -> List[Document]:
+        head: List[_Piece] = []
+        if (
+            following is not None
+            and self._adjacent(page, following)
+            and page.blocks
+            and following.blocks
+            and following.blocks[0].kind != "heading"
+        ):
+            first = following.blocks[0].pieces[0]
+            last = page.blocks[-1]
+            continues = last.kind == "text" and (last.open or following.text[first.start:first.start + 1].islower())
+            # a heading at the foot of a page takes the start of its section along
+            if continues or last.kind == "heading":
+                head = self._take_head(following)
+        if page.context:
+            return []
+        pages = {page.position: page}
+        if following is not None:
+            pages[following.position] = following
+        return [self._document(chunk, page.metadata, pages) for chunk in self._pack(page.blocks, head)]
+
+    @staticmethod
+    def _adjacent(page: _Page, following: _Page) -> bool:
+        # the stream can skip pages (incremental re-ingestion), so numbered pages must be consecutive;
+        # pages without a number can only be taken in stream order
+        if page.number is None or following.number is None:
+            return True
+        return following.number == page.number + 1
+
+    def _pack(self, blocks: List[_Block], head: List[_Piece]) -> Iterator[List[_Piece]]:
+        budget = self.chunk_tokens
+        # a heading is packed together with the block that follows it
+        units: List[List[_Piece]] = []
+        for block in blocks:
+            if units and units[-1] and units[-1][-1].heading:
+                units[-1].extend(block.pieces)
+            else:
+                units.append(list(block.pieces))
+        chunk: List[_Piece] = []
+        tokens = 0
+
+        def flush(carry: List[_Piece]) -> Iterator[List[_Piece]]:
+            nonlocal chunk, tokens
+            while chunk and chunk[-1].heading:
+                carry.insert(0, chunk.pop())
+            if chunk:
+                yield chunk
+            chunk = carry
+            tokens = sum(p.tokens for p in chunk)
+
+        def overlap() -> List[_Piece]:
+            carry, total = [], 0
+            for piece in reversed(chunk):
+                if piece.heading or total + piece.tokens > self.overlap_tokens:
+                    break
+                carry.insert(0, piece)
+                total += piece.tokens
+            return carry
+
+        for unit in units:
+            unit_tokens = sum(p.tokens for p in unit)
+            if unit[0].heading and any(not p.heading for p in chunk):
+                yield from flush([])
+            if unit_tokens <= budget:
+                if tokens + unit_tokens > budget:
+                    yield from flush([])
+                chunk.extend(unit)
+                tokens += unit_tokens
+                continue
+            groups: List[List[_Piece]] = []
+            for piece in unit:
+                if piece.glued and groups and sum(p.tokens for p in groups[-1]) + piece.tokens <= budget:
+                    groups[-1].append(piece)
+                else:
+                    groups.append([piece])
+            for group in groups:
+                group_tokens = sum(p.tokens for p in group)
+                if tokens + group_tokens > budget:
+                    carry = overlap()
+                    if sum(p.tokens for p in carry) + group_tokens > budget:
+                        carry = []
+                    yield from flush(carry)
+                chunk.extend(group)
+                tokens += group_tokens
+        if head:
+            head_tokens = sum(p.tokens for p in head)
+            if tokens + head_tokens > budget:
+                # the next page's continuation never starts a chunk of its own; the last piece
+                # (with an equation glued to it) moves along with it instead
+                carry: List[_Piece] = []
+                while len(chunk) > 1:
+                    carry.insert(0, chunk.pop())
+                    if not carry[0].glued:
+                        break
+                if len(carry) > 1 and sum(p.tokens for p in carry) + head_tokens > budget:
+                    chunk.extend(carry[:-1])
+                    carry = carry[-1:]
+                yield from flush(carry)
+            chunk.extend(head)
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def _document(pieces: List[_Piece], metadata: Dict[str, Any], pages: Dict[int, _Page]) -> Document:
+        parts = []
+        for previous, piece in zip([None] + pieces[:-1], pieces):
+            text = pages[piece.page].text
+            if previous is not None:
+                gap = text[previous.end:piece.start] if previous.page == piece.page else "\n"
+                parts.append(gap if gap.isspace() else "\n")
+            parts.append(text[piece.start:piece.end])
+        first, last = pieces[0], pieces[-1]
+        return Document(page_content="".join(parts), metadata={
+            **metadata,
+            "page": pages[first.page].number,
+            "page_end": pages[last.page].number,
+            "start_offset": first.start,
+            "end_offset": last.end,
+        })
+
+
+class TextSplitter:
+    def __init__(self, kind: Optional[str] = None):
+        kind = (kind or settings.RAG_SPLITTER).lower()
+        if kind == "structural":
+            self.splitter = StructuralSplitter()
+        elif kind == "recursive":
+            self.splitter = RecursiveCharacterTextSplitter(
+                chunk_size=settings.RAG_CHUNK_SIZE,
+                chunk_overlap=settings.RAG_CHUNK_OVERLAP,
+            )
+        else:
+            raise ValueError(f"Unsupported RAG_SPLITTER {kind!r}; expected 'structural' or 'recursive'")
+        self.kind = kind
 
     def split(self, documents: List[Document]) -> List[Document]:
-        return self.splitter.split_documents(documents)
+        return list(self.split_iter(documents))
+
+    def split_iter(self, documents: Iterable[Document]) -> Iterator[Document]:
+        """Split documents one at a time so chunks can be consumed as pages stream in."""
+        if self.kind == "structural":
+            yield from self.splitter.split_iter(documents)
+            return
+        for doc in documents:
+            if doc.metadata.get(SPLIT_CONTEXT_KEY):
+                continue
+            with span("split"):
+                chunks = self.splitter.split_documents([doc])
+            yield from chunks
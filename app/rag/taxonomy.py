@@ -0,0 +1,47 @@
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+from langchain_core.documents import Document
+
+
+def _names(items: Any, key: str) -> List[str]:
+    names: List[str] = []
+    for item in items or []:
+        name = item.get(key) if isinstance(item, dict) else item
+        if isinstance(name, str) and name.strip() and name.strip() not in names:
+            names.append(name.strip())
+    return names
+
+
+def flatten_taxonomy(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce enrichment metadata to ``{"subject", "topics", "subtopics"}`` with plain string names.
+
+    Accepts the nested ``topics -> subtopics`` objects returned by PAGE_CHUNK_TEXT_PROMPT as well
+    as already-flattened lists of names, including the ``topic_names``/``subtopic_names`` of
+    stored chunk payloads.
+    """
+    topics = metadata.get("topics") or metadata.get("topic_names") or []
+    subtopics = list(metadata.get("subtopics") or metadata.get("subtopic_names") or [])
+    for topic in topics:
+        if isinstance(topic, dict):
+            subtopics.extend(topic.get("subtopics") or [])
+    subject = metadata.get("subject")
+    return {
+        "subject": subject.strip() if isinstance(subject, str) and subject.strip() else None,
+        "topics": _names(topics, "topic_name"),
+        "subtopics": _names(subtopics, "subtopic_name"),
+    }
+
+
+def taxonomy_from_documents(documents: Iterable[Document]) -> Dict[str, Any]:
+    """Merge the taxonomy of several documents: the most common subject and all topic/subtopic names."""
+    subjects: Counter = Counter()
+    topics: List[str] = []
+    subtopics: List[str] = []
+    for doc in documents:
+        taxonomy = flatten_taxonomy(doc.metadata or {})
+        if taxonomy["subject"]:
+            subjects[taxonomy["subject"]] += 1
+        topics.extend(t for t in taxonomy["topics"] if t not in topics)
+        subtopics.extend(s for s in taxonomy["subtopics"] if s not in subtopics)
+    subject: Optional[str] = subjects.most_common(1)[0][0] if subjects else None
+    return {"subject": subject, "topics": topics, "subtopics": subtopics}
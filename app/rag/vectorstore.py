@@ -1,41 +1,386 @@
-from qdrant_client import QdrantClient,models
-from langchain_openai import OpenAIEmbeddings
+from qdrant_client import QdrantClient, AsyncQdrantClient, models
 from app.core.config import settings
-from typing import List
+from app.core.cache import SQLiteCache
+from app.core.observability import span
+from app.core.qdrant import make_async_qdrant_client, make_qdrant_client
+from app.rag.embeddings import get_embeddings
+from app.rag.sparse import BM25SparseEmbeddings
+from typing import Dict, List, Optional
 from langchain_core.documents import Document
-from langchain_qdrant import QdrantVectorStore
-from uuid import uuid4
+from langchain_core.embeddings import Embeddings
+from langchain_qdrant import QdrantVectorStore, RetrievalMode
+from uuid import UUID, uuid4, uuid5
+import hashlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# SQLiteCache namespace holding one content-version token per collection
+CONTENT_VERSIONS_NAMESPACE = "collection_versions"
+
+# points per upsert request, as QdrantVectorStore batches them
+UPSERT_BATCH_SIZE = 64
+
+# fixed namespace so the same source/content pair always maps to the same point id
+POINT_ID_NAMESPACE = UUID("6f1c9a52-3d0e-4b7a-9a55-0c2f4f1d8e11")
+
+
+def document_point_id(document: Document) -> str:
+    source = (document.metadata or {}).get("source") or ""
+    content_hash = hashlib.sha256((document.page_content or "").encode("utf-8")).hexdigest()
+    return str(uuid5(POINT_ID_NAMESPACE, f"{source}:{content_hash}"))
+
+
+# query-time filters and the keyword-indexed payload fields they match; QdrantVectorStore nests
+# document metadata under "metadata", and topics/subtopics are the flattened name lists
+FILTER_FIELDS = {
+    "subject": "metadata.subject",
+    "topic": "metadata.topic_names",
+    "subtopic": "metadata.subtopic_names",
+    "source": "metadata.source",
+}
+
+# 0-based page of a chunk; integer-indexed for the per-page deletes of incremental re-ingestion
+PAGE_FIELD = "metadata.page"
+
+
+def build_filter(filters: Optional[Dict[str, Optional[str]]] = None, fields: Optional[Dict[str, str]] = None) -> Optional[models.Filter]:
+    """Turn ``{"subject": ..., "topic": ..., "source": ...}`` into a Qdrant filter (all must match).
+
+    Empty values are ignored; returns None when nothing is left to filter on.
+    """
+    fields = fields or FILTER_FIELDS
+    must = []
+    for name, value in (filters or {}).items():
+        if not value:
+            continue
+        if name not in fields:
+            raise ValueError(f"Unsupported filter '{name}'; expected one of {sorted(fields)}")
+        must.append(models.FieldCondition(key=fields[name], match=models.MatchValue(value=value)))
+    return models.Filter(must=must) if must else None
+
+
+def quantization_config(kind: Optional[str] = None):
+    """Qdrant quantization for ``kind`` ("scalar", "binary" or "none"; default QDRANT_QUANTIZATION).
+
+    The quantized copy is what HNSW searches; the original float32 vectors stay on disk for
+    rescoring.
+    """
+    kind = (kind or settings.QDRANT_QUANTIZATION).lower()
+    if kind == "scalar":
+        return models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(
+            type=models.ScalarType.INT8,
+            quantile=0.99,
+            always_ram=settings.QDRANT_QUANTIZATION_ALWAYS_RAM,
+        ))
+    if kind == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(
+            always_ram=settings.QDRANT_QUANTIZATION_ALWAYS_RAM,
+        ))
+    if kind == "none":
+        return None
+    raise ValueError(f"Unsupported QDRANT_QUANTIZATION '{kind}'; expected scalar, binary or none")
+
+
+def search_params(kind: Optional[str] = None, rescore: Optional[bool] = None, oversampling: Optional[float] = None) -> Optional[models.SearchParams]:
+    """Search over the quantized vectors, fetch ``oversampling`` x limit candidates and rescore
+    them against the original vectors."""
+    if quantization_config(kind) is None:
+        return None
+    return models.SearchParams(quantization=models.QuantizationSearchParams(
+        rescore=settings.QDRANT_RESCORE if rescore is None else rescore,
+        oversampling=oversampling or settings.QDRANT_OVERSAMPLING,
+    ))
+
+
 class VectorStoreManager:
-    def __init__(self):
-        self.embeddings = OpenAIEmbeddings(model=settings.EMBEDDING_MODEL)
-        self.client = QdrantClient(url=settings.QDRANT_URL, api_key=settings.QDRANT_API_KEY)
-        self.collection_name = settings.QDRANT_COLLECTION_NAME
+    def __init__(self, client: Optional[QdrantClient] = None, async_client: Optional[AsyncQdrantClient] = None, embeddings: Optional[Embeddings] = None,
+                 collection_name: Optional[str] = None):
+        self.embeddings = embeddings or get_embeddings()
+        self.client = client or make_qdrant_client()
+        self.async_client = async_client or make_async_qdrant_client(self.client)
+        self.collection_name = collection_name or settings.QDRANT_COLLECTION_NAME
+        self._vectorstore: Optional[QdrantVectorStore] = None
+        # shared across worker processes so every semantic cache sees new content
+        self._versions = SQLiteCache(settings.CACHE_DB_PATH, namespace=CONTENT_VERSIONS_NAMESPACE)
+        # (token, monotonic time read), so request paths don't hit SQLite on every lookup
+        self._version_read: Optional[tuple] = None
+        self.sparse_embeddings = BM25SparseEmbeddings()
+        self.hybrid = False
+        self.search_params = search_params()
         self.create_collection_if_not_exists()
 
     def create_collection_if_not_exists(self):
         if not self.client.collection_exists(collection_name=self.collection_name):
-            print(f"Creating Qdrant collection: {self.collection_name}")
+            logger.info("Creating Qdrant collection", extra={"collection": self.collection_name})
             self.client.create_collection(
                 collection_name=self.collection_name,
                 vectors_config=models.VectorParams(
                     size=settings.EMBEDDING_DIMENSION,
                     distance=models.Distance.COSINE,
+                    on_disk=settings.QDRANT_ON_DISK_VECTORS,
                 ),
+                # IDF is applied server-side, so documents only carry the BM25 term-frequency part
+                sparse_vectors_config={
+                    settings.SPARSE_VECTOR_NAME: models.SparseVectorParams(
+                        index=models.SparseIndexParams(on_disk=settings.QDRANT_ON_DISK_VECTORS),
+                        modifier=models.Modifier.IDF,
+                    ),
+                } if settings.HYBRID_SEARCH_ENABLED else None,
+                # payload dominates memory on large collections; only the indexed fields stay hot
+                on_disk_payload=settings.QDRANT_ON_DISK_PAYLOAD,
+                quantization_config=quantization_config(),
             )
         else:
-            print(f"Qdrant collection '{self.collection_name}' already exists.")
+            logger.info("Qdrant collection already exists", extra={"collection": self.collection_name})
+
+        info = self.client.get_collection(collection_name=self.collection_name)
+        dense = info.config.params.vectors
+        size = dense.get("").size if isinstance(dense, dict) and "" in dense else getattr(dense, "size", None)
+        if size is not None and size != settings.EMBEDDING_DIMENSION:
+            raise ValueError(
+                f"Collection '{self.collection_name}' stores {size}-dimensional vectors but EMBEDDING_DIMENSION is "
+                f"{settings.EMBEDDING_DIMENSION}; use a new QDRANT_COLLECTION_NAME or re-ingest into a fresh collection."
+            )
+        # keyword indexes let filtered searches skip non-matching points instead of scanning them
+        for field in FILTER_FIELDS.values():
+            if field not in (info.payload_schema or {}):
+                self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field,
+                    field_schema=models.KeywordIndexParams(
+                        type=models.KeywordIndexType.KEYWORD,
+                        on_disk=settings.QDRANT_ON_DISK_PAYLOAD,
+                    ),
+                )
+        if PAGE_FIELD not in (info.payload_schema or {}):
+            self.client.create_payload_index(
+                collection_name=self.collection_name,
+                field_name=PAGE_FIELD,
+                field_schema=models.IntegerIndexParams(
+                    type=models.IntegerIndexType.INTEGER,
+                    lookup=True,
+                    range=False,
+                    on_disk=settings.QDRANT_ON_DISK_PAYLOAD,
+                ),
+            )
+        sparse_vectors = info.config.params.sparse_vectors or {}
+        self.hybrid = settings.HYBRID_SEARCH_ENABLED and settings.SPARSE_VECTOR_NAME in sparse_vectors
+        if settings.HYBRID_SEARCH_ENABLED and not self.hybrid:
+            logger.warning(
+                "Collection has no sparse vector; using dense-only retrieval. Recreate it to enable hybrid search.",
+                extra={"collection": self.collection_name, "sparse_vector": settings.SPARSE_VECTOR_NAME},
+            )
+
     def get_vectorstore(self):
-        vectorstore = QdrantVectorStore(
-            client=self.client,
-            collection_name=self.collection_name,
-            embedding=self.embeddings
-        )
-        return vectorstore
+        # QdrantVectorStore validates the collection on construction, so build it once
+        if self._vectorstore is None:
+            hybrid = {}
+            if self.hybrid:
+                # the retriever searches the dense and BM25 vectors add_documents writes
+                hybrid = {
+                    "retrieval_mode": RetrievalMode.HYBRID,
+                    "sparse_embedding": self.sparse_embeddings,
+                    "sparse_vector_name": settings.SPARSE_VECTOR_NAME,
+                }
+            self._vectorstore = QdrantVectorStore(
+                client=self.client,
+                collection_name=self.collection_name,
+                embedding=self.embeddings,
+                **hybrid,
+            )
+        return self._vectorstore
 
     def add_documents(self, documents: List[Document]):
-        uuids = [str(uuid4()) for _ in range(len(documents))]
-        return self.get_vectorstore().add_documents(documents=documents, ids=uuids)
+        """Upsert documents under ids derived from source and content.
+
+        Re-adding an unchanged chunk overwrites its existing point instead of creating a
+        duplicate, and repeated chunks within one call are sent once.
+        """
+        unique: dict = {}
+        for doc in documents:
+            unique.setdefault(document_point_id(doc), doc)
+        if len(unique) < len(documents):
+            logger.info("Skipping duplicate chunks", extra={"duplicates": len(documents) - len(unique)})
+        if not unique:
+            return []
+        ids = list(unique)
+        # same point layout QdrantVectorStore writes and reads: unnamed dense vector, optional BM25
+        # sparse vector, and the text and metadata under its payload keys
+        for start in range(0, len(ids), UPSERT_BATCH_SIZE):
+            batch_ids = ids[start:start + UPSERT_BATCH_SIZE]
+            texts = [unique[i].page_content for i in batch_ids]
+            dense = self.embeddings.embed_documents(texts)
+            sparse = self.sparse_embeddings.embed_documents(texts) if self.hybrid else [None] * len(texts)
+            points = []
+            for point_id, text, dense_vector, sparse_vector in zip(batch_ids, texts, dense, sparse):
+                vector = {"": dense_vector}
+                if sparse_vector is not None:
+                    vector[settings.SPARSE_VECTOR_NAME] = models.SparseVector(indices=sparse_vector.indices, values=sparse_vector.values)
+                payload = {
+                    QdrantVectorStore.CONTENT_KEY: text,
+                    QdrantVectorStore.METADATA_KEY: unique[point_id].metadata,
+                }
+                points.append(models.PointStruct(id=point_id, vector=vector, payload=payload))
+            with span("upsert", points=len(points)):
+                self.client.upsert(collection_name=self.collection_name, points=points)
+        self.bump_content_version()
+        return ids
+
+    @staticmethod
+    def _source_pages_filter(source: str, pages: Optional[List[int]] = None, keep_ids: Optional[List[str]] = None) -> models.Filter:
+        must = [models.FieldCondition(key=FILTER_FIELDS["source"], match=models.MatchValue(value=source))]
+        if pages is not None:
+            must.append(models.FieldCondition(key=PAGE_FIELD, match=models.MatchAny(any=list(pages))))
+        must_not = [models.HasIdCondition(has_id=list(keep_ids))] if keep_ids else None
+        return models.Filter(must=must, must_not=must_not)
+
+    def delete_pages(self, source: str, pages: Optional[List[int]] = None, keep_ids: Optional[List[str]] = None) -> int:
+        """Delete the points of ``source`` on ``pages`` (all pages when None), except ``keep_ids``.
+
+        Returns the number of points deleted.
+        """
+        if pages is not None and not pages:
+            return 0
+        points_filter = self._source_pages_filter(source, pages, keep_ids)
+        count = self.client.count(collection_name=self.collection_name, count_filter=points_filter, exact=True).count
+        if count:
+            with span("delete_points", points=count):
+                self.client.delete(collection_name=self.collection_name, points_selector=models.FilterSelector(filter=points_filter))
+            self.bump_content_version()
+        return count
+
+    def move_pages(self, source: str, moves: Dict[int, int], keep_ids: Optional[List[str]] = None) -> int:
+        """Renumber the points of ``source`` from old to new page (``{old: new}``) without re-embedding.
+
+        Points are collected before any update, so chains and swaps of page numbers are safe.
+        Returns the number of points moved.
+        """
+        moves = {old: new for old, new in moves.items() if old != new}
+        if not moves:
+            return 0
+        # (start page, end page) -> ids; chunks that run into the next page move with it
+        by_span: Dict[tuple, List] = {}
+        offset = None
+        points_filter = self._source_pages_filter(source, list(moves), keep_ids)
+        while True:
+            records, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=points_filter,
+                limit=256,
+                offset=offset,
+                with_payload=[PAGE_FIELD, "metadata.page_end"],
+                with_vectors=False,
+            )
+            for record in records:
+                metadata = record.payload.get("metadata") or {}
+                by_span.setdefault((metadata.get("page"), metadata.get("page_end")), []).append(record.id)
+            if offset is None:
+                break
+        moved = 0
+        for (old, old_end), ids in by_span.items():
+            if old not in moves:
+                continue
+            payload = {"page": moves[old]}
+            if isinstance(old_end, int):
+                payload["page_end"] = moves[old] + old_end - old
+            self.client.set_payload(
+                collection_name=self.collection_name,
+                payload=payload,
+                points=ids,
+                key=QdrantVectorStore.METADATA_KEY,
+            )
+            moved += len(ids)
+        if moved:
+            self.bump_content_version()
+        return moved
+
+    def content_version(self) -> Optional[str]:
+        """Opaque token that changes whenever documents are written to the collection.
 
-    def get_retriever(self):
+        Reads are kept for CONTENT_VERSION_TTL_SECONDS, so another worker's write shows up
+        within that window; writes through this manager show up at once.
+        """
+        now = time.monotonic()
+        if self._version_read is not None and now - self._version_read[1] < settings.CONTENT_VERSION_TTL_SECONDS:
+            return self._version_read[0]
+        value = self._versions.get(self.collection_name, touch=False)
+        version = value.decode("utf-8") if value is not None else None
+        self._version_read = (version, now)
+        return version
+
+    def bump_content_version(self):
+        version = uuid4().hex
+        self._versions.set(self.collection_name, version.encode("utf-8"))
+        self._version_read = (version, time.monotonic())
+
+    def get_retriever(self, filters: Optional[Dict[str, Optional[str]]] = None):
         vectorstore = self.get_vectorstore()
-        return vectorstore.as_retriever(search_kwargs={"k": settings.TOP_K_CONTEXT})
+        search_kwargs = {"k": settings.TOP_K_CONTEXT}
+        if self.search_params is not None:
+            search_kwargs["search_params"] = self.search_params
+        query_filter = build_filter(filters)
+        if query_filter is not None:
+            search_kwargs["filter"] = query_filter
+        return vectorstore.as_retriever(search_kwargs=search_kwargs)
+
+    async def aretrieve(
+        self,
+        query: str,
+        k: Optional[int] = None,
+        vector: Optional[List[float]] = None,
+        with_vectors: bool = False,
+        filters: Optional[Dict[str, Optional[str]]] = None,
+    ) -> List[Document]:
+        """Non-blocking retrieval using the async embeddings and Qdrant clients.
+
+        On a hybrid collection the dense and BM25 sparse hits are fused with reciprocal rank
+        fusion; otherwise it is dense-only. ``filters`` restricts the search by subject, topic,
+        subtopic or source. Pass ``vector`` when the query has already been embedded to skip
+        the embedding call. Each document's metadata carries the hit's ``_score`` and, with
+        ``with_vectors``, its stored dense ``_vector``.
+        """
+        if vector is None:
+            vector = await self.embeddings.aembed_query(query)
+        limit = k or settings.TOP_K_CONTEXT
+        query_filter = build_filter(filters)
+        sparse = self.sparse_embeddings.embed_query(query) if self.hybrid else None
+        if sparse is not None and sparse.indices:
+            prefetch_limit = max(limit, settings.HYBRID_PREFETCH_K)
+            response = await self.async_client.query_points(
+                collection_name=self.collection_name,
+                prefetch=[
+                    models.Prefetch(query=vector, limit=prefetch_limit, filter=query_filter, params=self.search_params),
+                    models.Prefetch(
+                        query=models.SparseVector(indices=sparse.indices, values=sparse.values),
+                        using=settings.SPARSE_VECTOR_NAME,
+                        limit=prefetch_limit,
+                        filter=query_filter,
+                    ),
+                ],
+                query=models.FusionQuery(fusion=models.Fusion.RRF),
+                limit=limit,
+                with_payload=True,
+                with_vectors=with_vectors,
+            )
+        else:
+            response = await self.async_client.query_points(
+                collection_name=self.collection_name,
+                query=vector,
+                query_filter=query_filter,
+                search_params=self.search_params,
+                limit=limit,
+                with_payload=True,
+                with_vectors=with_vectors,
+            )
+        documents = []
+        for point in response.points:
+            payload = point.payload or {}
+            metadata = dict(payload.get(QdrantVectorStore.METADATA_KEY) or {})
+            metadata.update({"_id": point.id, "_collection_name": self.collection_name, "_score": point.score})
+            dense = point.vector.get("") if isinstance(point.vector, dict) else point.vector
+            if with_vectors and dense is not None:
+                metadata["_vector"] = dense
+            documents.append(Document(page_content=payload.get(QdrantVectorStore.CONTENT_KEY) or "", metadata=metadata))
+        return documents
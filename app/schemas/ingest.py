@@ -1,6 +1,38 @@
 from pydantic import BaseModel
-from typing import List
+from typing import Any, Dict, List, Optional
 
 class IngestResponse(BaseModel):
     message: str
     table_of_contents: List[str]
+
+
+class IngestJobResponse(BaseModel):
+    job_id: str
+    status: str
+    status_url: str
+
+
+class IngestJobStatus(BaseModel):
+    job_id: str
+    filename: str
+    source: str
+    replace: bool = False
+    # queued | running | completed | failed | cancelled
+    status: str
+    # waiting | loading | extracting_toc | processing | describing_figures | done
+    stage: str
+    pages_total: Optional[int] = None
+    pages_processed: int = 0
+    chunks_total: Optional[int] = None
+    chunks_processed: int = 0
+    eta_seconds: Optional[float] = None
+    table_of_contents: List[str] = []
+    error: Optional[str] = None
+    # llm_calls, embedding_calls, prompt/cached/completion tokens, cost_usd and stage_seconds of a finished job
+    usage: Optional[Dict[str, Any]] = None
+    # pages, visual_pages, text_pages, vision_calls_saved and counts by reason
+    page_routing: Optional[Dict[str, Any]] = None
+    incremental: Optional[Dict[str, Any]] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
@@ -0,0 +1,152 @@
+"""Schemas of the JSON replies the prompts in utils/prompts.py ask for.
+
+Fields are optional with defaults so a reply that leaves something out still validates; a reply
+of the wrong shape (a string where an object belongs, say) doesn't. Replies whose root is a
+bare array in the prompt (MCQs, packed enrichment) are wrapped in an object here, because
+provider-side structured outputs need an object at the root. ``json_schema`` gives the strict
+JSON schema sent to the provider; class docstrings would end up in it, so the prompt each model
+answers is noted in a comment instead.
+"""
+import json
+from pydantic import BaseModel, ConfigDict, field_validator, model_validator
+from typing import Any, Dict, List, Optional, Type
+
+
+class LLMReply(BaseModel):
+    # models write page numbers and ids as numbers or strings interchangeably
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    @model_validator(mode="after")
+    def _answered(self):
+        # an object with none of the fields (say, the answer nested under another key) isn't a reply
+        if not self.model_fields_set:
+            raise ValueError(f"none of the fields of {type(self).__name__}")
+        return self
+
+
+class TocEntry(LLMReply):
+    chapter_number: Optional[str] = None
+    chapter_title: Optional[str] = None
+    section_title: Optional[str] = None
+    page_number: Optional[str] = None
+
+
+# TOC_TEXT_EXTRACTOR_PROMPT
+class TableOfContents(LLMReply):
+    is_table_of_contents: bool = False
+    entries: List[TocEntry] = []
+    notes: Optional[str] = None
+
+
+# the taxonomy names PAGE_CHUNKS_PACKED_PROMPT asks for, without the page text
+class TaxonomySubtopic(LLMReply):
+    subtopic_name: Optional[str] = None
+    confidence: Optional[str] = None
+
+
+class TaxonomyTopic(LLMReply):
+    topic_name: Optional[str] = None
+    confidence: Optional[str] = None
+    subtopics: List[TaxonomySubtopic] = []
+
+
+class ChunkTaxonomy(LLMReply):
+    subject: Optional[str] = None
+    topics: List[TaxonomyTopic] = []
+
+
+# one element of a PAGE_CHUNKS_PACKED_PROMPT reply
+class PackedChunkTaxonomy(ChunkTaxonomy):
+    id: int
+
+
+# PAGE_CHUNK_TEXT_PROMPT also asks for each subtopic's text
+class Subtopic(TaxonomySubtopic):
+    description: Optional[str] = None
+
+
+class Topic(TaxonomyTopic):
+    subtopics: List[Subtopic] = []
+
+
+# PAGE_CHUNK_TEXT_PROMPT
+class ChunkEnrichment(ChunkTaxonomy):
+    topics: List[Topic] = []
+
+
+# PAGE_CHUNKS_PACKED_PROMPT, as requested from the provider. Replies are validated element by
+# element instead (``_packed_results`` in the ingest service), so a bad one only retries that chunk.
+class PackedEnrichment(LLMReply):
+    results: List[PackedChunkTaxonomy] = []
+
+    @model_validator(mode="before")
+    @classmethod
+    def _wrap(cls, value):
+        return {"results": value} if isinstance(value, list) else value
+
+
+# BOOK_SUBJECT_PROMPT
+class BookSubject(LLMReply):
+    subject: Optional[str] = None
+
+
+# VISUAL_ANALYST_PROMPT
+class VisualDescription(LLMReply):
+    summary: str = ""
+    details: str = ""
+
+    @field_validator("summary", "details", mode="before")
+    @classmethod
+    def _text(cls, value):
+        # details sometimes come back as a nested object of the values read off the figure
+        if value is None:
+            return ""
+        return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+
+# MCQ_GENERATOR_PROMPT
+class QuestionBatch(LLMReply):
+    questions: List[str] = []
+
+    @model_validator(mode="before")
+    @classmethod
+    def _wrap(cls, value):
+        return {"questions": value} if isinstance(value, list) else value
+
+    @field_validator("questions", mode="before")
+    @classmethod
+    def _strings(cls, value):
+        if not isinstance(value, list):
+            return value
+        questions = [q.strip() for q in value if isinstance(q, str) and q.strip()]
+        if value and not questions:
+            # e.g. a citation like [1] picked out of prose
+            raise ValueError("no question strings")
+        return questions
+
+
+# EVALUATOR_PROMPT
+class QuestionEvaluation(LLMReply):
+    passed_questions: List[str] = []
+    failed: List[str] = []
+    evaluation: str = ""
+
+
+def _strict(schema: Any) -> Any:
+    """OpenAI's strict mode: every property required, no extra properties, no defaults or titles."""
+    if isinstance(schema, list):
+        return [_strict(s) for s in schema]
+    if not isinstance(schema, dict):
+        return schema
+    out = {k: _strict(v) for k, v in schema.items() if k not in ("default", "title", "properties")}
+    if "properties" in schema:
+        # property names are kept as they are, even one called "title"
+        out["properties"] = {k: _strict(v) for k, v in schema["properties"].items()}
+    if out.get("type") == "object":
+        out["required"] = list(out.get("properties") or {})
+        out["additionalProperties"] = False
+    return out
+
+
+def json_schema(model: Type[BaseModel]) -> Dict[str, Any]:
+    return _strict(model.model_json_schema())
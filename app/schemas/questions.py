@@ -1,11 +1,19 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 
 class QuestionRequest(BaseModel):
     query: str
     # number of valid questions desired
     num_questions: int = 5
+    # optional retrieval filters, matched exactly against the ingest taxonomy and source
+    subject: Optional[str] = None
+    topic: Optional[str] = None
+    subtopic: Optional[str] = None
+    source: Optional[str] = None
+
+    def filters(self) -> Dict[str, Optional[str]]:
+        return {"subject": self.subject, "topic": self.topic, "subtopic": self.subtopic, "source": self.source}
 
 
 class QuestionResponse(BaseModel):
@@ -14,3 +22,14 @@ class QuestionResponse(BaseModel):
     evaluation: str
     iterations: int
     passed: bool
+    # true when served from the semantic cache instead of a fresh generate/evaluate run
+    cached: bool = False
+
+
+class SemanticCacheStats(BaseModel):
+    entries: int
+    hits: int
+    misses: int
+    hit_rate: float
+    invalidations: int
+    threshold: float
@@ -0,0 +1,196 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set
+from uuid import uuid4
+from app.core.config import settings
+from app.core.observability import track_usage
+
+logger = logging.getLogger(__name__)
+
+
+class IngestCancelled(Exception):
+    pass
+
+
+@dataclass
+class IngestJob:
+    id: str
+    filename: str
+    file_path: str
+    # the source the points are stored under, when the upload names one instead of its file name
+    source: Optional[str] = None
+    # replace whatever is stored under the source instead of treating the upload as a revision
+    replace: bool = False
+    status: str = "queued"
+    stage: str = "queued"
+    pages_total: Optional[int] = None
+    pages_processed: int = 0
+    chunks_total: Optional[int] = None
+    chunks_processed: int = 0
+    table_of_contents: List[str] = field(default_factory=list)
+    subtopics: Set[str] = field(default_factory=set)
+    error: Optional[str] = None
+    # LLM calls, tokens, estimated cost and per-stage seconds, filled in when the job ends
+    usage: Optional[Dict[str, Any]] = None
+    # text/visual page counts from the page classifier when INGEST_VISUAL_ROUTING is on
+    page_routing: Optional[Dict[str, Any]] = None
+    # page diff against the previous upload of the same source when INGEST_INCREMENTAL is on
+    incremental: Optional[Dict[str, Any]] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    _stage_started_at: Optional[float] = None
+    _cancel_event: threading.Event = field(default_factory=threading.Event)
+
+    def set_stage(self, stage: str):
+        self.raise_if_cancelled()
+        self.stage = stage
+        self._stage_started_at = time.time()
+
+    def add_pages(self, count: int = 1):
+        self.pages_processed += count
+
+    def add_chunks(self, count: int = 1):
+        self.chunks_processed += count
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._cancel_event.is_set():
+            raise IngestCancelled(f"Ingest job {self.id} was cancelled")
+
+    def eta_seconds(self) -> Optional[float]:
+        # extrapolate from the observed rate of the current stage: chunks when the total is
+        # known up front, otherwise pages (the streaming pipeline only knows the page count)
+        if self.status != "running":
+            return None
+        if self.chunks_total and self.chunks_processed:
+            done, total = self.chunks_processed, self.chunks_total
+        elif self.pages_total and self.pages_processed:
+            done, total = self.pages_processed, self.pages_total
+        else:
+            return None
+        elapsed = time.time() - (self._stage_started_at or self.started_at or time.time())
+        if elapsed <= 0:
+            return None
+        rate = done / elapsed
+        return max(0.0, (total - done) / rate)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "source": self.source or self.filename,
+            "replace": self.replace,
+            "status": self.status,
+            "stage": self.stage,
+            "pages_total": self.pages_total,
+            "pages_processed": self.pages_processed,
+            "chunks_total": self.chunks_total,
+            "chunks_processed": self.chunks_processed,
+            "eta_seconds": self.eta_seconds(),
+            "table_of_contents": self.table_of_contents,
+            "error": self.error,
+            "usage": self.usage,
+            "page_routing": self.page_routing,
+            "incremental": self.incremental,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class IngestJobManager:
+    """Runs ingest pipelines on a small worker pool so request handlers return immediately."""
+
+    def __init__(
+        self,
+        ingest_service,
+        max_workers: Optional[int] = None,
+        history: Optional[int] = None,
+        on_complete: Optional[Callable[[IngestJob], None]] = None,
+    ):
+        self.ingest_service = ingest_service
+        self.on_complete = on_complete
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or settings.INGEST_WORKERS,
+            thread_name_prefix="ingest",
+        )
+        self.history = history or settings.INGEST_JOB_HISTORY
+        self.jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, file_path: str, filename: str, source: Optional[str] = None, replace: bool = False) -> IngestJob:
+        job = IngestJob(id=uuid4().hex, filename=filename, file_path=file_path, source=source, replace=replace)
+        with self._lock:
+            self.jobs[job.id] = job
+            self._trim_history()
+        self.executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list(self) -> List[IngestJob]:
+        with self._lock:
+            return list(self.jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[IngestJob]:
+        job = self.get(job_id)
+        if job is not None and job.status in ("queued", "running"):
+            job.cancel()
+        return job
+
+    def shutdown(self):
+        for job in self.list():
+            job.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _trim_history(self):
+        # forget the oldest finished jobs once the history cap is exceeded
+        finished = [j.id for j in self.jobs.values() if j.status in ("completed", "failed", "cancelled")]
+        while len(self.jobs) > self.history and finished:
+            self.jobs.pop(finished.pop(0), None)
+
+    def _run(self, job: IngestJob):
+        job.started_at = time.time()
+        with track_usage("ingest") as usage:
+            try:
+                job.raise_if_cancelled()
+                job.status = "running"
+                job.table_of_contents = self.ingest_service.process_pdf_simple_v2(job.file_path, job=job)
+                job.status = "completed"
+                job.stage = "done"
+                if self.on_complete is not None:
+                    self.on_complete(job)
+            except IngestCancelled:
+                job.status = "cancelled"
+            except Exception as e:
+                logger.exception("Ingest job failed", extra={"job_id": job.id})
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                job.finished_at = time.time()
+                job.usage = usage.as_fields()
+                if os.path.exists(job.file_path):
+                    os.remove(job.file_path)
+        logger.info("Ingest job finished", extra={
+            "job_id": job.id,
+            "filename": job.filename,
+            "status": job.status,
+            "pages": job.pages_processed,
+            "chunks": job.chunks_processed,
+            "elapsed_s": round(job.finished_at - job.started_at, 3),
+            **job.usage,
+        })
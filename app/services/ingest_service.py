@@ -1,185 +1,675 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from collections import Counter
+from contextlib import contextmanager
+from itertools import chain, islice
 from app.rag.loader import PDFLoader
-from app.rag.splitter import TextSplitter
+from app.rag.manifest import ManifestStore, PageDiff, SourceConflict, file_sha256, page_sha256, shared_pages
+from app.rag.splitter import SPLIT_CONTEXT_KEY, TextSplitter
 from app.rag.vectorstore import VectorStoreManager
-from typing import List
+from app.rag.taxonomy import flatten_taxonomy
+from app.rag.payload import chunk_document
+from app.rag.render import image_format, page_windows, render_window
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 from app.services.llm_service import LLMService
+from app.core.config import settings
+from app.core.observability import PAGE_ROUTES, span
+from app.core.structured import load_reply, parse_reply, response_format, schema_name
+from app.core.tokens import count_tokens
+from app.rag.classifier import classify_pages
+from app.rag.outline import OutlineTaxonomy
+from app.services.ingest_jobs import IngestCancelled, IngestJob
+from app.schemas.llm import (BookSubject, ChunkEnrichment, ChunkTaxonomy, PackedChunkTaxonomy, PackedEnrichment, TableOfContents,
+                             VisualDescription)
 from langchain_core.documents import Document
-from utils.helpers import safe_load_json, pil_image_to_base64
+from pydantic import ValidationError
+from utils.helpers import batched
 from utils.prompts import (VISUAL_ANALYST_PROMPT,
                            TOC_TEXT_EXTRACTOR_PROMPT,
-                            PAGE_CHUNK_TEXT_PROMPT)
+                            PAGE_CHUNK_TEXT_PROMPT,
+                            PAGE_CHUNKS_PACKED_PROMPT,
+                            BOOK_SUBJECT_PROMPT)
+
+logger = logging.getLogger(__name__)
+
+
+def _pack_chunks(chunks: List[Document], token_budget: int, max_chunks: int) -> List[List[Document]]:
+    """Group consecutive chunks into packs of at most ``token_budget`` text tokens and
+    ``max_chunks`` chunks; a chunk over the budget on its own gets a pack to itself."""
+    packs: List[List[Document]] = []
+    pack: List[Document] = []
+    pack_tokens = 0
+    for c in chunks:
+        tokens = count_tokens(c.page_content)
+        if pack and (pack_tokens + tokens > token_budget or len(pack) >= max(1, max_chunks)):
+            packs.append(pack)
+            pack, pack_tokens = [], 0
+        pack.append(c)
+        pack_tokens += tokens
+    if pack:
+        packs.append(pack)
+    return packs
+
+
+def _packed_reply(value) -> bool:
+    # the array itself, not one of its objects picked out of a broken reply
+    return isinstance(value, list) or (isinstance(value, dict) and ("results" in value or "chunks" in value))
+
+
+def _packed_results(parsed, size: int) -> Dict[int, ChunkTaxonomy]:
+    """Map chunk index -> result from a PAGE_CHUNKS_PACKED_PROMPT answer.
+
+    Results are matched by "id"; an array without ids is matched by position only when its
+    length is right. Elements are validated one by one and anything unusable is left out, so
+    only those chunks get retried.
+    """
+    if isinstance(parsed, dict):
+        parsed = parsed.get("results") or parsed.get("chunks") or [parsed]
+    if not isinstance(parsed, list):
+        return {}
+    items = [item for item in parsed if isinstance(item, dict)]
+    results: Dict[int, ChunkTaxonomy] = {}
+    if items and all("id" in item for item in items):
+        for item in items:
+            try:
+                result = PackedChunkTaxonomy.model_validate(item)
+            except ValidationError:
+                continue
+            if 0 <= result.id < size and result.id not in results:
+                results[result.id] = result
+    elif len(items) == size == len(parsed):
+        for index, item in enumerate(items):
+            try:
+                results[index] = ChunkTaxonomy.model_validate(item)
+            except ValidationError:
+                continue
+    return results
+
 
 class IngestService:
-    def __init__(self):
+    def __init__(self, vectorstore: Optional[VectorStoreManager] = None, llm_service: Optional[LLMService] = None):
         self.loader = PDFLoader()
         self.splitter = TextSplitter()
-        self.vectorstore = VectorStoreManager()
-        self.llm_service = LLMService()
+        self.vectorstore = vectorstore or VectorStoreManager()
+        self.llm_service = llm_service or LLMService()
+        # one lock per source, so two jobs for it can't interleave manifest reads, deletes and writes
+        self._source_locks: Dict[str, threading.Lock] = {}
+        self._source_locks_guard = threading.Lock()
+
+    @contextmanager
+    def _source_lock(self, source: str, job: Optional[IngestJob] = None):
+        with self._source_locks_guard:
+            lock = self._source_locks.setdefault(source, threading.Lock())
+        if not lock.acquire(blocking=False):
+            logger.info("Waiting for another ingest of the same source", extra={"source": source})
+            if job:
+                job.set_stage("waiting")
+            while not lock.acquire(timeout=1.0):
+                if job:
+                    job.raise_if_cancelled()
+        try:
+            yield
+        finally:
+            lock.release()
 
-    def process_pdf_simple(self, file_path: str) -> List[str]:
-        docs = self.loader.load(file_path)        
+    @staticmethod
+    def _first_lines(pages: List[Document]) -> List[str]:
         toc = []
-        for doc in docs[:10]:
+        for doc in pages:
             lines = doc.page_content.strip().split('\n')
             if lines:
                 toc.append(lines[0])
-        chunks = self.splitter.split(docs)
-        normalized_chunks: List[Document] = []
-        for c in chunks:
-            text = c.page_content or ""
-            first_line = text.strip().split('\n', 1)[0] if text.strip() else ""
-            summary = first_line if first_line else (text[:200].strip())
-
-            metadata = {}
-            try:
-                metadata = dict(c.metadata) if getattr(c, 'metadata', None) else {}
-            except Exception:
-                metadata = {}
+        return toc
 
-            metadata.update({
-                "source": file_path,
-                "page": metadata.get("page"),
-            })
+    @staticmethod
+    def _source_name(file_path: str, source: Optional[str] = None, job: Optional[IngestJob] = None) -> str:
+        # uploads are saved under temp names, so prefer the source the upload named, then its file name
+        return source or (job and (job.source or job.filename)) or os.path.basename(file_path)
 
-            full_content = f"""Summary: {summary}\nDescription: {text}"""
-            metadata.update({
-                "full_content": full_content,
-                "details_length": len(full_content),
-                "raw_parsed": False,
-            })
+    @staticmethod
+    def _tag_source(pages: Iterable[Document], source: str) -> Iterator[Document]:
+        for page in pages:
+            page.metadata["source"] = source
+            yield page
+
+    @staticmethod
+    def _track_pages(pages: Iterable[Document], job: Optional[IngestJob]) -> Iterator[Document]:
+        for page in pages:
+            if job:
+                job.raise_if_cancelled()
+                job.add_pages()
+            yield page
+
+    @staticmethod
+    def _changed_pages(pages: Iterable[Document], diff: Optional[PageDiff]) -> Iterator[Document]:
+        """Pages to split: all of them, or with a page diff only those that have to be split again.
+
+        A page is decided once the next one has been checked. The skipped neighbours of a page
+        that is split are passed along as context pages, which the splitter reads for the page
+        boundary but starts no chunks on.
+        """
+        if diff is None:
+            yield from pages
+            return
+        previous, previous_state = None, None  # last decided page and how it was passed on
+        pending = None
+        for page in chain(pages, [None]):
+            if page is not None:
+                diff.check(page.metadata.get("page"), page.page_content)
+            if pending is not None:
+                if diff.decide(pending.metadata.get("page")):
+                    if previous is not None and previous_state is None:
+                        yield Document(page_content=previous.page_content, metadata={**previous.metadata, SPLIT_CONTEXT_KEY: True})
+                    yield pending
+                    state = "page"
+                elif previous_state == "page":
+                    yield Document(page_content=pending.page_content, metadata={**pending.metadata, SPLIT_CONTEXT_KEY: True})
+                    state = "context"
+                else:
+                    state = None
+                previous, previous_state = pending, state
+            pending = page
 
-            normalized_chunks.append(Document(page_content=summary, metadata=metadata))
-        self.vectorstore.add_documents(normalized_chunks)
-        print(f"Added {len(normalized_chunks)} chunks to vector store")
+    def process_pdf_simple(self, file_path: str, source: Optional[str] = None) -> List[str]:
+        source = self._source_name(file_path, source)
+        pages = self._tag_source(self.loader.lazy_load(file_path), source)
+        head = list(islice(pages, 10))
+        toc = self._first_lines(head)
+        added = 0
+        for batch in batched(self.splitter.split_iter(chain(head, pages)), settings.INGEST_BATCH_SIZE):
+            documents = [
+                chunk_document(c.page_content, source, c.metadata.get("page"), span=c.metadata)
+                for c in batch
+                if c.page_content and c.page_content.strip()
+            ]
+            self.vectorstore.add_documents(documents)
+            added += len(documents)
+        logger.info("Added chunks to vector store", extra={"chunks": added, "source": source})
         return list(set(toc))
     
-    def process_pdf_simple_v2(self, file_path: str) -> List[str]:
-        docs = self.loader.load(file_path)        
-        toc = []
-        for doc in docs[:10]:
-            lines = doc.page_content.strip().split('\n')
-            if lines:
-                toc.append(lines[0])
-        chunks = self.splitter.split(docs)
-        normalized_chunks: List[Document] = []
-        first_pages_text = " ".join([doc.page_content for doc in docs[:3]])
-        toc_prompt = TOC_TEXT_EXTRACTOR_PROMPT.format(page_text=first_pages_text)
-        print("Extracting Table of Contents using LLM...")
-        print("TOC Prompt:", toc_prompt)
-        toc_response = self.llm_service.predict_messages(prompt=toc_prompt)
-        toc_json = safe_load_json(toc_response)
-        for c in chunks:
-            page_chunk_text_prompt = PAGE_CHUNK_TEXT_PROMPT.format(toc_json=toc_json, page_text=c.page_content)
-            print("Processing chunk with LLM...")
-            print("Page Chunk Prompt:", page_chunk_text_prompt)
-            llm_response = self.llm_service.predict_messages(prompt=page_chunk_text_prompt)
-            parsed_response = safe_load_json(llm_response)
-            print("Parsed LLM Response:", parsed_response)
-            if parsed_response and "canonical_text" in parsed_response:
-                text = parsed_response["canonical_text"]
-            else:
-                text = c.page_content or ""
+    def process_pdf_simple_v2(self, file_path: str, job: Optional[IngestJob] = None, source: Optional[str] = None,
+                              replace: bool = False) -> List[str]:
+        """Ingest a PDF with LLM taxonomy enrichment per chunk.
 
-            metadata = {}
-            try:
-                metadata.update(
-                    {
-                        "subject": parsed_response.get("subject", None),
-                        "topics": parsed_response.get("topics", []),
-                        "subtopics": parsed_response.get("subtopics", []),
-                    }
+        Pages are streamed, split and enriched in INGEST_BATCH_SIZE batches that are upserted as
+        they complete, so memory stays flat and early chunks are searchable before the book
+        finishes. When ``job`` is given, stage and page/chunk progress are reported on it and a
+        cancellation request aborts the pipeline with IngestCancelled.
+
+        With INGEST_OUTLINE_TAXONOMY, a book whose outline (or TOC plus page labels) gives a
+        chapter/section tree gets its taxonomy from that tree by page, and only chunks the tree
+        can't place go to the model (INGEST_LLM_TAXONOMY).
+
+        With INGEST_VISUAL_ROUTING the pages the classifier marks as figure-heavy are also
+        described by the vision model once the text is in, one extra visual chunk per page.
+
+        With INGEST_INCREMENTAL, a re-upload of a source is compared with the manifest of the
+        previous upload: an identical file returns at once, and otherwise only pages whose text
+        changed are split, enriched and embedded. Points of the previous version's pages that are
+        gone are deleted, and points of pages that only moved are renumbered. An upload sharing
+        fewer than INGEST_REVISION_MIN_SHARED of its pages with the manifest raises SourceConflict
+        before anything is written. ``replace`` (or ``job.replace``) skips the manifest and, once
+        the upload is in, deletes every other point of the source. Jobs for one source run one at
+        a time.
+        """
+        source = self._source_name(file_path, source, job)
+        replace = replace or bool(job and job.replace)
+        with self._source_lock(source, job):
+            return self._ingest_pdf(file_path, source, replace, job)
+
+    def _ingest_pdf(self, file_path: str, source: str, replace: bool, job: Optional[IngestJob] = None) -> List[str]:
+        if job:
+            job.set_stage("loading")
+            job.pages_total = self.loader.page_count(file_path)
+        manifests = ManifestStore(self.vectorstore.collection_name) if settings.INGEST_INCREMENTAL else None
+        previous = manifests.get(source) if manifests and not replace else None
+        file_hash = file_sha256(file_path) if manifests else None
+        if previous and previous.get("file_sha256") == file_hash:
+            if job:
+                job.incremental = {"skipped": True, "pages": len(previous.get("pages") or [])}
+            logger.info("Skipping unchanged upload", extra={"source": source, "file_sha256": file_hash})
+            return list(previous.get("table_of_contents") or [])
+        if previous:
+            self._check_revision(file_path, source, previous)
+        diff = PageDiff(previous) if manifests else None
+        visual_pages = self._route_pages(file_path, source, job) if settings.INGEST_VISUAL_ROUTING else []
+        pages = self._tag_source(self.loader.lazy_load(file_path), source)
+        head = list(islice(pages, 10))
+        toc = self._first_lines(head)
+        if job:
+            job.set_stage("extracting_toc")
+        first_pages_text = " ".join([doc.page_content for doc in head[:3]])
+        outline = self._outline_taxonomy(file_path) if settings.INGEST_OUTLINE_TAXONOMY else None
+        if outline is None:
+            toc_prompt = TOC_TEXT_EXTRACTOR_PROMPT.format(page_text=first_pages_text)
+            logger.info("Extracting table of contents", extra={"source": source, "prompt_chars": len(toc_prompt)})
+            with span("toc_extraction"):
+                toc_response = self.llm_service.predict_messages(
+                    prompt=toc_prompt, operation="toc_extraction", text_format=response_format(TableOfContents),
                 )
-            except Exception:
-                metadata = {}
+            parsed_toc = parse_reply(toc_response, TableOfContents)
+            toc_json = parsed_toc.model_dump() if parsed_toc is not None else None
+            if settings.INGEST_OUTLINE_TAXONOMY:
+                outline = self._outline_taxonomy(file_path, toc_json)
+        else:
+            # the outline is a better TOC than the first pages; fallback prompts get it instead
+            toc_json = outline.to_json()
+            toc = outline.chapters()
+        if outline is not None:
+            outline.subject = self._book_subject(outline, first_pages_text)
+            logger.info("Placing chunks by book structure", extra={
+                "source": source, "origin": outline.origin, "entries": len(outline.entries), "subject": outline.subject,
+            })
+        if job:
+            job.set_stage("processing")
+        written: Set[str] = set()
+        chunks = self.splitter.split_iter(self._changed_pages(self._track_pages(chain(head, pages), job), diff))
+        added = asyncio.run(self._ingest_stream(chunks, toc_json, job=job, outline=outline, written_ids=written))
+        if diff is not None:
+            self._apply_page_diff(source, diff, previous is not None, replace, written, job)
+            # the old visual chunks of re-split pages went with their text
+            resplit = set(diff.changed) | set(diff.resplit)
+            visual_pages = [p for p in visual_pages if p in resplit]
+        elif replace:
+            with span("page_diff"):
+                deleted = self.vectorstore.delete_pages(source, None, keep_ids=list(written))
+            logger.info("Replaced source", extra={"source": source, "deleted_points": deleted})
+        if visual_pages:
+            added += self._ingest_visual_pages(file_path, visual_pages, source, job)
+        toc = list(set(toc))
+        if manifests:
+            manifests.set(source, file_hash, diff.hashes, toc)
+        logger.info("Added chunks to vector store", extra={"chunks": added, "source": source, "llm_cache": self.llm_service.cache_stats()})
+        return toc
 
-            normalized_chunks.append(Document(page_content=text, metadata=metadata))
-        self.vectorstore.add_documents(normalized_chunks)
-        print(f"Added {len(normalized_chunks)} chunks to vector store")
-        return list(set(toc))
+    def _check_revision(self, file_path: str, source: str, previous: Dict[str, Any]):
+        """Raise SourceConflict when the upload looks like another document than the manifest's.
+
+        Costs one extra pass of text extraction, and only for re-uploads of a known source.
+        """
+        with span("revision_check"):
+            hashes = [page_sha256(page.page_content) for page in self.loader.lazy_load(file_path)]
+        shared = shared_pages(previous, hashes)
+        if shared < settings.INGEST_REVISION_MIN_SHARED:
+            logger.warning("Refusing upload that doesn't match its source", extra={"source": source, "shared_pages": round(shared, 3)})
+            raise SourceConflict(
+                f"Only {shared:.0%} of the pages match the document already ingested as '{source}'. "
+                "Upload it under a different source, or with replace=true to replace that document."
+            )
 
+    def _apply_page_diff(self, source: str, diff: PageDiff, has_manifest: bool, replace: bool, written: Set[str],
+                         job: Optional[IngestJob] = None):
+        """Delete points of stale pages and renumber moved ones, sparing the points just written.
 
-    def process_pdf_visual(self, file_path: str) -> List[str]:
+        Without a previous manifest nothing is deleted, since other points of the source may
+        belong to another document; with ``replace`` every other point of the source is.
+        """
+        keep = list(written)
+        stale = diff.stale_pages() if has_manifest else (None if replace else [])
+        with span("page_diff"):
+            deleted = self.vectorstore.delete_pages(source, stale, keep_ids=keep)
+            moved = self.vectorstore.move_pages(source, {old: new for new, old in diff.moved.items()}, keep_ids=keep)
+        report = {**diff.summary(), "previous_manifest": has_manifest, "replaced": replace,
+                  "deleted_points": deleted, "moved_points": moved}
+        if job:
+            job.incremental = {"skipped": False, **report}
+        logger.info("Applied page diff", extra={"source": source, **report})
 
+    @staticmethod
+    def _outline_taxonomy(file_path: str, toc_json=None) -> Optional[OutlineTaxonomy]:
         try:
-            from pdf2image import convert_from_path
+            return OutlineTaxonomy.from_pdf(file_path, toc_json)
         except Exception as e:
-            print("pdf2image not available or failed to import; falling back to text-only processing.")
-            return self.process_pdf_simple(file_path)
+            logger.warning("Could not read the book structure", extra={"error": str(e)})
+            return None
 
+    def _book_subject(self, outline: OutlineTaxonomy, first_pages_text: str) -> Optional[str]:
+        """One model call per book for the subject, which outlines don't name."""
+        prompt = BOOK_SUBJECT_PROMPT.format(
+            chapters=json.dumps(outline.chapters()[:100], ensure_ascii=False),
+            page_text=first_pages_text[:4000],
+        )
         try:
-            pil_images = convert_from_path(file_path)
+            with span("book_subject"):
+                parsed = parse_reply(self.llm_service.predict_messages(
+                    prompt=prompt, operation="book_subject", text_format=response_format(BookSubject),
+                ), BookSubject)
         except Exception as e:
-            print(f"Failed to render PDF to images: {e}; falling back to text-only processing.")
-            return self.process_pdf_simple(file_path)
+            logger.warning("Subject extraction failed", extra={"error": str(e)})
+            return None
+        subject = parsed.subject if parsed is not None else None
+        return subject.strip() if subject and subject.strip() else None
 
+    @staticmethod
+    def _route_pages(file_path: str, source: str, job: Optional[IngestJob] = None) -> List[int]:
+        """Classify every page and return the ones to send to the vision model."""
+        started = time.perf_counter()
+        with span("classify"):
+            profiles = list(classify_pages(file_path))
+        visual = [p.page for p in profiles if p.route == "visual"]
+        for p in profiles:
+            PAGE_ROUTES.labels(p.route, p.reason).inc()
+        routing: Dict[str, Any] = {
+            "pages": len(profiles),
+            "visual_pages": len(visual),
+            "text_pages": len(profiles) - len(visual),
+            # against describing every page, as process_pdf_visual does
+            "vision_calls_saved": len(profiles) - len(visual),
+            "reasons": dict(Counter(p.reason for p in profiles)),
+            "classify_s": round(time.perf_counter() - started, 3),
+        }
+        if job:
+            job.page_routing = routing
+        logger.info("Routed pages", extra={"source": source, **routing})
+        return visual
+
+    def _ingest_visual_pages(self, file_path: str, pages: List[int], source: str, job: Optional[IngestJob] = None) -> int:
+        """Describe the routed pages and upsert one visual chunk each; returns the chunks added.
+
+        Their text has already been ingested, so a page that fails here only loses its visual chunk.
+        """
+        if job:
+            job.set_stage("describing_figures")
         try:
-            text_pages = self.loader.load(file_path)
-        except Exception:
-            text_pages = []
+            results = asyncio.run(self._describe_pages(file_path, pages, source, job=job))
+        except IngestCancelled:
+            raise
+        except Exception as e:
+            logger.warning("Failed to render figure pages; keeping their text only", extra={"source": source, "error": str(e)})
+            return 0
+        documents = [results[page][1] for page in sorted(results)]
+        for batch in batched(documents, settings.INGEST_BATCH_SIZE):
+            self.vectorstore.add_documents(batch)
+        if job:
+            job.add_chunks(len(documents))
+            job.page_routing["visual_chunks"] = len(documents)
+        return len(documents)
 
-        descriptions: List[str] = []
-        documents_to_add: List[Document] = []
+    async def _ingest_stream(self, chunks: Iterable[Document], toc_json, job: Optional[IngestJob] = None,
+                             outline: Optional[OutlineTaxonomy] = None, written_ids: Optional[Set[str]] = None) -> int:
+        """Enrich and upsert chunks batch by batch; returns the number of chunks added.
 
-        for idx, img in enumerate(pil_images, start=1):
-            try:
-                img_b64 = pil_image_to_base64(img)
+        The upsert of one batch runs in a thread while the next batch is being enriched, and
+        at most one batch waits on the vector store at a time. The ids of the upserted points
+        are collected into ``written_ids`` when given.
+        """
+        written_ids = written_ids if written_ids is not None else set()
+        client = self.llm_service.get_async_llm()
+        pending = None
+        added = 0
+        placed = 0
+        started = time.perf_counter()
+        try:
+            for batch in batched(chunks, settings.INGEST_BATCH_SIZE):
+                enriched, batch_placed = await self._place_or_enrich(batch, toc_json, outline, job=job, client=client)
+                placed += batch_placed
+                if pending is not None:
+                    written_ids.update(await pending)
+                pending = asyncio.create_task(asyncio.to_thread(self.vectorstore.add_documents, enriched))
+                added += len(enriched)
+            if pending is not None:
+                written_ids.update(await pending)
+        finally:
+            await client.close()
+        elapsed = time.perf_counter() - started
+        rate = added / elapsed if elapsed > 0 else 0.0
+        logger.info("Ingested chunks", extra={
+            "chunks": added,
+            "placed_by_structure": placed,
+            "elapsed_s": round(elapsed, 2),
+            "chunks_per_sec": round(rate, 2),
+        })
+        return added
 
-                content = self.llm_service.predict_messages(prompt=VISUAL_ANALYST_PROMPT, base_64_image=img_b64)
+    async def _place_or_enrich(self, chunks: List[Document], toc_json, outline: Optional[OutlineTaxonomy],
+                               job: Optional[IngestJob] = None, client=None) -> Tuple[List[Document], int]:
+        """Taxonomy from ``outline`` where it places the chunk, from the model for the rest.
 
-                if content is None:
-                    content = ""
+        Returns the chunks in order and how many the outline placed.
+        """
+        if outline is None:
+            return await self._enrich_chunks(chunks, toc_json, job=job, client=client), 0
+        # place() is stateful and must see the chunks in order, before any await
+        taxonomies = [outline.place(c) for c in chunks]
+        unplaced = [c for c, taxonomy in zip(chunks, taxonomies) if taxonomy is None]
+        if unplaced and settings.INGEST_LLM_TAXONOMY:
+            enriched = iter(await self._enrich_chunks(unplaced, toc_json, job=job, client=client))
+        else:
+            enriched = iter(self._build_enriched_chunk(c, None) for c in unplaced)
+        results = []
+        for c, taxonomy in zip(chunks, taxonomies):
+            if taxonomy is None:
+                results.append(next(enriched))
+                continue
+            if job:
+                job.add_chunks()
+                job.subtopics.update(taxonomy["subtopics"])
+            results.append(chunk_document(c.page_content, c.metadata.get("source"), c.metadata.get("page"), taxonomy=taxonomy, span=c.metadata))
+        return results, len(chunks) - len(unplaced)
 
-                descriptions.append(content)
+    async def _enrich_chunks(self, chunks: List[Document], toc_json, job: Optional[IngestJob] = None, client=None) -> List[Document]:
+        """Enrich chunks with taxonomy, at most INGEST_CONCURRENCY calls in flight.
 
-                metadata = {"source": file_path, "page": idx, "type": "visual"}
-                page_text_snippet = text_pages[idx - 1].page_content[:300] if idx - 1 < len(text_pages) else ""
+        With ENRICH_PACK_TOKENS > 0 chunks are packed into PAGE_CHUNKS_PACKED_PROMPT calls of up
+        to that many chunk tokens, so the instructions and TOC are sent once per pack instead of
+        once per chunk. Chunks missing from a pack's answer are retried one by one with
+        PAGE_CHUNK_TEXT_PROMPT. Results keep chunk order; a chunk whose call fails after
+        retries keeps its raw page_content.
+        """
+        semaphore = asyncio.Semaphore(max(1, settings.INGEST_CONCURRENCY))
+        own_client = client is None
+        if own_client:
+            client = self.llm_service.get_async_llm()
+        stats = Counter()
 
-                parsed = safe_load_json(content)
-                if parsed:
-                    summary = (parsed.get("summary") or "").strip()
-                    details = parsed.get("details", "") or ""
+        def finish(c: Document, parsed: Optional[ChunkTaxonomy]) -> Document:
+            enriched = self._build_enriched_chunk(c, parsed)
+            if job:
+                job.add_chunks()
+                job.subtopics.update(flatten_taxonomy(enriched.metadata)["subtopics"])
+            return enriched
 
-                    full_content = f"""Summary: {summary}\nDescription: {details}"""
-                    metadata.update({
-                        "full_content": full_content,
-                        "details_length": len(full_content),
-                        "raw_parsed": True,
-                    })
+        async def call(prompt: str, operation: str, schema) -> Optional[str]:
+            async with semaphore:
+                if job:
+                    job.raise_if_cancelled()
+                try:
+                    with span("chunk_llm"):
+                        return await self.llm_service.apredict_messages(
+                            prompt=prompt, client=client, operation=operation, text_format=response_format(schema),
+                        )
+                except Exception as e:
+                    stats["failed_calls"] += 1
+                    logger.warning("Chunk enrichment failed", extra={"operation": operation, "error": str(e)})
+                    return None
 
-                    page_content = summary or (details[:2000] if isinstance(details, str) else (content or "")[:2000])
-                    doc = Document(page_content=page_content, metadata=metadata)
-                else:
-                    store_text = content if content else page_text_snippet
-                    s = store_text.strip().split('\n', 1)[0] if store_text else ""
-                    full_content = f"""Summary: {s}\nDescription: {store_text}"""
-                    metadata.update({
-                        "full_content": full_content,
-                        "details_length": len(full_content),
-                        "raw_parsed": False,
-                    })
-                    page_content = s or store_text[:200]
-                    doc = Document(page_content=page_content, metadata=metadata)
-
-                documents_to_add.append(doc)
+        async def enrich(c: Document) -> Document:
+            page_chunk_text_prompt = PAGE_CHUNK_TEXT_PROMPT.format(toc_json=toc_json, page_text=c.page_content)
+            stats["single_calls"] += 1
+            return finish(c, parse_reply(await call(page_chunk_text_prompt, "chunk_enrichment", ChunkEnrichment), ChunkEnrichment))
 
-            except Exception as e:
-                print(f"Error processing page {idx} visually: {e}; using text-only fallback for this page.")
-                fallback_snippet = text_pages[idx - 1].page_content[:1000] if idx - 1 < len(text_pages) else ""
-                summary = fallback_snippet.strip().split('\n', 1)[0] if fallback_snippet else ""
-                full_content = f"""Summary: {summary}\nDescription: {fallback_snippet}"""
-                metadata = {"source": file_path, "page": idx, "type": "visual", "raw_parsed": False}
-                metadata.update({"full_content": full_content, "details_length": len(full_content)})
-                page_content = summary or fallback_snippet[:200]
-                doc = Document(page_content=page_content, metadata=metadata)
-                descriptions.append(fallback_snippet)
-                documents_to_add.append(doc)
+        async def enrich_pack(pack: List[Document]) -> List[Document]:
+            if len(pack) == 1:
+                return [await enrich(pack[0])]
+            chunks_json = json.dumps([{"id": i, "text": c.page_content} for i, c in enumerate(pack)], ensure_ascii=False)
+            stats["packed_calls"] += 1
+            response = await call(
+                PAGE_CHUNKS_PACKED_PROMPT.format(toc_json=toc_json, chunks_json=chunks_json), "chunk_enrichment_packed", PackedEnrichment,
+            )
+            results = _packed_results(load_reply(response, schema_name(PackedEnrichment), accept=_packed_reply), len(pack))
+            missing = [i for i in range(len(pack)) if i not in results]
+            stats["retried_chunks"] += len(missing)
+            retried = dict(zip(missing, await asyncio.gather(*(enrich(pack[i]) for i in missing))))
+            return [retried[i] if i in retried else finish(c, results[i]) for i, c in enumerate(pack)]
+
+        started = time.perf_counter()
+        try:
+            if settings.ENRICH_PACK_TOKENS > 0:
+                packs = _pack_chunks(chunks, settings.ENRICH_PACK_TOKENS, settings.ENRICH_PACK_MAX_CHUNKS)
+                normalized_chunks = list(chain.from_iterable(await asyncio.gather(*(enrich_pack(p) for p in packs))))
+            else:
+                normalized_chunks = list(await asyncio.gather(*(enrich(c) for c in chunks)))
+        finally:
+            if own_client:
+                await client.close()
+        elapsed = time.perf_counter() - started
+        rate = len(chunks) / elapsed if elapsed > 0 else 0.0
+        logger.info("Enriched chunks", extra={
+            "chunks": len(chunks),
+            "elapsed_s": round(elapsed, 2),
+            "chunks_per_sec": round(rate, 2),
+            "concurrency": settings.INGEST_CONCURRENCY,
+            "packed_calls": stats["packed_calls"],
+            "single_calls": stats["single_calls"],
+            "retried_chunks": stats["retried_chunks"],
+            "failed": stats["failed_calls"],
+        })
+        return normalized_chunks
+
+    @staticmethod
+    def _build_enriched_chunk(c: Document, parsed: Optional[ChunkTaxonomy]) -> Document:
+        # the stored text is always the chunk itself, so its point id and offsets stay those of the split;
+        # only the taxonomy names are kept, as the per-subtopic descriptions would repeat the text
+        taxonomy = flatten_taxonomy(parsed.model_dump()) if parsed is not None else None
+        return chunk_document(c.page_content or "", c.metadata.get("source"), c.metadata.get("page"), taxonomy=taxonomy, span=c.metadata)
+
+
+    def process_pdf_visual(self, file_path: str, source: Optional[str] = None) -> List[str]:
+        """Describe every page with the vision model and store one visual chunk per page.
+
+        Pages are rendered in windows of VISUAL_RENDER_WINDOW in a process pool while the vision
+        calls for earlier windows run, at most INGEST_CONCURRENCY at a time. Only a few windows of
+        encoded pages are held at once; page bitmaps never leave the render workers.
+        """
+        source = self._source_name(file_path, source)
+
+        try:
+            import pdf2image  # noqa: F401
+        except Exception:
+            logger.warning("pdf2image not available; falling back to text-only processing")
+            return self.process_pdf_simple(file_path, source=source)
+
+        try:
+            text_pages = self.loader.load(file_path)
+        except Exception:
+            text_pages = []
+
+        def page_text(page: int, limit: int) -> str:
+            return text_pages[page].page_content[:limit] if page < len(text_pages) else ""
+
+        try:
+            page_count = self.loader.page_count(file_path)
+            results = asyncio.run(self._describe_pages(file_path, range(page_count), source, page_text))
+        except Exception as e:
+            logger.warning("Failed to render PDF to images; falling back to text-only processing", extra={"error": str(e)})
+            return self.process_pdf_simple(file_path, source=source)
+
+        descriptions = [results[page][0] for page in sorted(results)]
+        documents_to_add = [results[page][1] for page in sorted(results)]
 
         if documents_to_add:
             try:
-                print(f"Adding {len(documents_to_add)} visual description documents to vector store")
+                logger.info("Adding visual page documents to vector store", extra={"documents": len(documents_to_add), "source": source})
                 self.vectorstore.add_documents(documents_to_add)
             except Exception as e:
-                print(f"Failed to add visual documents to vector store: {e}; falling back to text pipeline.")
-                return self.process_pdf_simple(file_path)
+                logger.warning("Failed to add visual documents; falling back to text pipeline", extra={"error": str(e)})
+                return self.process_pdf_simple(file_path, source=source)
 
         return descriptions
+
+    async def _describe_pages(self, file_path: str, pages: Iterable[int], source: str,
+                              page_text: Optional[Callable[[int, int], str]] = None, job: Optional[IngestJob] = None):
+        """Render and describe the given 0-based pages; returns ``{page: (description, document)}``.
+
+        A page whose rendering or vision call fails gets ``page_text(page, limit)`` as its
+        chunk, or is left out without ``page_text``. Raises if no page could be rendered at all,
+        so the caller can fall back to text.
+        """
+        pages = list(pages)
+        fmt = settings.VISUAL_IMAGE_FORMAT
+        _, mime_type = image_format(fmt)
+        workers = max(0, settings.VISUAL_RENDER_WORKERS)
+        # windows rendered or waiting on vision calls; this is what bounds memory
+        windows_in_flight = asyncio.Semaphore(max(1, workers) + 1)
+        llm_slots = asyncio.Semaphore(max(1, settings.INGEST_CONCURRENCY))
+        loop = asyncio.get_running_loop()
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) if workers else None
+        client = self.llm_service.get_async_llm()
+        results = {}
+        render_errors: List[Exception] = []
+        unrendered = 0
+        started = time.perf_counter()
+
+        def fallback(page: int, limit: int):
+            if page_text is not None:
+                snippet = page_text(page, limit)
+                results[page] = (snippet, chunk_document(snippet, source, page, "visual"))
+
+        async def describe(page: int, img_b64: str):
+            if job:
+                job.raise_if_cancelled()
+            try:
+                async with llm_slots:
+                    with span("visual_llm"):
+                        content = await self.llm_service.apredict_messages(
+                            prompt=VISUAL_ANALYST_PROMPT, base_64_image=img_b64, client=client,
+                            operation="visual", image_mime_type=mime_type, text_format=response_format(VisualDescription),
+                        )
+                content = content or ""
+                parsed = parse_reply(content, VisualDescription)
+                if parsed is not None and (parsed.summary.strip() or parsed.details.strip()):
+                    summary = parsed.summary.strip()
+                    text = parsed.details if parsed.details.strip() else summary
+                    doc = chunk_document(text, source, page, "visual", summary=summary)
+                else:
+                    doc = chunk_document(content or page_text(page, 300), source, page, "visual")
+                results[page] = (content, doc)
+            except Exception as e:
+                logger.warning("Visual processing failed; using the page text", extra={"page": page, "error": str(e)})
+                fallback(page, 1000)
+
+        async def window(window_pages: List[int]):
+            nonlocal unrendered
+            async with windows_in_flight:
+                if job:
+                    job.raise_if_cancelled()
+                args = (file_path, window_pages, settings.VISUAL_RENDER_DPI, fmt,
+                        settings.VISUAL_IMAGE_QUALITY, settings.VISUAL_MAX_IMAGE_SIDE)
+                try:
+                    with span("render"):
+                        if pool is not None:
+                            images = await loop.run_in_executor(pool, render_window, *args)
+                        else:
+                            images = await asyncio.to_thread(render_window, *args)
+                except Exception as e:
+                    render_errors.append(e)
+                    unrendered += len(window_pages)
+                    logger.warning("Failed to render pages; using the page text", extra={"pages": window_pages, "error": str(e)})
+                    for page in window_pages:
+                        fallback(page, 1000)
+                    return
+                await asyncio.gather(*(describe(page, img_b64) for page, img_b64 in images))
+
+        try:
+            await asyncio.gather(*(window(w) for w in page_windows(pages, settings.VISUAL_RENDER_WINDOW)))
+        finally:
+            await client.close()
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+        if render_errors and unrendered == len(pages):
+            raise render_errors[0]
+        elapsed = time.perf_counter() - started
+        logger.info("Described pages", extra={
+            "pages": len(pages),
+            "elapsed_s": round(elapsed, 2),
+            "pages_per_sec": round(len(pages) / elapsed, 2) if elapsed > 0 else 0.0,
+            "render_workers": workers,
+            "failed_windows": len(render_errors),
+        })
+        return results
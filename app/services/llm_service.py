@@ -1,23 +1,75 @@
+import asyncio
+import json
+import logging
+import random
 from langchain_openai import ChatOpenAI
 from app.core.config import settings
-from openai import OpenAI
+from app.core.cache import SQLiteCache, make_cache_key
+from app.core.observability import record_llm_call, record_llm_usage
+from openai import OpenAI, AsyncOpenAI, APIStatusError, APIConnectionError
+
+logger = logging.getLogger(__name__)
+
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, APIConnectionError):
+        return True
+    if isinstance(exc, APIStatusError):
+        return exc.status_code == 429 or exc.status_code >= 500
+    return False
+
+
+def _retry_delay(exc: Exception, attempt: int) -> float:
+    # honour the server's Retry-After hint when present, otherwise full-jitter exponential backoff
+    response = getattr(exc, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), settings.LLM_RETRY_MAX_DELAY)
+        except ValueError:
+            pass
+    ceiling = min(settings.LLM_RETRY_MAX_DELAY, settings.LLM_RETRY_BASE_DELAY * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
 
 class LLMService:
-    def __init__(self, model_name=None, temperature: float = 0.7):
+    def __init__(self, model_name=None, temperature: float = 0.7, http_client=None, http_async_client=None):
         self.model_name = model_name if model_name else settings.MODEL_NAME
         self.temperature = temperature
+        # shared keep-alive pools from the app registry; None falls back to per-client pools
+        self.http_client = http_client
+        self.http_async_client = http_async_client
+        self.client = None
+        self.cache = None
+        if settings.LLM_CACHE_ENABLED:
+            self.cache = SQLiteCache(
+                settings.CACHE_DB_PATH,
+                namespace="llm_responses",
+                ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+                max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+            )
 
     def get_agent_llm(self):
         return ChatOpenAI(
             model=self.model_name,
             temperature=self.temperature,
-            openai_api_key=settings.OPENAI_API_KEY
+            openai_api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
+            max_retries=settings.LLM_MAX_RETRIES,
+            http_client=self.http_client,
+            http_async_client=self.http_async_client,
         )
     def get_llm(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        if self.client is None:
+            self.client = OpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL, http_client=self.http_client)
         return self.client
-    
-    def predict_messages(self, prompt,system_prompt = None, base_64_image = None):
+
+    def get_async_llm(self):
+        # retries are handled by apredict_messages so the backoff is jittered and bounded by settings.
+        # Ingest runs its own event loop per job, so each caller gets a client (and pool) for that loop.
+        return AsyncOpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL, max_retries=0)
+
+    def _build_messages(self, prompt, system_prompt=None, base_64_image=None, image_mime_type="image/jpeg"):
         messages = []
         if system_prompt:
             messages.append({"role": "system", "content": system_prompt})
@@ -26,16 +78,114 @@ class LLMService:
                 { "type": "input_text", "text": prompt },
                 {
                     "type": "input_image",
-                    "image_url": f"data:image/jpeg;base64,{base_64_image}",
+                    "image_url": f"data:{image_mime_type};base64,{base_64_image}",
                 },
             ]
             messages.append({"role": "user", "content": prompt})
         else:
             messages.append({"role": "user", "content": prompt})
-        llm = self.get_llm()
-        response = llm.responses.create(
-            model=self.model_name,
-            input=messages,
-            temperature=self.temperature
+        return messages
+
+    def _cache_key(self, prompt, system_prompt, base_64_image, image_mime_type=None, text_format=None) -> str:
+        # a reply cached under another response schema (or none) mustn't be served for this one
+        fmt = json.dumps(text_format, sort_keys=True) if text_format else None
+        return make_cache_key(
+            self.model_name, self.temperature, system_prompt, prompt, base_64_image,
+            image_mime_type if base_64_image else None, fmt,
         )
+
+    def _cache_get(self, key: str, use_cache: bool):
+        if self.cache is None or not use_cache:
+            return None
+        cached = self.cache.get(key)
+        return cached.decode("utf-8") if cached is not None else None
+
+    def _cache_set(self, key: str, text, use_cache: bool):
+        # empty replies are usually transient failures; don't pin them in the cache
+        if self.cache is None or not use_cache or not text:
+            return
+        self.cache.set(key, text.encode("utf-8"))
+
+    def cache_stats(self) -> dict:
+        return self.cache.stats() if self.cache is not None else {"enabled": False}
+
+    def _record_usage(self, response, operation: str):
+        usage = getattr(response, "usage", None)
+        details = getattr(usage, "input_tokens_details", None)
+        record_llm_usage(
+            self.model_name,
+            operation,
+            prompt_tokens=getattr(usage, "input_tokens", 0),
+            completion_tokens=getattr(usage, "output_tokens", 0),
+            cached_tokens=getattr(details, "cached_tokens", 0),
+        )
+
+    @staticmethod
+    def _format_options(text_format) -> dict:
+        return {"text": {"format": text_format}} if text_format else {}
+
+    def predict_messages(self, prompt,system_prompt = None, base_64_image = None, use_cache: bool = True, operation: str = "responses",
+                         image_mime_type: str = "image/jpeg", text_format=None):
+        key = self._cache_key(prompt, system_prompt, base_64_image, image_mime_type, text_format)
+        cached = self._cache_get(key, use_cache)
+        if cached is not None:
+            record_llm_call(self.model_name, operation, "cache_hit")
+            return cached
+        messages = self._build_messages(prompt, system_prompt, base_64_image, image_mime_type)
+        llm = self.get_llm()
+        try:
+            response = llm.responses.create(
+                model=self.model_name,
+                input=messages,
+                temperature=self.temperature,
+                **self._format_options(text_format),
+            )
+        except Exception:
+            record_llm_call(self.model_name, operation, "error")
+            raise
+        self._record_usage(response, operation)
+        self._cache_set(key, response.output_text, use_cache)
         return response.output_text
+
+    async def apredict_messages(self, prompt, system_prompt=None, base_64_image=None, client=None, use_cache: bool = True, operation: str = "responses",
+                                image_mime_type: str = "image/jpeg", text_format=None):
+        """Async variant of predict_messages with jittered backoff on 429/5xx and connection errors.
+
+        Pass a shared ``client`` (from get_async_llm) to reuse one connection pool across many calls,
+        and ``text_format`` (see app/core/structured.py) to ask for JSON matching a schema.
+        """
+        key = self._cache_key(prompt, system_prompt, base_64_image, image_mime_type, text_format)
+        cached = self._cache_get(key, use_cache)
+        if cached is not None:
+            record_llm_call(self.model_name, operation, "cache_hit")
+            return cached
+        messages = self._build_messages(prompt, system_prompt, base_64_image, image_mime_type)
+        llm = client if client is not None else self.get_async_llm()
+        attempt = 0
+        try:
+            while True:
+                try:
+                    response = await llm.responses.create(
+                        model=self.model_name,
+                        input=messages,
+                        temperature=self.temperature,
+                        **self._format_options(text_format),
+                    )
+                    self._record_usage(response, operation)
+                    self._cache_set(key, response.output_text, use_cache)
+                    return response.output_text
+                except Exception as e:
+                    if attempt >= settings.LLM_MAX_RETRIES or not _is_retryable(e):
+                        record_llm_call(self.model_name, operation, "error")
+                        raise
+                    delay = _retry_delay(e, attempt)
+                    attempt += 1
+                    record_llm_call(self.model_name, operation, "retry")
+                    logger.warning(
+                        "LLM call failed; retrying",
+                        extra={"error": e.__class__.__name__, "attempt": attempt, "max_retries": settings.LLM_MAX_RETRIES, "delay_s": round(delay, 2)},
+                    )
+                    await asyncio.sleep(delay)
+        finally:
+            if client is None:
+                await llm.close()
@@ -0,0 +1,138 @@
+import logging
+import time
+from typing import Any, Dict, List, Optional, Sequence
+from uuid import UUID, uuid5
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from qdrant_client import AsyncQdrantClient, QdrantClient, models
+from app.core.config import settings
+from app.rag.vectorstore import build_filter
+
+logger = logging.getLogger(__name__)
+
+# request filters that apply to banked questions, and the payload fields they match
+FILTER_FIELDS = {"subject": "subject", "topic": "topics", "subtopic": "subtopics"}
+
+QUESTION_ID_NAMESPACE = UUID("0b7e2f64-9a3c-4f55-8d2e-5a1c7b9e3f20")
+
+
+def _unit(vectors: Sequence[Sequence[float]]) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.size == 0:
+        return matrix.reshape(0, 0)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def filter_near_duplicates(
+    candidate_vectors: Sequence[Sequence[float]],
+    existing_vectors: Sequence[Sequence[float]] = (),
+    threshold: Optional[float] = None,
+) -> List[int]:
+    """Return indices of candidates whose cosine similarity to every existing vector and to every
+    earlier kept candidate stays below ``threshold``."""
+    threshold = threshold if threshold is not None else settings.QUESTION_DEDUP_THRESHOLD
+    kept_vectors = list(_unit(existing_vectors)) if len(existing_vectors) else []
+    kept: List[int] = []
+    for i, vector in enumerate(_unit(candidate_vectors)):
+        if kept_vectors and float(np.max(np.stack(kept_vectors) @ vector)) >= threshold:
+            continue
+        kept.append(i)
+        kept_vectors.append(vector)
+    return kept
+
+
+class QuestionBank:
+    """Validated questions stored in their own Qdrant collection, tagged with ingest taxonomy.
+
+    Questions are deduplicated by embedding similarity on insert, and ``afetch`` serves stored
+    questions relevant to a query so only the shortfall needs generating.
+    """
+
+    def __init__(self, client: QdrantClient, async_client: AsyncQdrantClient, embeddings: Embeddings, collection_name: Optional[str] = None):
+        self.client = client
+        self.async_client = async_client
+        self.embeddings = embeddings
+        self.collection_name = collection_name or settings.QUESTION_BANK_COLLECTION_NAME
+        self.create_collection_if_not_exists()
+
+    def create_collection_if_not_exists(self):
+        if self.client.collection_exists(collection_name=self.collection_name):
+            return
+        logger.info("Creating Qdrant collection", extra={"collection": self.collection_name})
+        self.client.create_collection(
+            collection_name=self.collection_name,
+            vectors_config=models.VectorParams(
+                size=settings.EMBEDDING_DIMENSION,
+                distance=models.Distance.COSINE,
+            ),
+        )
+        for field in ("subject", "topics", "subtopics"):
+            self.client.create_payload_index(
+                collection_name=self.collection_name,
+                field_name=field,
+                field_schema=models.PayloadSchemaType.KEYWORD,
+            )
+
+    @staticmethod
+    def question_id(question: str) -> str:
+        return str(uuid5(QUESTION_ID_NAMESPACE, question.strip()))
+
+    async def afetch(
+        self,
+        query_vector: List[float],
+        limit: int,
+        min_score: Optional[float] = None,
+        filters: Optional[Dict[str, Optional[str]]] = None,
+    ) -> List[str]:
+        if limit <= 0:
+            return []
+        response = await self.async_client.query_points(
+            collection_name=self.collection_name,
+            query=query_vector,
+            query_filter=build_filter(filters, fields=FILTER_FIELDS),
+            limit=limit,
+            score_threshold=min_score if min_score is not None else settings.QUESTION_BANK_MIN_SCORE,
+            with_payload=["question"],
+        )
+        return [p.payload["question"] for p in response.points if p.payload and p.payload.get("question")]
+
+    async def _nearest_scores(self, vectors: List[List[float]]) -> List[float]:
+        requests = [models.QueryRequest(query=v, limit=1) for v in vectors]
+        responses = await self.async_client.query_batch_points(collection_name=self.collection_name, requests=requests)
+        return [r.points[0].score if r.points else 0.0 for r in responses]
+
+    async def aadd(self, questions: List[str], taxonomy: Optional[Dict[str, Any]] = None, query: Optional[str] = None) -> List[str]:
+        """Store questions that are not near-duplicates of each other or of the bank; returns those added."""
+        questions = [q for q in questions if isinstance(q, str) and q.strip()]
+        if not questions:
+            return []
+        vectors = await self.embeddings.aembed_documents(questions)
+        kept = filter_near_duplicates(vectors)
+        nearest = await self._nearest_scores([vectors[i] for i in kept])
+        kept = [i for i, score in zip(kept, nearest) if score < settings.QUESTION_DEDUP_THRESHOLD]
+        if not kept:
+            return []
+        taxonomy = taxonomy or {}
+        now = time.time()
+        points = [
+            models.PointStruct(
+                id=self.question_id(questions[i]),
+                vector=vectors[i],
+                payload={
+                    "question": questions[i],
+                    "subject": taxonomy.get("subject"),
+                    "topics": taxonomy.get("topics", []),
+                    "subtopics": taxonomy.get("subtopics", []),
+                    "query": query,
+                    "created_at": now,
+                },
+            )
+            for i in kept
+        ]
+        await self.async_client.upsert(collection_name=self.collection_name, points=points)
+        return [questions[i] for i in kept]
+
+    async def acount(self) -> int:
+        return (await self.async_client.count(collection_name=self.collection_name)).count
@@ -1,36 +1,221 @@
+import asyncio
+import logging
+import time
+from app.core.config import settings
+from app.core.observability import span
+from app.rag.context import ContextBuilder
 from app.rag.vectorstore import VectorStoreManager
-from app.agents.graph import create_graph
-from typing import Dict, Any, List
+from app.rag.taxonomy import taxonomy_from_documents
+from app.agents.graph import Admission, create_graph
+from app.services.semantic_cache import SemanticCache
+from app.services.question_bank import QuestionBank
+from typing import AsyncIterator, Dict, Any, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
 
 
 class QuestionService:
-    def __init__(self):
-        self.vectorstore = VectorStoreManager()
-        self.graph = create_graph()
+    def __init__(
+        self,
+        vectorstore: Optional[VectorStoreManager] = None,
+        graph=None,
+        semantic_cache: Optional[SemanticCache] = None,
+        question_bank: Optional[QuestionBank] = None,
+        context_builder: Optional[ContextBuilder] = None,
+    ):
+        self.vectorstore = vectorstore or VectorStoreManager()
+        self.graph = graph or create_graph()
+        self.semantic_cache = semantic_cache
+        self.question_bank = question_bank
+        self.context_builder = context_builder or ContextBuilder()
+        self._background: Set[asyncio.Task] = set()
+
+    async def _prepare(self, query: str, num_questions: int, filters: Optional[Dict[str, Optional[str]]] = None) -> Dict[str, Any]:
+        """Resolve a request from the semantic cache or the question bank where possible.
 
-    async def generate_questions(self, query: str, num_questions: int = 5) -> Dict[str, Any]:
+        Returns ``{"result": ...}`` when nothing needs generating, otherwise the graph's initial
+        state together with the banked questions, retrieved documents and query vector.
+        ``filters`` (subject/topic/subtopic/source) scope retrieval, the bank and the cache.
+        """
+        filters = {k: v for k, v in (filters or {}).items() if v}
+        scope = tuple(sorted(filters.items()))
+        query_vector = None
+        if self.semantic_cache is not None or self.question_bank is not None:
+            # embed once and reuse the vector for the cache, the bank and retrieval
+            query_vector = await self.vectorstore.embeddings.aembed_query(query)
+        if self.semantic_cache is not None:
+            cached = self.semantic_cache.lookup(query_vector, num_questions, scope=scope)
+            if cached is not None:
+                return {"result": {**cached, "cached": True}}
 
-        retriever = self.vectorstore.get_retriever()
-        docs = retriever.invoke(query)
-        context = "\n\n".join([doc.metadata.get("full_content", "") for doc in docs])
+        banked: List[str] = []
+        # banked questions aren't tied to a source document, so a source filter bypasses the bank
+        if self.question_bank is not None and "source" not in filters:
+            try:
+                banked = await self.question_bank.afetch(query_vector, num_questions, filters=filters)
+            except Exception as e:
+                logger.warning("Question bank lookup failed; generating all questions", extra={"error": str(e)})
+            if len(banked) >= num_questions:
+                return {"result": {
+                    "questions": banked[:num_questions],
+                    "evaluation": "Served from the validated question bank.",
+                    "iterations": 0,
+                    "passed": True,
+                }}
 
+        # over-fetch so MMR has room to trade near-duplicate hits for coverage
+        with span("retrieval"):
+            hits = await self.vectorstore.aretrieve(
+                query, k=settings.CONTEXT_FETCH_K, vector=query_vector, with_vectors=True, filters=filters,
+            )
+        with span("context_build"):
+            built = self.context_builder.build(hits)
+        docs = built.documents
+        context = built.text
+        logger.info("Built context", extra={
+            "chunks": len(docs),
+            "candidates": built.candidates,
+            "context_tokens": built.tokens,
+            "raw_tokens": built.raw_tokens,
+            "budget_tokens": self.context_builder.max_tokens,
+        })
+
+        # banked questions count towards the target, so the graph only generates the shortfall
         initial_state = {
             "query": query,
             "context": context,
             "iterations": 0,
             "passed": False,
-            "questions": [],  
+            "questions": [],
             "evaluation": "",
             "target": num_questions,
-            "valid_questions": []  
+            "valid_questions": list(banked)
         }
+        return {"state": initial_state, "banked": banked, "docs": docs, "vector": query_vector, "scope": scope}
 
-        final_state = self.graph.invoke(initial_state)
+    @staticmethod
+    def _run_config(prepared: Dict[str, Any], num_questions: int) -> Dict[str, Any]:
+        # shards accept questions as they pass evaluation, so streamed and collected ones agree
+        return {"configurable": {"admission": Admission(prepared["banked"], num_questions)}}
 
-        final_state.setdefault("valid_questions", [])
-        return {
-            "questions": final_state.get("valid_questions", []),
+    def _finish(self, prepared: Dict[str, Any], final_state: Dict[str, Any], query: str, num_questions: int) -> Dict[str, Any]:
+        result = {
+            "questions": final_state.get("valid_questions", []) or [],
             "evaluation": final_state.get("evaluation", ""),
             "iterations": final_state.get("iterations", 0),
             "passed": final_state.get("passed", False),
         }
+        banked = prepared["banked"]
+        if self.question_bank is not None:
+            generated = [q for q in result["questions"] if q not in banked]
+            if generated:
+                # banking happens off the response path
+                task = asyncio.create_task(self._bank_questions(generated, taxonomy_from_documents(prepared["docs"]), query))
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+        # only fully validated answers are worth replaying to other users
+        if self.semantic_cache is not None and result["passed"]:
+            self.semantic_cache.store(query, prepared["vector"], num_questions, result, scope=prepared["scope"])
+        return result
+
+    async def generate_questions(
+        self, query: str, num_questions: int = 5, filters: Optional[Dict[str, Optional[str]]] = None,
+    ) -> Dict[str, Any]:
+        prepared = await self._prepare(query, num_questions, filters)
+        if "result" in prepared:
+            return prepared["result"]
+        final_state = await self.graph.ainvoke(prepared["state"], config=self._run_config(prepared, num_questions))
+        return self._finish(prepared, final_state, query, num_questions)
+
+    async def stream_questions(
+        self, query: str, num_questions: int = 5, filters: Optional[Dict[str, Optional[str]]] = None,
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Yield ``(event, data)`` pairs while questions are generated.
+
+        ``question`` events go out as soon as a candidate passes evaluation and is admitted (not a
+        repeat or near-duplicate of a question already sent, and within ``num_questions``), so
+        every streamed question is also in the final result, in the same order. ``progress``
+        events follow each round with the iteration and the accepted count. The stream ends with
+        a ``summary`` event shaped like ``generate_questions``' result.
+        """
+        started = time.perf_counter()
+        first_question_at: Optional[float] = None
+        emitted: List[str] = []
+
+        def question_event(question: str, source: str) -> Tuple[str, Dict[str, Any]]:
+            nonlocal first_question_at
+            if first_question_at is None:
+                first_question_at = time.perf_counter() - started
+            emitted.append(question)
+            return "question", {
+                "question": question,
+                "index": len(emitted) - 1,
+                "source": source,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000),
+            }
+
+        yield "progress", {"stage": "started", "iteration": 0, "accepted": 0, "target": num_questions}
+        prepared = await self._prepare(query, num_questions, filters)
+        if "result" in prepared:
+            result = prepared["result"]
+            source = "cache" if result.get("cached") else "bank"
+            for q in result["questions"]:
+                yield question_event(q, source)
+            yield "summary", result
+            return
+
+        for q in prepared["banked"]:
+            yield question_event(q, "bank")
+        yield "progress", {"stage": "retrieved", "iteration": 0, "accepted": len(emitted), "target": num_questions}
+
+        final_state: Dict[str, Any] = dict(prepared["state"])
+        config = self._run_config(prepared, num_questions)
+        async for mode, chunk in self.graph.astream(prepared["state"], config=config, stream_mode=["custom", "updates"]):
+            if mode == "custom":
+                # written by a shard the moment the question is admitted
+                if chunk.get("question"):
+                    yield question_event(chunk["question"], "generated")
+                continue
+            values = chunk.get("collect")
+            if values:
+                final_state.update(values)
+                if values.get("iterations"):
+                    yield "progress", {
+                        "stage": "round",
+                        "iteration": values["iterations"],
+                        "accepted": len(values.get("valid_questions") or []),
+                        "target": num_questions,
+                    }
+
+        result = self._finish(prepared, final_state, query, num_questions)
+        if first_question_at is not None:
+            logger.info("Streamed questions", extra={
+                "first_question_s": round(first_question_at, 3),
+                "questions": len(emitted),
+                "elapsed_s": round(time.perf_counter() - started, 3),
+            })
+        yield "summary", result
+
+    async def _bank_questions(self, questions: List[str], taxonomy: Dict[str, Any], query: str):
+        try:
+            added = await self.question_bank.aadd(questions, taxonomy=taxonomy, query=query)
+            logger.info("Banked questions", extra={"added": len(added), "candidates": len(questions)})
+        except Exception as e:
+            logger.warning("Failed to store questions in the question bank", extra={"error": str(e)})
+
+    async def pregenerate(self, subtopics: List[str], per_subtopic: int) -> int:
+        """Fill the question bank ahead of demand, one subtopic at a time; returns questions stored."""
+        if self.question_bank is None:
+            return 0
+        before = await self.question_bank.acount()
+        for subtopic in subtopics:
+            try:
+                # scoped to the subtopic so the context comes from the chunks tagged with it
+                await self.generate_questions(subtopic, per_subtopic, filters={"subtopic": subtopic})
+                if self._background:
+                    await asyncio.gather(*self._background)
+            except Exception as e:
+                logger.warning("Pre-generation failed", extra={"subtopic": subtopic, "error": str(e)})
+        stored = await self.question_bank.acount() - before
+        logger.info("Pre-generated questions", extra={"stored": stored, "subtopics": len(subtopics)})
+        return stored
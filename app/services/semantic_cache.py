@@ -0,0 +1,117 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+
+
+@dataclass
+class _Entry:
+    query: str
+    vector: np.ndarray
+    num_questions: int
+    result: Dict[str, Any]
+    created_at: float
+    # retrieval filters the response was generated under; only identical scopes can match
+    scope: Tuple = ()
+
+
+class SemanticCache:
+    """In-process cache of validated question responses keyed by query-embedding similarity.
+
+    A lookup hits when a stored query's cosine similarity is at least ``threshold`` and the stored
+    response holds at least as many valid questions as requested. Entries expire after
+    ``ttl_seconds``, the least recently used are evicted past ``max_entries``, and everything is
+    dropped whenever ``version_fn`` reports that the collection content changed.
+    """
+
+    def __init__(
+        self,
+        version_fn: Optional[Callable[[], Optional[str]]] = None,
+        threshold: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[int] = None,
+    ):
+        self.version_fn = version_fn
+        self.threshold = threshold if threshold is not None else settings.SEMANTIC_CACHE_THRESHOLD
+        self.max_entries = max_entries or settings.SEMANTIC_CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.SEMANTIC_CACHE_TTL_SECONDS
+        self.entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._next_id = 0
+        self._version = version_fn() if version_fn else None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def _check_version(self):
+        if self.version_fn is None:
+            return
+        current = self.version_fn()
+        if current != self._version:
+            self._version = current
+            self.invalidate()
+
+    def _expire(self):
+        if not self.ttl_seconds:
+            return
+        cutoff = time.time() - self.ttl_seconds
+        for key in [k for k, e in self.entries.items() if e.created_at < cutoff]:
+            del self.entries[key]
+
+    def lookup(self, vector: List[float], num_questions: int, scope: Tuple = ()) -> Optional[Dict[str, Any]]:
+        self._check_version()
+        self._expire()
+        candidates = [
+            (k, e) for k, e in self.entries.items()
+            if e.scope == scope and len(e.result.get("questions", [])) >= num_questions
+        ]
+        if candidates:
+            query = self._normalize(vector)
+            matrix = np.stack([e.vector for _, e in candidates])
+            scores = matrix @ query
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                key, entry = candidates[best]
+                self.entries.move_to_end(key)
+                self.hits += 1
+                result = dict(entry.result)
+                result["questions"] = entry.result["questions"][:num_questions]
+                return result
+        self.misses += 1
+        return None
+
+    def store(self, query: str, vector: List[float], num_questions: int, result: Dict[str, Any], scope: Tuple = ()):
+        self._check_version()
+        self.entries[self._next_id] = _Entry(
+            query=query,
+            vector=self._normalize(vector),
+            num_questions=num_questions,
+            result=result,
+            created_at=time.time(),
+            scope=scope,
+        )
+        self._next_id += 1
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self):
+        self.entries.clear()
+        self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "threshold": self.threshold,
+        }
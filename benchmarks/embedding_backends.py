@@ -0,0 +1,123 @@
+"""Ingest throughput and query latency of the embedding providers.
+
+For each provider (``openai``, ``local``) this embeds a set of chunks in INGEST_BATCH_SIZE
+batches, the way ingest hands them to the vector store, and then embeds queries one at a time.
+It reports chunks/sec, p50/p99 query latency and the vector size. The persistent embedding cache
+is bypassed, so every call reaches the backend.
+
+Chunks are synthetic prose of RAG_CHUNK_SIZE characters unless ``--pdf`` is given, in which
+case the PDF is loaded and split exactly as ingest does. A provider that cannot be built
+(no API key or network, fastembed not installed) is reported with its error instead of numbers.
+
+    python -m benchmarks.embedding_backends --providers openai local --chunks 512 --queries 50
+    EMBEDDING_DIMENSION=384 python -m benchmarks.embedding_backends --providers local --threads 4
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+from typing import List
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from app.core.config import settings
+from app.rag.embeddings import get_embeddings
+
+WORDS = (
+    "cell membrane energy photosynthesis chlorophyll glucose enzyme protein nucleus mitochondria "
+    "respiration oxygen carbon dioxide reaction light water molecule structure function transport "
+    "diffusion osmosis gradient atom bond electron force velocity acceleration mass equation"
+).split()
+
+
+def synthetic_chunks(count: int, size: int, rng: random.Random) -> List[str]:
+    chunks = []
+    for _ in range(count):
+        words: List[str] = []
+        while sum(len(w) + 1 for w in words) < size:
+            words.append(rng.choice(WORDS))
+        chunks.append(" ".join(words).capitalize() + ".")
+    return chunks
+
+
+def pdf_chunks(path: str, count: int) -> List[str]:
+    from app.rag.loader import PDFLoader
+    from app.rag.splitter import TextSplitter
+    chunks = [c.page_content for c in TextSplitter().split_iter(PDFLoader().lazy_load(path)) if c.page_content.strip()]
+    return chunks[:count]
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_provider(provider: str, chunks: List[str], queries: List[str], batch_size: int) -> dict:
+    started = time.perf_counter()
+    try:
+        embeddings = get_embeddings(provider=provider, cache=False)
+        # one warm-up call so connection setup / ONNX session initialisation isn't counted
+        embeddings.embed_query("warm up")
+    except Exception as e:
+        return {"provider": provider, "error": f"{type(e).__name__}: {e}"}
+    setup_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    dimension = None
+    for i in range(0, len(chunks), batch_size):
+        vectors = embeddings.embed_documents(chunks[i:i + batch_size])
+        dimension = len(vectors[0]) if vectors else dimension
+    ingest_s = time.perf_counter() - started
+
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        embeddings.embed_query(query)
+        latencies.append(time.perf_counter() - started)
+
+    return {
+        "provider": provider,
+        "dimension": dimension,
+        "setup_s": round(setup_s, 3),
+        "chunks": len(chunks),
+        "ingest_s": round(ingest_s, 3),
+        "chunks_per_sec": round(len(chunks) / ingest_s, 1) if ingest_s > 0 else None,
+        "query_p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "query_p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--providers", nargs="+", default=["openai", "local"])
+    parser.add_argument("--chunks", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--pdf", help="embed the chunks of this PDF instead of synthetic text")
+    parser.add_argument("--batch-size", type=int, default=settings.INGEST_BATCH_SIZE, help="chunks per embed_documents call")
+    parser.add_argument("--threads", type=int, help="override LOCAL_EMBEDDING_THREADS")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        settings.LOCAL_EMBEDDING_THREADS = args.threads
+    rng = random.Random(args.seed)
+    chunks = pdf_chunks(args.pdf, args.chunks) if args.pdf else synthetic_chunks(args.chunks, settings.RAG_CHUNK_SIZE, rng)
+    queries = [" ".join(rng.sample(WORDS, 6)) for _ in range(args.queries)]
+
+    results = []
+    for provider in args.providers:
+        row = run_provider(provider, chunks, queries, args.batch_size)
+        results.append(row)
+        print(json.dumps(row))
+    print(json.dumps({
+        "batch_size": args.batch_size,
+        "embedding_batch_size": settings.EMBEDDING_BATCH_SIZE,
+        "local_threads": settings.LOCAL_EMBEDDING_THREADS,
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""Stand-in OpenAI API for offline benchmarks.
+
+Serves the three endpoints the app uses: ``/v1/responses`` (ingest TOC, enrichment and vision
+calls), ``/v1/chat/completions`` (question generator and evaluator) and ``/v1/embeddings``. Every
+reply is valid for the prompt it answers, and the content is derived from the request alone,
+so runs are reproducible.
+
+- Latency: each completion sleeps ``latency + output_tokens x token_latency``. Output tokens are
+  the reply's estimated size or ``output_tokens``, whichever is larger, and are reported in
+  ``usage``.
+- Rate limits: with probability ``error_rate`` a request is answered with 429 and a
+  ``Retry-After`` header instead.
+- Packed enrichment: each chunk result is left out of the array with probability
+  ``pack_drop_rate``, to exercise the per-chunk retry path.
+- Embeddings: hashed bag-of-words vectors, unit length and deterministic, where texts that share
+  words are similar. Both float and base64 encodings are supported.
+
+Run it alone and point the app at it with ``OPENAI_BASE_URL``:
+
+    python -m benchmarks.fake_openai --port 8100 --latency 0.2 --error-rate 0.05
+"""
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from array import array
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+SUBJECTS = ["Biology", "Physics", "Chemistry", "Mathematics", "History", "Geography"]
+TOPICS = ["Foundations", "Energy", "Structure", "Change", "Systems", "Measurement", "Interactions", "Models"]
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def fake_embedding(text: str, dimension: int) -> List[float]:
+    vector = [0.0] * dimension
+    for word in _WORD.findall(text.lower()):
+        h = zlib.crc32(word.encode("utf-8"))
+        vector[h % dimension] += 1.0 if (h >> 16) & 1 else -1.0
+    norm = sum(v * v for v in vector) ** 0.5 or 1.0
+    return [v / norm for v in vector]
+
+
+def _pick(options: List[str], text: str, salt: str = "") -> str:
+    return options[zlib.crc32((salt + text).encode("utf-8")) % len(options)]
+
+
+def _prompt_text(messages: Any) -> str:
+    if isinstance(messages, str):
+        return messages
+    parts = []
+    for message in messages or []:
+        content = message.get("content") if isinstance(message, dict) else None
+        if isinstance(content, str):
+            parts.append(content)
+        elif isinstance(content, list):
+            parts.extend(p.get("text", "") for p in content if isinstance(p, dict))
+    return "\n".join(parts)
+
+
+def _has_image(messages: Any) -> bool:
+    return isinstance(messages, list) and any(
+        isinstance(m, dict) and isinstance(m.get("content"), list)
+        and any(isinstance(p, dict) and p.get("type") in ("input_image", "image_url") for p in m["content"])
+        for m in messages
+    )
+
+
+class FakeOpenAI:
+    def __init__(self, latency: float = 0.2, token_latency: float = 0.0, output_tokens: int = 0,
+                 error_rate: float = 0.0, retry_after: float = 0.1, pass_rate: float = 1.0,
+                 pack_drop_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.output_tokens = output_tokens
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.pass_rate = pass_rate
+        self.pack_drop_rate = pack_drop_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._question_ids = itertools.count()
+        self.requests: Counter = Counter()
+        self.rate_limited: Counter = Counter()
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.app = self._build_app()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": dict(self.requests),
+            "rate_limited": dict(self.rate_limited),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+    def _throttled(self, endpoint: str) -> Optional[JSONResponse]:
+        with self._lock:
+            self.requests[endpoint] += 1
+            limited = self._rng.random() < self.error_rate
+            if limited:
+                self.rate_limited[endpoint] += 1
+        if not limited:
+            return None
+        return JSONResponse(
+            status_code=429,
+            headers={"retry-after": str(self.retry_after)},
+            content={"error": {"message": "Rate limit reached (injected)", "type": "requests", "code": "rate_limit_exceeded"}},
+        )
+
+    async def _complete(self, prompt: str, image: bool) -> Dict[str, Any]:
+        text = self.reply(prompt, image)
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = max(len(text) // 4, self.output_tokens)
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+        await asyncio.sleep(self.latency + completion_tokens * self.token_latency)
+        return {"text": text, "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+
+    def reply(self, prompt: str, image: bool = False) -> str:
+        candidates = re.search(r"Candidate questions \(JSON array\): (\[.*?\])\n", prompt, re.S)
+        if candidates:
+            questions = json.loads(candidates.group(1))
+            with self._lock:
+                passed = [q for q in questions if self._rng.random() < self.pass_rate]
+            failed = [q for q in questions if q not in passed]
+            return json.dumps({"passed_questions": passed, "failed": failed, "evaluation": "Checked against the context."})
+        count = re.search(r"generate exactly (\d+) MCQs", prompt)
+        if count:
+            topic = re.search(r"Topic/Query: (.*)", prompt)
+            topic = topic.group(1).strip() if topic else "the context"
+            return json.dumps([
+                f"Question {next(self._question_ids)} about {topic}? A) one B) two C) three D) four Answer: A"
+                for _ in range(int(count.group(1)))
+            ])
+        packed = re.search(r'The chunks \(a JSON array of \{"id": integer, "text": string\}\) are:\n(\[.*\])\s*$', prompt, re.S)
+        if packed:
+            results = []
+            for chunk in json.loads(packed.group(1)):
+                with self._lock:
+                    if self._rng.random() < self.pack_drop_rate:
+                        continue
+                results.append({"id": chunk["id"], **self._taxonomy(chunk["text"], descriptions=False)})
+            return json.dumps(results)
+        if "The chapter titles are:" in prompt:
+            return json.dumps({"subject": _pick(SUBJECTS, prompt.rsplit("The chapter titles are:", 1)[-1])})
+        # enrichment prompts embed the TOC answer, so they are matched before the TOC prompt
+        if "Subject > Topic > Subtopic" in prompt:
+            page_text = prompt.rsplit("Extracted raw text of the page is:", 1)[-1].strip()
+            return json.dumps(self._taxonomy(page_text))
+        if "is_table_of_contents" in prompt:
+            return json.dumps({"is_table_of_contents": False, "entries": [], "notes": "No table of contents found."})
+        if image:
+            return json.dumps({"summary": "A page with a figure.", "details": "The figure shows a labelled diagram."})
+        return "OK"
+
+    @staticmethod
+    def _taxonomy(text: str, descriptions: bool = True) -> Dict[str, Any]:
+        heading = next((line.strip() for line in text.splitlines() if line.strip()), "Overview")[:60]
+        subtopic = {"subtopic_name": heading, "confidence": "high"}
+        if descriptions:
+            subtopic["description"] = text
+        return {
+            "subject": _pick(SUBJECTS, text[:200]),
+            "topics": [{"topic_name": _pick(TOPICS, text[:200], "topic"), "confidence": "high", "subtopics": [subtopic]}],
+        }
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI(title="Fake OpenAI")
+
+        @app.post("/v1/responses")
+        async def responses(request: Request):
+            body = await request.json()
+            limited = self._throttled("responses")
+            if limited is not None:
+                return limited
+            result = await self._complete(_prompt_text(body.get("input")), _has_image(body.get("input")))
+            return {
+                "id": f"resp_{time.time_ns()}",
+                "object": "response",
+                "created_at": int(time.time()),
+                "model": body.get("model", "fake"),
+                "status": "completed",
+                "output": [{
+                    "type": "message",
+                    "id": f"msg_{time.time_ns()}",
+                    "status": "completed",
+                    "role": "assistant",
+                    "content": [{"type": "output_text", "text": result["text"], "annotations": []}],
+                }],
+                "parallel_tool_calls": False,
+                "tool_choice": "auto",
+                "tools": [],
+                "usage": {
+                    "input_tokens": result["prompt_tokens"],
+                    "output_tokens": result["completion_tokens"],
+                    "total_tokens": result["prompt_tokens"] + result["completion_tokens"],
+                    "input_tokens_details": {"cached_tokens": 0},
+                    "output_tokens_details": {"reasoning_tokens": 0},
+                },
+            }
+
+        @app.post("/v1/chat/completions")
+        async def chat_completions(request: Request):
+            body = await request.json()
+            limited = self._throttled("chat.completions")
+            if limited is not None:
+                return limited
+            result = await self._complete(_prompt_text(body.get("messages")), _has_image(body.get("messages")))
+            return {
+                "id": f"chatcmpl_{time.time_ns()}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": result["text"]},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": result["prompt_tokens"],
+                    "completion_tokens": result["completion_tokens"],
+                    "total_tokens": result["prompt_tokens"] + result["completion_tokens"],
+                },
+            }
+
+        @app.post("/v1/embeddings")
+        async def embeddings(request: Request):
+            body = await request.json()
+            limited = self._throttled("embeddings")
+            if limited is not None:
+                return limited
+            inputs = body.get("input")
+            inputs = [inputs] if isinstance(inputs, str) else list(inputs or [])
+            dimension = int(body.get("dimensions") or 1536)
+            data = []
+            for i, text in enumerate(inputs):
+                vector = fake_embedding(text if isinstance(text, str) else " ".join(map(str, text)), dimension)
+                if body.get("encoding_format") == "base64":
+                    vector = base64.b64encode(array("f", vector).tobytes()).decode("ascii")
+                data.append({"object": "embedding", "index": i, "embedding": vector})
+            tokens = sum(len(str(t)) // 4 for t in inputs)
+            with self._lock:
+                self.prompt_tokens += tokens
+            return {
+                "object": "list",
+                "data": data,
+                "model": body.get("model", "fake"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            }
+
+        @app.get("/stats")
+        async def stats():
+            return self.stats()
+
+        return app
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per completion before output tokens")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="seconds per output token")
+    parser.add_argument("--output-tokens", type=int, default=0, help="minimum output tokens per completion")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="Retry-After seconds on injected 429s")
+    parser.add_argument("--pass-rate", type=float, default=1.0, help="fraction of questions the evaluator passes")
+    parser.add_argument("--pack-drop-rate", type=float, default=0.0, help="fraction of chunk results left out of packed enrichment answers")
+
+
+def from_args(args: argparse.Namespace, seed: int = 0) -> FakeOpenAI:
+    return FakeOpenAI(
+        latency=args.latency,
+        token_latency=args.token_latency,
+        output_tokens=args.output_tokens,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+        pass_rate=args.pass_rate,
+        pack_drop_rate=args.pack_drop_rate,
+        seed=seed,
+    )
+
+
+def main():
+    import uvicorn
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(from_args(args).app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
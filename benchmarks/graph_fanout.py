@@ -0,0 +1,65 @@
+"""Latency benchmark for the fan-out generation graph.
+
+Runs one request per question count through the LangGraph workflow with a stand-in chat model
+whose latency grows with the number of questions it writes or judges, as real completions do.
+It compares a serial configuration (one generator call and strictly one shard per round) with
+parallel fan-out.
+
+    python -m benchmarks.graph_fanout --counts 5 10 20 --fanouts 1 4 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from app.agents.graph import QuestionAgents, create_graph
+from app.core.config import settings
+from benchmarks.question_concurrency import StandInChat
+
+
+async def run(count: int, fanout: int, args) -> dict:
+    settings.GENERATION_MAX_FANOUT = fanout
+    # with a fan-out of 1 a single call writes every remaining question, like the old graph
+    settings.GENERATION_SHARD_SIZE = count if fanout == 1 else args.shard_size
+    agents = QuestionAgents()
+    agents.llm = StandInChat(args.llm_latency, blocking=False, per_question_latency=args.per_question_latency)
+    graph = create_graph(agents)
+    started = time.perf_counter()
+    state = await graph.ainvoke({
+        "query": "photosynthesis",
+        "context": "Photosynthesis converts light to chemical energy.",
+        "iterations": 0,
+        "passed": False,
+        "questions": [],
+        "evaluation": "",
+        "target": count,
+        "valid_questions": [],
+    })
+    return {
+        "num_questions": count,
+        "fanout": fanout,
+        "latency_s": round(time.perf_counter() - started, 3),
+        "llm_calls": agents.llm.calls,
+        "accepted": len(state["valid_questions"]),
+        "iterations": state["iterations"],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--counts", type=int, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--fanouts", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--shard-size", type=int, default=2)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="fixed seconds per call")
+    parser.add_argument("--per-question-latency", type=float, default=0.3, help="seconds per question written or judged")
+    args = parser.parse_args()
+
+    results = [await run(count, fanout, args) for count in args.counts for fanout in args.fanouts]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
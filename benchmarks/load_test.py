@@ -0,0 +1,357 @@
+"""Offline load test of the real FastAPI app.
+
+Starts the stand-in OpenAI server from ``benchmarks.fake_openai`` and the app itself (real
+lifespan, registry, routers and services) with uvicorn on local ports. Qdrant runs embedded, in
+memory by default. The harness then drives the public API over HTTP:
+
+1. ingest: uploads ``--pdfs`` synthetic text PDFs of ``--pages`` pages to ``POST /ingest`` with
+   ``--ingest-concurrency`` uploads in flight, and polls each job until it finishes. With
+   ``--outline`` the PDFs carry chapter/section bookmarks;
+2. questions: sends ``--requests`` calls to ``POST /generate/questions`` with ``--concurrency``
+   in flight, using queries about the ingested material.
+
+The JSON report has pages/sec and chunks/sec for ingest, latency percentiles, throughput and
+error counts for questions, and the request, 429 and token counts seen by the fake OpenAI.
+Nothing leaves the machine and nothing is billed. The LLM, embedding and semantic caches and the
+question bank are off unless ``--caches`` is given, so every request does the full work.
+
+    python -m benchmarks.load_test --pdfs 4 --pages 20 --requests 100 --concurrency 16 --output report.json
+    python -m benchmarks.load_test --latency 0.5 --error-rate 0.05 --qdrant-url http://localhost:6333
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Dict, List
+
+from benchmarks.fake_openai import SUBJECTS, TOPICS, add_arguments, from_args
+
+WORDS = (
+    "energy cell membrane structure function reaction rate force motion equation graph variable "
+    "system model evidence process cycle water carbon light heat pressure volume density layer "
+    "population change pattern measure compare explain describe predict observe sample result"
+).split()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class ServerThread:
+    """Run an ASGI app under uvicorn in a background thread for the duration of a ``with`` block."""
+
+    def __init__(self, app, port: int):
+        import uvicorn
+        self.url = f"http://127.0.0.1:{port}"
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        deadline = time.time() + 30
+        while not self.server.started:
+            if not self.thread.is_alive() or time.time() > deadline:
+                raise RuntimeError(f"Server at {self.url} failed to start")
+            time.sleep(0.02)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=30)
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages: List[List[str]]) -> bytes:
+    """Minimal PDF with one Helvetica text line per entry of each page."""
+    objects: Dict[int, str] = {
+        1: "<< /Type /Catalog /Pages 2 0 R >>",
+        2: "<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages))), len(pages)),
+        3: "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    for i, lines in enumerate(pages):
+        stream = "BT /F1 10 Tf 13 TL 50 800 Td " + " ".join(f"({_escape(line)}) Tj T*" for line in lines) + " ET"
+        objects[4 + 2 * i] = (
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        )
+        objects[5 + 2 * i] = f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream"
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(out)
+        out += f"{number} 0 obj\n{objects[number]}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    size = max(objects) + 1
+    out += f"xref\n0 {size}\n0000000000 65535 f \n".encode("latin-1")
+    for number in range(1, size):
+        out += f"{offsets[number]:010d} 00000 n \n".encode("latin-1")
+    out += f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return bytes(out)
+
+
+def add_outline(pdf: bytes, book: List[List[str]]) -> bytes:
+    """Bookmark a synthetic book: a chapter every four pages, a section per page (its heading)."""
+    import io
+    from pypdf import PdfReader, PdfWriter
+    writer = PdfWriter(clone_from=PdfReader(io.BytesIO(pdf)))
+    chapter = None
+    for page, lines in enumerate(book):
+        if page % 4 == 0:
+            chapter = writer.add_outline_item(f"Chapter {page // 4 + 1}: {TOPICS[(page // 4) % len(TOPICS)]}", page)
+        writer.add_outline_item(lines[0], page, parent=chapter)
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def synthetic_book(index: int, pages: int, lines_per_page: int, rng: random.Random) -> List[List[str]]:
+    subject = SUBJECTS[index % len(SUBJECTS)]
+    book = []
+    for page in range(pages):
+        topic = TOPICS[(page // 4) % len(TOPICS)]
+        lines = [f"{page // 4 + 1}.{page % 4 + 1} {topic} in {subject}"]
+        while len(lines) < lines_per_page:
+            lines.append(" ".join(rng.choice(WORDS) for _ in range(14)).capitalize() + ".")
+        book.append(lines)
+    return book
+
+
+def percentiles(samples: List[float]) -> Dict[str, Any]:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def at(pct: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))], 4)
+
+    return {
+        "count": len(ordered),
+        "mean_s": round(statistics.fmean(ordered), 4),
+        "p50_s": at(50),
+        "p95_s": at(95),
+        "p99_s": at(99),
+        "max_s": round(ordered[-1], 4),
+    }
+
+
+async def run_ingest(client, base_url: str, books: List[bytes], concurrency: int, poll_interval: float) -> Dict[str, Any]:
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    jobs: List[Dict[str, Any]] = []
+
+    async def one(i: int, pdf: bytes):
+        async with semaphore:
+            submitted = time.perf_counter()
+            response = await client.post(f"{base_url}/api/v1/ingest/", files={"file": (f"book_{i}.pdf", pdf, "application/pdf")})
+            if response.status_code != 202:
+                jobs.append({"status": f"http_{response.status_code}", "latency_s": time.perf_counter() - submitted})
+                return
+            status_url = response.json()["status_url"]
+            while True:
+                await asyncio.sleep(poll_interval)
+                status = (await client.get(status_url)).json()
+                if status["status"] in ("completed", "failed", "cancelled"):
+                    break
+            jobs.append({
+                "status": status["status"],
+                "latency_s": time.perf_counter() - submitted,
+                "pages": status.get("pages_processed") or 0,
+                "chunks": status.get("chunks_processed") or 0,
+                "error": status.get("error"),
+            })
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i, pdf) for i, pdf in enumerate(books)))
+    elapsed = time.perf_counter() - started
+    done = [j for j in jobs if j["status"] == "completed"]
+    pages = sum(j["pages"] for j in done)
+    chunks = sum(j["chunks"] for j in done)
+    return {
+        "jobs": len(jobs),
+        "completed": len(done),
+        "failed": len(jobs) - len(done),
+        "errors": sorted({j["error"] for j in jobs if j.get("error")}),
+        "pages": pages,
+        "chunks": chunks,
+        "wall_s": round(elapsed, 3),
+        "pages_per_sec": round(pages / elapsed, 2) if elapsed > 0 else None,
+        "chunks_per_sec": round(chunks / elapsed, 2) if elapsed > 0 else None,
+        "job_latency": percentiles([j["latency_s"] for j in done]),
+    }
+
+
+async def run_questions(client, base_url: str, total: int, concurrency: int, num_questions: int, rng: random.Random) -> Dict[str, Any]:
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    returned: List[int] = []
+    queries = [f"{rng.choice(TOPICS)} in {rng.choice(SUBJECTS)}: {' '.join(rng.sample(WORDS, 3))}" for _ in range(total)]
+
+    async def one(query: str):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.post(f"{base_url}/api/v1/generate/questions/", json={"query": query, "num_questions": num_questions})
+                key = str(response.status_code)
+            except Exception as e:
+                response, key = None, type(e).__name__
+            statuses[key] = statuses.get(key, 0) + 1
+            if response is not None and response.status_code == 200:
+                latencies.append(time.perf_counter() - started)
+                returned.append(len(response.json().get("questions", [])))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in queries))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "statuses": statuses,
+        "wall_s": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 2) if elapsed > 0 else None,
+        "questions_per_request": round(statistics.fmean(returned), 2) if returned else 0,
+        "latency": percentiles(latencies),
+    }
+
+
+def configure_environment(args: argparse.Namespace, openai_url: str, workdir: str):
+    """Point the app at the stand-ins; must run before anything imports app.core.config."""
+    caches = "true" if args.caches else "false"
+    os.environ.update({
+        "OPENAI_API_KEY": "sk-fake",
+        "OPENAI_BASE_URL": f"{openai_url}/v1",
+        # the fake server takes plain text; token ids would need tiktoken's downloadable encodings
+        "EMBEDDING_CHECK_CTX_LENGTH": "false",
+        "EMBEDDING_PROVIDER": "openai",
+        "CACHE_DB_PATH": os.path.join(workdir, "cache.sqlite3"),
+        "INGEST_UPLOAD_DIR": workdir,
+        "LLM_CACHE_ENABLED": caches,
+        "EMBEDDING_CACHE_ENABLED": caches,
+        "SEMANTIC_CACHE_ENABLED": caches,
+        "QUESTION_BANK_ENABLED": caches,
+        "QUESTION_BANK_PREGENERATE": "false",
+        "LOG_LEVEL": "INFO" if args.verbose else "WARNING",
+    })
+    if args.qdrant_url:
+        os.environ["QDRANT_URL"] = args.qdrant_url
+        os.environ.pop("QDRANT_LOCAL_PATH", None)
+        suffix = uuid.uuid4().hex[:8]
+        os.environ["QDRANT_COLLECTION_NAME"] = f"loadtest_{suffix}"
+        os.environ["QUESTION_BANK_COLLECTION_NAME"] = f"loadtest_bank_{suffix}"
+    else:
+        os.environ["QDRANT_LOCAL_PATH"] = args.qdrant_path or ":memory:"
+
+
+async def wait_until_warm(client, base_url: str, timeout: float):
+    """Block until startup warm-up has built the services, so it isn't billed to the first requests."""
+    from app.core.config import settings
+    if not settings.STARTUP_WARMUP:
+        return
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        initialized = (await client.get(f"{base_url}/health")).json()["pools"]["initialized"]
+        if "question_service" in initialized:
+            return
+        await asyncio.sleep(0.1)
+    raise RuntimeError("App warm-up did not finish in time")
+
+
+async def drive(args: argparse.Namespace, base_url: str, books: List[bytes], rng: random.Random) -> Dict[str, Any]:
+    import httpx
+    limits = httpx.Limits(max_connections=max(args.concurrency, args.ingest_concurrency) * 2)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        await wait_until_warm(client, base_url, args.timeout)
+        report: Dict[str, Any] = {}
+        if books:
+            report["ingest"] = await run_ingest(client, base_url, books, args.ingest_concurrency, args.poll_interval)
+        if args.requests:
+            report["questions"] = await run_questions(client, base_url, args.requests, args.concurrency, args.num_questions, rng)
+        if args.metrics:
+            with open(args.metrics, "w") as f:
+                f.write((await client.get(f"{base_url}/metrics")).text)
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", type=int, default=2)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--lines-per-page", type=int, default=30)
+    parser.add_argument("--outline", action="store_true", help="give the PDFs chapter/section bookmarks")
+    parser.add_argument("--ingest-concurrency", type=int, default=2)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--num-questions", type=int, default=5)
+    parser.add_argument("--qdrant-path", help="embedded Qdrant storage directory (default: in memory)")
+    parser.add_argument("--qdrant-url", help="use this Qdrant server (temporary collections) instead of embedded mode")
+    parser.add_argument("--caches", action="store_true", help="keep the LLM/embedding/semantic caches and question bank on")
+    parser.add_argument("--poll-interval", type=float, default=0.2)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--metrics", help="write the app's Prometheus /metrics scrape after the run to this file")
+    parser.add_argument("--verbose", action="store_true", help="show the app's own log output")
+    parser.add_argument("--seed", type=int, default=0)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    fake = from_args(args, seed=args.seed)
+    texts = [synthetic_book(i, args.pages, args.lines_per_page, rng) for i in range(args.pdfs)]
+    books = [add_outline(make_pdf(t), t) if args.outline else make_pdf(t) for t in texts]
+
+    with tempfile.TemporaryDirectory(prefix="loadtest_") as workdir, ServerThread(fake.app, free_port()) as openai_server:
+        configure_environment(args, openai_server.url, workdir)
+        from main import app
+        from app.core.observability import configure_logging
+        # keep stdout for the report
+        configure_logging(stream=sys.stderr)
+
+        quiet = open(os.devnull, "w") if not args.verbose else None
+        with contextlib.redirect_stdout(quiet) if quiet else contextlib.nullcontext():
+            try:
+                with ServerThread(app, free_port()) as app_server:
+                    report = asyncio.run(drive(args, app_server.url, books, rng))
+            finally:
+                if quiet:
+                    quiet.close()
+
+    report = {
+        "config": {
+            "pdfs": args.pdfs,
+            "pages_per_pdf": args.pages,
+            "ingest_concurrency": args.ingest_concurrency,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "num_questions": args.num_questions,
+            "latency_s": args.latency,
+            "token_latency_s": args.token_latency,
+            "output_tokens": args.output_tokens,
+            "error_rate": args.error_rate,
+            "qdrant": args.qdrant_url or args.qdrant_path or ":memory:",
+            "caches": args.caches,
+        },
+        **report,
+        "fake_openai": fake.stats(),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text, file=sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
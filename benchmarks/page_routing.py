@@ -0,0 +1,63 @@
+"""Page classifier routing and cost for a PDF.
+
+Profiles every page the way an ingest job with INGEST_VISUAL_ROUTING does. It prints how many
+pages would go to the vision model and why, the vision calls saved against describing every
+page, and the classifier time per page next to plain text extraction. ``--pages`` also prints
+each page's profile, to help tune the VISUAL_* thresholds for a book.
+
+    python -m benchmarks.page_routing book.pdf
+    VISUAL_MIN_DRAWING_OPS=200 python -m benchmarks.page_routing book.pdf --pages
+"""
+import argparse
+import json
+import os
+import time
+from collections import Counter
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from app.core.config import settings
+from app.rag.classifier import classify_pages
+from app.rag.loader import PDFLoader
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf")
+    parser.add_argument("--pages", action="store_true", help="print the profile of every page")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    profiles = list(classify_pages(args.pdf))
+    classify_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in PDFLoader.lazy_load(args.pdf):
+        pass
+    extract_s = time.perf_counter() - started
+
+    if args.pages:
+        for profile in profiles:
+            print(json.dumps(profile.as_dict()))
+    visual = [p.page for p in profiles if p.route == "visual"]
+    count = max(1, len(profiles))
+    print(json.dumps({
+        "pages": len(profiles),
+        "visual_pages": len(visual),
+        "vision_calls_saved": len(profiles) - len(visual),
+        "vision_share": round(len(visual) / count, 3),
+        "reasons": dict(Counter(p.reason for p in profiles)),
+        "classify_ms_per_page": round(classify_s / count * 1000, 3),
+        "text_extract_ms_per_page": round(extract_s / count * 1000, 3),
+        "thresholds": {
+            "VISUAL_MIN_IMAGE_PIXELS": settings.VISUAL_MIN_IMAGE_PIXELS,
+            "VISUAL_MIN_DRAWING_OPS": settings.VISUAL_MIN_DRAWING_OPS,
+            "VISUAL_MIN_MATH_RATIO": settings.VISUAL_MIN_MATH_RATIO,
+            "VISUAL_SPARSE_TEXT_CHARS": settings.VISUAL_SPARSE_TEXT_CHARS,
+        },
+        "visual_page_numbers": visual,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
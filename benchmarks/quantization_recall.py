@@ -0,0 +1,200 @@
+"""Recall and latency of reduced embedding dimensions and quantization.
+
+For every combination of dimension, quantization (none, scalar int8, binary) and rescoring it
+reports recall@k against exact full-dimension search, p50/p99 query latency and the RAM the
+searched vectors take per point.
+
+By default the search is simulated in numpy, so it runs offline. The quantized copy is scanned
+first, and with rescoring the top ``oversampling x k`` candidates are re-ranked against the
+original vectors, as Qdrant does. In this mode the latencies are those of the simulation. Pass
+``--qdrant-url`` to build a temporary collection per configuration on a real Qdrant server and
+time actual queries. Local ``:memory:`` mode ignores quantization, so it is not offered.
+
+The vectors are synthetic, with variance that decays over the dimensions the way
+text-embedding-3's shortenable embeddings do. Pass ``--vectors file.npy`` (N x D float32) to
+measure real embeddings instead.
+
+    python -m benchmarks.quantization_recall --points 20000 --dims 1536 512 256
+    python -m benchmarks.quantization_recall --qdrant-url http://localhost:6333
+"""
+import argparse
+import json
+import os
+import time
+import uuid
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import numpy as np
+
+
+def _unit(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+def synthetic_vectors(points: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    # leading dimensions carry most of the variance, like Matryoshka-trained embeddings
+    scale = 1.0 / np.sqrt(1.0 + np.arange(dim) / 64.0)
+    centers = rng.normal(size=(clusters, dim)) * scale
+    labels = rng.integers(0, clusters, size=points)
+    return _unit(centers[labels] + 0.6 * rng.normal(size=(points, dim)) * scale)
+
+
+def make_queries(data: np.ndarray, count: int, rng: np.random.Generator) -> np.ndarray:
+    picks = data[rng.integers(0, len(data), size=count)]
+    return _unit(picks + 0.3 * rng.normal(size=picks.shape) * picks.std(axis=0))
+
+
+def truncate(matrix: np.ndarray, dim: int) -> np.ndarray:
+    # shortening a text-embedding-3 vector = keep the leading dimensions and renormalise
+    return _unit(matrix[:, :dim])
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, scores.shape[-1])
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx])]
+
+
+def ram_bytes(dim: int, quantization: str) -> float:
+    return {"none": 4.0 * dim, "scalar": float(dim), "binary": dim / 8.0}[quantization]
+
+
+class NumpyIndex:
+    """Brute-force stand-in for Qdrant's quantized search with optional rescoring."""
+
+    def __init__(self, vectors: np.ndarray, quantization: str):
+        self.vectors = vectors
+        self.quantization = quantization
+        if quantization == "scalar":
+            lo, hi = np.quantile(vectors, [0.005, 0.995])
+            self.codes = np.clip(np.round((vectors - lo) / ((hi - lo) / 255.0)), 0, 255).astype(np.float32)
+        elif quantization == "binary":
+            self.codes = np.where(vectors > 0, 1.0, -1.0).astype(np.float32)
+        else:
+            self.codes = vectors
+
+    def search(self, query: np.ndarray, k: int, rescore: bool, oversampling: float) -> np.ndarray:
+        probe = np.where(query > 0, 1.0, -1.0).astype(np.float32) if self.quantization == "binary" else query
+        # the scalar offset adds the same constant to every score, so ranking by codes is exact
+        approx = self.codes @ probe
+        if self.quantization == "none" or not rescore:
+            return top_k(approx, k)
+        candidates = top_k(approx, int(np.ceil(k * oversampling)))
+        return candidates[top_k(self.vectors[candidates] @ query, k)]
+
+
+class QdrantIndex:
+    def __init__(self, client, vectors: np.ndarray, quantization: str):
+        from qdrant_client import models
+        from app.rag.vectorstore import quantization_config
+        self.client = client
+        self.quantization = quantization
+        self.name = f"bench_quant_{vectors.shape[1]}_{quantization}_{uuid.uuid4().hex[:8]}"
+        client.create_collection(
+            collection_name=self.name,
+            vectors_config=models.VectorParams(size=vectors.shape[1], distance=models.Distance.COSINE, on_disk=True),
+            quantization_config=quantization_config(quantization),
+        )
+        for start in range(0, len(vectors), 1000):
+            batch = vectors[start:start + 1000]
+            client.upsert(
+                collection_name=self.name,
+                points=models.Batch(ids=list(range(start, start + len(batch))), vectors=batch.tolist()),
+                wait=True,
+            )
+
+    def search(self, query: np.ndarray, k: int, rescore: bool, oversampling: float) -> np.ndarray:
+        from app.rag.vectorstore import search_params
+        response = self.client.query_points(
+            collection_name=self.name,
+            query=query.tolist(),
+            limit=k,
+            search_params=search_params(self.quantization, rescore=rescore, oversampling=oversampling),
+        )
+        return np.array([p.id for p in response.points])
+
+    def close(self):
+        self.client.delete_collection(self.name)
+
+
+def evaluate(index, queries: np.ndarray, truth: np.ndarray, k: int, rescore: bool, oversampling: float) -> dict:
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        found = index.search(query, k, rescore, oversampling)
+        latencies.append(time.perf_counter() - started)
+        hits += len(set(found.tolist()) & set(expected.tolist()))
+    return {
+        "recall_at_k": round(hits / (k * len(queries)), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=1536, help="full dimension of synthetic vectors")
+    parser.add_argument("--dims", type=int, nargs="+", default=[1536, 512, 256])
+    parser.add_argument("--quantization", nargs="+", default=["none", "scalar", "binary"])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--oversampling", type=float, default=2.0)
+    parser.add_argument("--clusters", type=int, default=2000)
+    parser.add_argument("--vectors", help="optional .npy file of real embeddings (N x D)")
+    parser.add_argument("--qdrant-url", help="benchmark against this Qdrant server instead of the numpy simulation")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.vectors:
+        data = _unit(np.load(args.vectors).astype(np.float32))
+    else:
+        data = synthetic_vectors(args.points, args.dim, args.clusters, rng)
+    queries = make_queries(data, args.queries, rng)
+    # ground truth is exact search at full dimension, so shortening shows up in recall too
+    truth = np.stack([top_k(data @ q, args.k) for q in queries])
+
+    client = None
+    if args.qdrant_url:
+        from qdrant_client import QdrantClient
+        client = QdrantClient(url=args.qdrant_url, timeout=300)
+
+    results = []
+    for dim in args.dims:
+        if dim > data.shape[1]:
+            continue
+        vectors, probes = truncate(data, dim), truncate(queries, dim)
+        for quantization in args.quantization:
+            index = QdrantIndex(client, vectors, quantization) if client else NumpyIndex(vectors, quantization)
+            try:
+                for rescore in ([False] if quantization == "none" else [False, True]):
+                    row = {
+                        "dim": dim,
+                        "quantization": quantization,
+                        "rescore": rescore,
+                        "oversampling": args.oversampling if rescore else None,
+                        "ram_bytes_per_vector": ram_bytes(dim, quantization),
+                    }
+                    row.update(evaluate(index, probes, truth, args.k, rescore, args.oversampling))
+                    results.append(row)
+                    print(json.dumps(row))
+            finally:
+                if client:
+                    index.close()
+
+    print(json.dumps({
+        "backend": "qdrant" if client else "numpy-simulation",
+        "points": len(data),
+        "queries": len(queries),
+        "k": args.k,
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Concurrency benchmark for the async question-generation path.
+
+Runs QuestionService.generate_questions against stand-in retrieval and chat backends with
+fixed latencies and reports requests/sec at increasing numbers of in-flight requests. With
+the async path, throughput should scale roughly linearly with concurrency because requests
+overlap their network waits. ``--blocking`` makes the stand-ins sleep synchronously, which
+reproduces the old behaviour where one worker served one request at a time.
+
+    python -m benchmarks.question_concurrency --levels 1 2 4 8 16 32
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import re
+import statistics
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langchain_core.documents import Document
+
+from app.agents.graph import QuestionAgents, create_graph
+from app.services.questions_service import QuestionService
+
+
+class _Reply:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class StandInChat:
+    """Chat model stand-in whose latency is a fixed round trip plus a per-question output cost."""
+
+    def __init__(self, latency: float, blocking: bool, per_question_latency: float = 0.0):
+        self.latency = latency
+        self.blocking = blocking
+        self.per_question_latency = per_question_latency
+        self.generated = itertools.count()
+        self.calls = 0
+
+    async def _wait(self, items: int):
+        delay = self.latency + self.per_question_latency * items
+        if self.blocking:
+            time.sleep(delay)
+        else:
+            await asyncio.sleep(delay)
+
+    async def ainvoke(self, messages, **kwargs):
+        self.calls += 1
+        prompt = messages[-1].content
+        candidates = re.search(r"Candidate questions \(JSON array\): (\[.*?\])\n", prompt, re.S)
+        if candidates:
+            questions = json.loads(candidates.group(1))
+            await self._wait(len(questions))
+            return _Reply(json.dumps({"passed_questions": questions, "evaluation": "ok"}))
+        count = int(re.search(r"generate exactly (\d+)", prompt).group(1))
+        await self._wait(count)
+        return _Reply(json.dumps([f"Q{next(self.generated)}? A) a B) b C) c D) d Answer: A" for _ in range(count)]))
+
+
+class StandInVectorStore:
+    def __init__(self, latency: float, blocking: bool):
+        self.latency = latency
+        self.blocking = blocking
+
+    async def aretrieve(self, query, k=None, vector=None, with_vectors=False, filters=None):
+        if self.blocking:
+            time.sleep(self.latency)
+        else:
+            await asyncio.sleep(self.latency)
+        return [Document(page_content="Photosynthesis converts light to energy.", metadata={"source": "biology.pdf", "page": 0})]
+
+
+async def run_level(service: QuestionService, in_flight: int, rounds: int, num_questions: int) -> dict:
+    semaphore = asyncio.Semaphore(in_flight)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await service.generate_questions("photosynthesis", num_questions)
+            latencies.append(time.perf_counter() - started)
+
+    total = in_flight * rounds
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "in_flight": in_flight,
+        "requests": total,
+        "rps": round(total / elapsed, 2),
+        "p50_s": round(statistics.median(latencies), 4),
+        "p99_s": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 4),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--rounds", type=int, default=3, help="requests per in-flight slot")
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--retrieval-latency", type=float, default=0.02)
+    parser.add_argument("--num-questions", type=int, default=5)
+    parser.add_argument("--blocking", action="store_true", help="simulate the old blocking invoke() path")
+    args = parser.parse_args()
+
+    agents = QuestionAgents()
+    agents.llm = StandInChat(args.llm_latency, args.blocking)
+    service = QuestionService(
+        vectorstore=StandInVectorStore(args.retrieval_latency, args.blocking),
+        graph=create_graph(agents),
+    )
+    results = [await run_level(service, level, args.rounds, args.num_questions) for level in args.levels]
+    print(json.dumps({"blocking": args.blocking, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
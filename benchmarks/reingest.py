@@ -0,0 +1,152 @@
+"""Incremental re-ingestion of a revised book.
+
+Ingests a synthetic book into embedded Qdrant against the stand-in OpenAI server, then uploads
+it again twice under the same source name:
+
+1. ``first``: the original book, every page processed;
+2. ``same_file``: the identical file, which the manifest should skip without any model call;
+3. ``revised``: an edition with ``--edit`` pages rewritten, one page removed and one inserted
+   (so every later page moves by one), which should only process the new and edited pages.
+
+For each pass the report has the wall time, chat and embedding requests, the job's page diff
+and the points stored for the source. ``stale_points`` counts stored chunks whose text isn't on
+the pages their payload names in the current edition, and ``uncovered_chars`` the characters of
+the current edition that no stored chunk's page offsets cover; both should be 0.
+
+    python -m benchmarks.reingest --pages 40 --edit 3
+    INGEST_INCREMENTAL=false python -m benchmarks.reingest
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Any, Dict, List
+
+from benchmarks.fake_openai import add_arguments, from_args
+from benchmarks.load_test import ServerThread, add_outline, configure_environment, free_port, make_pdf, synthetic_book
+
+
+def revise(book: List[List[str]], edits: int, rng: random.Random) -> List[List[str]]:
+    """Rewrite the body of ``edits`` pages, drop one page and insert a new one near the front."""
+    revised = [list(lines) for lines in book]
+    for page in rng.sample(range(2, len(revised)), min(edits, len(revised) - 2)):
+        revised[page][1:] = [line[::-1].capitalize() for line in revised[page][1:]]
+    del revised[-2]
+    revised.insert(1, [revised[1][0]] + [f"Errata note {i}: this edition corrects earlier figures." for i in range(10)])
+    return revised
+
+
+def stored_points(vectorstore, source: str) -> List[Dict[str, Any]]:
+    from app.rag.vectorstore import build_filter
+    points, offset = [], None
+    while True:
+        records, offset = vectorstore.client.scroll(
+            collection_name=vectorstore.collection_name,
+            scroll_filter=build_filter({"source": source}),
+            limit=256,
+            offset=offset,
+            with_payload=True,
+        )
+        points.extend(record.payload for record in records)
+        if offset is None:
+            return points
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=24)
+    parser.add_argument("--lines-per-page", type=int, default=30)
+    parser.add_argument("--edit", type=int, default=2, help="pages whose text changes in the revised edition")
+    parser.add_argument("--outline", action="store_true", help="give the PDFs chapter/section bookmarks")
+    parser.add_argument("--verbose", action="store_true", help="show the app's own log output")
+    parser.add_argument("--seed", type=int, default=0)
+    add_arguments(parser)
+    args = parser.parse_args()
+    args.caches = False
+    args.qdrant_url = None
+    args.qdrant_path = None
+
+    rng = random.Random(args.seed)
+    fake = from_args(args, seed=args.seed)
+    original = synthetic_book(0, args.pages, args.lines_per_page, rng)
+    revised = revise(original, args.edit, rng)
+    editions = [("first", original), ("same_file", original), ("revised", revised)]
+
+    with tempfile.TemporaryDirectory(prefix="reingest_") as workdir, ServerThread(fake.app, free_port()) as openai_server:
+        configure_environment(args, openai_server.url, workdir)
+        from app.core.config import settings
+        from app.core.observability import configure_logging
+        from app.rag.loader import PDFLoader
+        from app.services.ingest_jobs import IngestJob
+        from app.services.ingest_service import IngestService
+        configure_logging(stream=sys.stderr)
+
+        service = IngestService()
+        source = "textbook.pdf"
+        passes = []
+        for name, book in editions:
+            path = os.path.join(workdir, f"{name}.pdf")
+            with open(path, "wb") as f:
+                f.write(add_outline(make_pdf(book), book) if args.outline else make_pdf(book))
+            job = IngestJob(id=name, filename=source, file_path=path)
+            before = Counter(fake.requests)
+            started = time.perf_counter()
+            service.process_pdf_simple_v2(path, job=job)
+            elapsed = time.perf_counter() - started
+            requests = Counter(fake.requests) - before
+
+            raw_pages = [p.page_content for p in PDFLoader.lazy_load(path)]
+            page_text = [" ".join(text.split()) for text in raw_pages]
+            points = stored_points(service.vectorstore, source)
+            stale = 0
+            for point in points:
+                first = point["metadata"].get("page")
+                last = point["metadata"].get("page_end", first)
+                valid = isinstance(first, int) and isinstance(last, int) and last < len(page_text)
+                on_pages = " ".join(page_text[first:last + 1]) if valid else ""
+                stale += " ".join(point["page_content"].split()) not in on_pages
+            covered = [bytearray(len(text)) for text in raw_pages]
+            for point in points:
+                meta = point["metadata"]
+                if meta.get("start_offset") is None or meta.get("page_end") is None:
+                    continue
+                first, last = meta["page"], meta["page_end"]
+                if first == last:
+                    covered[first][meta["start_offset"]:meta["end_offset"]] = b"\1" * (meta["end_offset"] - meta["start_offset"])
+                else:
+                    covered[first][meta["start_offset"]:] = b"\1" * (len(raw_pages[first]) - meta["start_offset"])
+                    covered[last][:meta["end_offset"]] = b"\1" * meta["end_offset"]
+            uncovered = sum(
+                1 for text, mask in zip(raw_pages, covered) for char, hit in zip(text, mask) if not hit and not char.isspace()
+            )
+            passes.append({
+                "pass": name,
+                "pages": len(book),
+                "seconds": round(elapsed, 3),
+                "chat_requests": requests.get("chat.completions", 0) + requests.get("responses", 0),
+                "embedding_requests": requests.get("embeddings", 0),
+                "chunks_added": job.chunks_processed,
+                "incremental": job.incremental,
+                "points": len(points),
+                "stale_points": stale,
+                "uncovered_chars": uncovered,
+            })
+
+    print(json.dumps({
+        "config": {
+            "pages": args.pages,
+            "edited_pages": args.edit,
+            "outline": args.outline,
+            "latency_s": args.latency,
+            "incremental": settings.INGEST_INCREMENTAL,
+        },
+        "passes": passes,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Structural vs recursive splitter on a large synthetic book.
+
+Generates ``--pages`` pages of textbook-like text (wrapped paragraphs that often run over the
+page break, numbered section headings, bullet lists, display equations and page-number footers)
+and splits the stream with both RAG_SPLITTER modes. Per splitter it reports pages/sec, chunk
+count, chunk sizes in tokens, chunks over RAG_CHUNK_TOKENS, chunks that end mid-sentence,
+chunks that end on a heading, and chunks that span a page break.
+
+    python -m benchmarks.splitter --pages 2000
+    RAG_CHUNK_TOKENS=300 python -m benchmarks.splitter --pages 500
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import textwrap
+import time
+from typing import Any, Dict, List
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langchain_core.documents import Document
+
+from app.core.config import settings
+from app.core.tokens import count_tokens
+from app.rag.splitter import TextSplitter
+
+WORDS = (
+    "energy cell membrane structure function reaction rate force motion equation graph variable "
+    "system model evidence process cycle water carbon light heat pressure volume density layer "
+    "population change pattern measure compare explain describe predict observe sample result"
+).split()
+EQUATIONS = ["F = m × a", "E = m c^2", "v = u + a t", "P = F / A", "ρ = m / V", "∑ F = 0", "Q = m c ∆T"]
+HEADING = re.compile(r"^\d+\.\d+ [A-Z]")
+SENTENCE_END = re.compile(r"[.!?:;][\"')\]]*$")
+
+
+def sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 22))).capitalize() + "."
+
+
+def synthetic_pages(pages: int, rng: random.Random, width: int = 90, lines_per_page: int = 46) -> List[Document]:
+    """Lay out a book line by line; paragraphs are wrapped and break across pages wherever they fall."""
+    lines: List[str] = []
+    section = 0
+    while len(lines) < pages * lines_per_page:
+        section += 1
+        lines.append(f"{section // 5 + 1}.{section % 5 + 1} {rng.choice(WORDS).capitalize()} and {rng.choice(WORDS)}")
+        for _ in range(rng.randint(3, 7)):
+            kind = rng.random()
+            if kind < 0.15:
+                lines.extend(f"• {sentence(rng)}" for _ in range(rng.randint(2, 5)))
+            elif kind < 0.3:
+                lines.extend(textwrap.wrap(" ".join(sentence(rng) for _ in range(2))[:-1] + " as follows", width))
+                lines.append(rng.choice(EQUATIONS))
+                lines.extend(textwrap.wrap("where " + sentence(rng).lower(), width))
+            else:
+                lines.extend(textwrap.wrap(" ".join(sentence(rng) for _ in range(rng.randint(2, 8))), width))
+    return [
+        Document(
+            page_content="\n".join(lines[i * lines_per_page:(i + 1) * lines_per_page] + [str(i + 1)]),
+            metadata={"source": "synthetic.pdf", "page": i},
+        )
+        for i in range(pages)
+    ]
+
+
+def measure(kind: str, pages: List[Document]) -> Dict[str, Any]:
+    splitter = TextSplitter(kind)
+    started = time.perf_counter()
+    chunks = list(splitter.split_iter(pages))
+    elapsed = time.perf_counter() - started
+    tokens = sorted(count_tokens(c.page_content) for c in chunks)
+    ends = [c.page_content.rstrip().split("\n")[-1] for c in chunks]
+    return {
+        "splitter": kind,
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(len(pages) / elapsed, 1) if elapsed else None,
+        "chunks": len(chunks),
+        "tokens_mean": round(statistics.fmean(tokens), 1),
+        "tokens_p95": tokens[int(len(tokens) * 0.95)],
+        "tokens_max": tokens[-1],
+        "over_budget": sum(t > settings.RAG_CHUNK_TOKENS for t in tokens),
+        "mid_sentence_ends": sum(not SENTENCE_END.search(end) and end not in EQUATIONS and not HEADING.match(end) for end in ends),
+        "heading_ends": sum(bool(HEADING.match(end)) for end in ends),
+        "cross_page_chunks": sum(c.metadata.get("page_end", c.metadata.get("page")) != c.metadata.get("page") for c in chunks),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    pages = synthetic_pages(args.pages, random.Random(args.seed))
+    count_tokens("warm up the encoding")
+    print(json.dumps({
+        "config": {
+            "pages": args.pages,
+            "RAG_CHUNK_TOKENS": settings.RAG_CHUNK_TOKENS,
+            "RAG_CHUNK_OVERLAP_TOKENS": settings.RAG_CHUNK_OVERLAP_TOKENS,
+            "RAG_CHUNK_SIZE": settings.RAG_CHUNK_SIZE,
+            "RAG_CHUNK_OVERLAP": settings.RAG_CHUNK_OVERLAP,
+        },
+        "results": [measure("recursive", pages), measure("structural", pages)],
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Import and startup time benchmark.
+
+Measures, each in a fresh interpreter:
+- ``import main``: what uvicorn pays before it can accept connections. Services are built lazily by
+  the app registry, so this no longer imports langchain, qdrant, langgraph or pypdf.
+- importing the service modules, which the registry defers to warm-up or the first request.
+- importing main and running the FastAPI lifespan hook (registry creation, no network round trips).
+
+    python -m benchmarks.startup_time --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SNIPPETS = {
+    "import_main_s": "import main",
+    "import_services_s": (
+        "import app.services.ingest_service, app.services.questions_service, app.agents.graph"
+    ),
+    "import_and_lifespan_s": (
+        "import asyncio, main\n"
+        "async def run():\n"
+        "    async with main.lifespan(main.app):\n"
+        "        pass\n"
+        "asyncio.run(run())"
+    ),
+}
+
+
+def time_snippet(snippet: str) -> float:
+    code = (
+        "import time\n"
+        "started = time.perf_counter()\n"
+        f"{snippet}\n"
+        "print(time.perf_counter() - started)\n"
+    )
+    env = dict(os.environ, OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "sk-benchmark"), STARTUP_WARMUP="false")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, env=env)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    report = {}
+    for name, snippet in SNIPPETS.items():
+        samples = [time_snippet(snippet) for _ in range(args.repeat)]
+        report[name] = round(statistics.median(samples), 4)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Schema-validated reply parsing against the old json_repair-first helper.
+
+Builds replies of the shapes the prompts ask for (TOC, single and packed chunk enrichment, book
+subject, visual description, MCQs, evaluator verdicts) and malformed variants of each: wrapped
+in a code fence, surrounded by prose, after bracketed citations, with a trailing comma, cut off
+mid-string, valid JSON of the wrong shape (the answer nested under another key), or no JSON at
+all. Each reply is parsed by:
+
+- ``legacy``: the old ``safe_load_json``, which hands every reply to json_repair (recent
+  json_repair versions try ``json.loads`` themselves first, so well-formed replies are cheap
+  either way);
+- ``load_json``: the new strict-first loader alone;
+- ``parse_reply``: ``load_json`` plus validation against the reply's schema.
+
+Per variant it reports microseconds per reply and how many replies gave usable data (a dict or
+list for ``legacy``, a validated model for ``parse_reply``), plus the outcomes parse_reply
+counts in ``rag_llm_parse_total``. The ``mix`` row weighs the variants like a run where
+``--malformed`` of the replies are broken, which without structured outputs is the common case.
+
+    python -m benchmarks.structured_parsing
+    python -m benchmarks.structured_parsing --repeat 50 --malformed 0.2
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import time
+from collections import Counter
+from importlib import metadata
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from pydantic import BaseModel, ValidationError
+
+from app.core.structured import parse_reply
+from app.schemas.llm import (BookSubject, ChunkEnrichment, PackedEnrichment, QuestionBatch, QuestionEvaluation,
+                             TableOfContents, VisualDescription)
+from benchmarks.fake_openai import FakeOpenAI
+from utils.helpers import _json_repair_loads, load_json
+
+WORDS = "energy cell membrane force motion equation graph variable system model evidence process cycle".split()
+
+
+def legacy_safe_load_json(s: Optional[str]):
+    """``utils.helpers.safe_load_json`` before the strict-first loader."""
+    if not s:
+        return None
+    if _json_repair_loads is not None:
+        try:
+            return _json_repair_loads(s)
+        except Exception:
+            pass
+    try:
+        return json.loads(s)
+    except Exception:
+        return None
+
+
+def text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def replies(rng: random.Random) -> List[Tuple[type, str]]:
+    pages = [text(rng, rng.randint(150, 400)) for _ in range(4)]
+    questions = [f"What does {text(rng, 6)[:-1]} show? A) one B) two C) three D) four Answer: A" for _ in range(5)]
+    return [
+        (TableOfContents, json.dumps({
+            "is_table_of_contents": True,
+            "entries": [
+                {"chapter_number": str(c), "chapter_title": text(rng, 3), "section_title": text(rng, 4), "page_number": str(10 * c + s)}
+                for c in range(1, 9) for s in range(4)
+            ],
+            "notes": None,
+        })),
+        (ChunkEnrichment, json.dumps(FakeOpenAI._taxonomy(pages[0]))),
+        (PackedEnrichment, json.dumps([{"id": i, **FakeOpenAI._taxonomy(p, descriptions=False)} for i, p in enumerate(pages)])),
+        (BookSubject, json.dumps({"subject": "Biology"})),
+        (VisualDescription, json.dumps({"summary": text(rng, 20), "details": text(rng, 120)})),
+        (QuestionBatch, json.dumps(questions)),
+        (QuestionEvaluation, json.dumps({"passed_questions": questions[:1], "failed": [], "evaluation": text(rng, 15)})),
+    ]
+
+
+VARIANTS: Dict[str, Callable[[str], str]] = {
+    "well_formed": lambda s: s,
+    "code_fence": lambda s: f"```json\n{s}\n```",
+    "prose": lambda s: f"Here is the JSON you asked for:\n{s}\nLet me know if you need anything else.",
+    "citation": lambda s: f"Based on the page text [1] and the TOC [2], the answer is:\n{s}",
+    "trailing_comma": lambda s: s[:-1] + ",\n" + s[-1],
+    "truncated": lambda s: s[:int(len(s) * 0.8)],
+    "nested": lambda s: json.dumps({"response": json.loads(s)}),
+    "not_json": lambda s: "I could not find any structured content on this page.",
+}
+
+
+def fits(model: type, value: Any) -> bool:
+    try:
+        model.model_validate(value)
+    except ValidationError:
+        return False
+    return True
+
+
+def timed(fn: Callable[[], Any], repeat: int) -> Tuple[Any, float]:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - started) / repeat * 1e6
+
+
+def measure(samples: List[Tuple[type, str]], variant: str, repeat: int) -> Dict[str, Any]:
+    make = VARIANTS[variant]
+    legacy_us = loader_us = parse_us = 0.0
+    legacy_ok = parse_ok = 0
+    outcomes: Counter = Counter()
+    for model, reply in samples:
+        reply = make(reply)
+        value, us = timed(lambda: legacy_safe_load_json(reply), repeat)
+        legacy_us += us
+        legacy_ok += isinstance(value, (dict, list)) and bool(value)
+        _, us = timed(lambda: load_json(reply), repeat)
+        loader_us += us
+        parsed, us = timed(lambda: parse_reply(reply, model), repeat)
+        parse_us += us
+        parse_ok += isinstance(parsed, BaseModel)
+        # the step that read the reply for parse_reply, which passes the schema to load_json
+        how = load_json(reply, accept=lambda v: fits(model, v))[1]
+        outcomes[how if parsed is not None or how == "failed" else "invalid"] += 1
+    n = len(samples)
+    return {
+        "variant": variant,
+        "replies": n,
+        "legacy_us": round(legacy_us / n, 1),
+        "load_json_us": round(loader_us / n, 1),
+        "parse_reply_us": round(parse_us / n, 1),
+        "speedup": round(legacy_us / parse_us, 1) if parse_us else None,
+        "legacy_usable": legacy_ok,
+        "parse_reply_usable": parse_ok,
+        "outcomes": dict(outcomes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20, help="timed parses per reply")
+    parser.add_argument("--malformed", type=float, default=0.05, help="share of broken replies in the mix row")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    # unusable replies are logged as warnings; they are the point here
+    logging.getLogger("app").setLevel(logging.ERROR)
+
+    samples = replies(random.Random(args.seed))
+    rows = [measure(samples, variant, args.repeat) for variant in VARIANTS]
+    broken = [r for r in rows if r["variant"] != "well_formed"]
+    weights = [(rows[0], 1 - args.malformed)] + [(r, args.malformed / len(broken)) for r in broken]
+    mix = {
+        "variant": "mix",
+        "malformed": args.malformed,
+        **{key: round(sum(r[key] * w for r, w in weights), 1) for key in ("legacy_us", "load_json_us", "parse_reply_us")},
+    }
+    mix["speedup"] = round(mix["legacy_us"] / mix["parse_reply_us"], 1) if mix["parse_reply_us"] else None
+    try:
+        json_repair_version = metadata.version("json_repair")
+    except metadata.PackageNotFoundError:
+        json_repair_version = None
+    print(json.dumps({
+        "config": {"repeat": args.repeat, "seed": args.seed, "json_repair": json_repair_version},
+        "results": rows + [mix],
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,81 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response
 from app.api.v1.router import api_router
 from app.core.config import settings
+from app.core.observability import HTTP_SECONDS, configure_logging
+from app.core.registry import ClientRegistry
+
+configure_logging()
+logger = logging.getLogger("app.main")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    registry = ClientRegistry()
+    registry.bind_loop(asyncio.get_running_loop())
+    app.state.registry = registry
+    app.state.startup_seconds = time.perf_counter() - started
+    logger.info("Startup completed", extra={"startup_ms": round(app.state.startup_seconds * 1000, 1)})
+    warmup = None
+    if settings.STARTUP_WARMUP:
+        # build services off the request path so the first request doesn't pay for it
+        warmup = asyncio.create_task(asyncio.to_thread(registry.warm_up))
+    yield
+    if warmup is not None and not warmup.done():
+        await warmup
+    await registry.aclose()
+
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan,
 )
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # the route template, not the raw path, so job ids don't explode the label set
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_SECONDS.labels(request.method, route, str(status)).observe(time.perf_counter() - started)
+
+
 @app.get("/")
 async def root():
     return {"message": f"Welcome to {settings.PROJECT_NAME}"}
+
+
+@app.get("/health")
+async def health(request: Request):
+    registry = request.app.state.registry
+    return {
+        "status": "ok",
+        "startup_seconds": request.app.state.startup_seconds,
+        "pools": registry.pool_stats(),
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, REGISTRY, generate_latest
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        # several uvicorn/gunicorn workers: aggregate the per-process metric files
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
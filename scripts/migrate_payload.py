@@ -0,0 +1,132 @@
+"""Rewrite the points of the content collection to the compact payload layout.
+
+The payload is replaced (see ``app/rag/payload.py``): the duplicated ``full_content`` text, the
+nested per-subtopic descriptions and the PDF-loader metadata are dropped. A point whose stored
+text stays the same keeps its vectors and only gets the new payload. Legacy points whose text
+changes (their vectors were built from the summary) or whose id isn't the content-hash id that
+ingest uses are re-embedded, dense and BM25 sparse, and stored under that id, and the old point
+is deleted; otherwise the next ingest of the same source would add duplicates. Afterwards the collection is switched to on-disk payload, memory-mapped
+vectors and the configured quantization (``QDRANT_ON_DISK_PAYLOAD``, ``QDRANT_ON_DISK_VECTORS``,
+``QDRANT_QUANTIZATION``); Qdrant rebuilds the quantized copy in the background. Safe to re-run;
+points already in the compact layout under their content-hash id are left untouched.
+
+    python -m scripts.migrate_payload --dry-run
+    python -m scripts.migrate_payload --batch-size 256
+"""
+import argparse
+import json
+import logging
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+from langchain_core.documents import Document
+from langchain_qdrant import QdrantVectorStore
+from qdrant_client import QdrantClient, models
+
+from app.core.cache import SQLiteCache
+from app.core.config import settings
+from app.core.observability import configure_logging
+from app.core.qdrant import make_qdrant_client
+from app.rag.payload import compact_document
+from app.rag.vectorstore import CONTENT_VERSIONS_NAMESPACE, VectorStoreManager, document_point_id, quantization_config
+
+logger = logging.getLogger("scripts.migrate_payload")
+
+
+def _size(payload: Dict[str, Any]) -> int:
+    return len(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+
+def compact_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    doc = Document(
+        page_content=payload.get(QdrantVectorStore.CONTENT_KEY) or "",
+        metadata=payload.get(QdrantVectorStore.METADATA_KEY) or {},
+    )
+    compact = compact_document(doc)
+    return {QdrantVectorStore.CONTENT_KEY: compact.page_content, QdrantVectorStore.METADATA_KEY: compact.metadata}
+
+
+def migrate_points(client: QdrantClient, collection_name: str, batch_size: int = 256, dry_run: bool = False,
+                   store: Optional[VectorStoreManager] = None) -> Dict[str, int]:
+    """Compact every point's payload; ``store`` re-embeds the points that need a new id or vectors."""
+    stats = {"scanned": 0, "rewritten": 0, "reembedded": 0, "bytes_before": 0, "bytes_after": 0}
+    # re-embedded points can come up again later in the scroll
+    migrated: set = set()
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=False,
+        )
+        operations = []
+        reembed: List[Document] = []
+        replaced: List[Any] = []
+        for point in points:
+            if str(point.id) in migrated:
+                continue
+            payload = point.payload or {}
+            compact = compact_payload(payload)
+            text = compact[QdrantVectorStore.CONTENT_KEY]
+            doc = Document(page_content=text, metadata=compact[QdrantVectorStore.METADATA_KEY])
+            stats["scanned"] += 1
+            stats["bytes_before"] += _size(payload)
+            stats["bytes_after"] += _size(compact)
+            if str(point.id) != document_point_id(doc) or text != (payload.get(QdrantVectorStore.CONTENT_KEY) or ""):
+                reembed.append(doc)
+                replaced.append(point.id)
+            elif compact != payload:
+                operations.append(models.OverwritePayloadOperation(
+                    overwrite_payload=models.SetPayload(payload=compact, points=[point.id]),
+                ))
+        if not dry_run:
+            if operations:
+                client.batch_update_points(collection_name=collection_name, update_operations=operations, wait=True)
+            if reembed:
+                written = set(store.add_documents(reembed))
+                migrated.update(written)
+                stale = [point_id for point_id in replaced if str(point_id) not in written]
+                if stale:
+                    client.delete(collection_name=collection_name, points_selector=models.PointIdsList(points=stale), wait=True)
+        stats["rewritten"] += len(operations)
+        stats["reembedded"] += len(reembed)
+        logger.info("Migrated batch", extra={k: stats[k] for k in ("scanned", "rewritten", "reembedded")})
+        if offset is None:
+            return stats
+
+
+def update_storage(client: QdrantClient, collection_name: str):
+    client.update_collection(
+        collection_name=collection_name,
+        collection_params=models.CollectionParamsDiff(on_disk_payload=settings.QDRANT_ON_DISK_PAYLOAD),
+        vectors_config={"": models.VectorParamsDiff(on_disk=settings.QDRANT_ON_DISK_VECTORS)},
+        quantization_config=quantization_config() or models.Disabled.DISABLED,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collection", default=settings.QDRANT_COLLECTION_NAME)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--dry-run", action="store_true", help="report the size change without writing anything")
+    args = parser.parse_args()
+    configure_logging()
+
+    client = make_qdrant_client()
+    store = None if args.dry_run else VectorStoreManager(client=client, collection_name=args.collection)
+    stats = migrate_points(client, args.collection, batch_size=args.batch_size, dry_run=args.dry_run, store=store)
+    if not args.dry_run:
+        update_storage(client, args.collection)
+        if stats["rewritten"] or stats["reembedded"]:
+            # served answers were built from the old payloads; let semantic caches drop them
+            versions = SQLiteCache(settings.CACHE_DB_PATH, namespace=CONTENT_VERSIONS_NAMESPACE)
+            versions.set(args.collection, uuid4().hex.encode("utf-8"))
+    saved = stats["bytes_before"] - stats["bytes_after"]
+    stats["saved_pct"] = round(100.0 * saved / stats["bytes_before"], 1) if stats["bytes_before"] else 0.0
+    print(json.dumps({"collection": args.collection, "dry_run": args.dry_run, **stats}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
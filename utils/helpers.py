@@ -1,7 +1,9 @@
-from typing import Optional
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple, TypeVar
 import json
+import re
 import base64
 import io
+from itertools import islice
 
 try:
     # json_repair is helpful for recovering malformed JSON strings
@@ -10,31 +12,100 @@ except Exception:
     _json_repair_loads = None
 
 
-def safe_load_json(s: Optional[str]) -> Optional[dict]:
-    """Attempt to load JSON safely.
+_JSON_START = re.compile(r"[\[{]")
+_decoder = json.JSONDecoder()
+
+
+def _embedded_json(s: str) -> Iterator[Tuple[Any, int]]:
+    """Every JSON object or array in ``s`` as ``(value, length)``, left to right.
+
+    Values nested in one already found are not yielded again.
+    """
+    end = 0
+    for match in _JSON_START.finditer(s):
+        if match.start() < end:
+            continue
+        try:
+            value, end = _decoder.raw_decode(s, match.start())
+        except ValueError:
+            continue
+        yield value, end - match.start()
+
+
+def load_json(s: Optional[str], accept: Optional[Callable[[Any], bool]] = None) -> Tuple[Any, str]:
+    """Parse a model reply as JSON, cheapest way first.
 
-    Tries json_repair first (if available) to recover malformed JSON, then falls
-    back to the stdlib json.loads. Returns None if parsing fails or input is falsy.
+    Returns ``(value, how)`` where ``how`` is ``strict`` (the reply is JSON), ``extracted`` (JSON
+    inside a code fence or surrounded by prose), ``repaired`` (recovered by json_repair) or
+    ``failed``, with ``value`` None. json_repair is much slower than the stdlib parser, so it only
+    runs on replies the first two steps can't read.
+
+    Prose can hold more than one bracketed value ("see [1] ... {...}"), and a broken object still
+    holds intact nested ones. With ``accept``, the first embedded value it takes is returned,
+    then json_repair's value if it takes that; without, the longest embedded value. If nothing
+    is accepted the longest value found is returned anyway, for the caller to reject.
     """
     if not s:
-        return None
+        return None, "failed"
+    try:
+        return json.loads(s), "strict"
+    except ValueError:
+        pass
+    longest: Optional[Tuple[Any, int]] = None
+    for value, length in _embedded_json(s):
+        if accept is not None and accept(value):
+            return value, "extracted"
+        if longest is None or length > longest[1]:
+            longest = (value, length)
+    if longest is not None and accept is None:
+        return longest[0], "extracted"
+    repaired = None
     if _json_repair_loads is not None:
         try:
-            return _json_repair_loads(s)
+            repaired = _json_repair_loads(s)
         except Exception:
-            pass
-    try:
-        return json.loads(s)
-    except Exception:
-        return None
+            repaired = None
+    # json_repair turns text without any JSON into ""
+    repaired_ok = isinstance(repaired, (dict, list))
+    if repaired_ok and (accept is None or accept(repaired)):
+        return repaired, "repaired"
+    if longest is not None:
+        return longest[0], "extracted"
+    if repaired_ok:
+        return repaired, "repaired"
+    return None, "failed"
+
+
+def safe_load_json(s: Optional[str]) -> Optional[dict]:
+    """Attempt to load JSON safely; None if parsing fails or input is falsy.
+
+    See ``load_json``: strict parse first, then JSON embedded in text, then json_repair.
+    """
+    return load_json(s)[0]
 
 
-def pil_image_to_base64(img, fmt: str = "PNG") -> str:
+def pil_image_to_base64(img, fmt: str = "PNG", quality: Optional[int] = None) -> str:
     """Convert a PIL Image to a base64-encoded string (PNG by default).
 
-    Keeps the logic centralized so other modules can reuse it.
+    ``quality`` applies to lossy formats (JPEG, WEBP). Keeps the logic centralized so other
+    modules can reuse it.
     """
     buffered = io.BytesIO()
-    img.save(buffered, format=fmt)
+    options = {"quality": quality} if quality is not None else {}
+    img.save(buffered, format=fmt, **options)
     img_bytes = buffered.getvalue()
     return base64.b64encode(img_bytes).decode("utf-8")
+
+
+T = TypeVar("T")
+
+
+def batched(iterable: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Yield lists of up to ``size`` items from ``iterable`` without materialising it."""
+    iterator = iter(iterable)
+    size = max(1, size)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
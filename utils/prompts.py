@@ -111,6 +111,94 @@ Extracted raw text of the page is:
 """
 
 
+BOOK_SUBJECT_PROMPT = """
+You are a strict educational document classifier.
+
+You will receive the chapter titles of a book and the raw text of its first pages.
+Name the broad academic field of the book (e.g., Math, Physics, Chemistry, Biology, History, Geography, Computer Science).
+
+Rules:
+- Use ONLY the provided titles and text.
+- Do NOT use a chapter or section title as the subject.
+- If the subject cannot be determined with high confidence, set subject = null.
+- Return JSON only.
+
+Return ONLY valid JSON with this schema:
+
+{{
+  "subject": "string | null"
+}}
+
+The chapter titles are:
+{chapters}
+
+The raw text of the first pages is:
+{page_text}
+"""
+
+
+PAGE_CHUNKS_PACKED_PROMPT = """
+You are a strict educational document classifier.
+
+You will receive:
+1) The extracted Table of Contents / Index (if available).
+2) Several chunks of raw text from a book, each with an integer "id".
+
+IMPORTANT TAXONOMY RULES:
+- The hierarchy MUST be: Subject > Topic > Subtopic.
+- Subject is the broad academic field (e.g., Math, Physics, Chemistry, Biology, History, Geography, Computer Science).
+- Topic is the branch inside the subject (e.g., Algebra, Calculus, Geometry for Math).
+- Subtopic is the specific lesson or section title (e.g., Simplifying Expressions).
+- NEVER use a chapter name or section title as Subject.
+- NEVER collapse Topic into Subject.
+- Prefer TOC hierarchy over page titles.
+
+Your job, for EACH chunk independently:
+- Work ONLY with that chunk's text and the TOC.
+- Do NOT use any external knowledge.
+- Do NOT merge content from other chunks.
+- Map Subject → Topic → Subtopic using the TOC and the chunk's headings.
+- If Subject cannot be determined with high confidence from TOC or chunk context, set subject = null.
+- If Topic cannot be determined clearly, set topic_name = null and confidence = "uncertain".
+- If Subtopic cannot be determined clearly, set subtopic_name = null and confidence = "uncertain".
+
+Return ONLY a valid JSON array with exactly one object per chunk, in the input order:
+
+[
+  {{
+    "id": 0,
+    "subject": "string | null",
+    "topics": [
+      {{
+        "topic_name": "string | null",
+        "confidence": "high | medium | low | uncertain",
+        "subtopics": [
+          {{
+            "subtopic_name": "string | null",
+            "confidence": "high | medium | low | uncertain"
+          }}
+        ]
+      }}
+    ]
+  }}
+]
+
+Hard Rules:
+- Copy each chunk's "id" exactly; do not skip chunks.
+- Do not invent subtopics not present in the chunk or TOC.
+- Do not split content into artificial subtopics.
+- Do not infer missing hierarchy.
+- Do not repeat the chunk text.
+- Return JSON only.
+
+The extracted table of contents / index is:
+{toc_json}
+
+The chunks (a JSON array of {{"id": integer, "text": string}}) are:
+{chunks_json}
+"""
+
+
 
 
 
@@ -248,28 +336,45 @@ VISUAL_ANALYST_PROMPT = (
 
 
 # Generator prompt template for MCQs. Use .format(remaining=..., context=..., query=...)
+# Instructions and context come first and the per-call parts last, so repeated calls for one
+# request share a long identical prefix that providers can serve from their prompt cache.
 MCQ_GENERATOR_PROMPT = (
-    "You are an expert educator. Based on the following context, generate exactly {remaining} "
-    "Multiple Choice Questions (MCQs).\n\n"
-    "Context: {context}\n"
-    "Topic/Query: {query}\n\n"
+    "You are an expert educator. Based on the context below, generate Multiple Choice Questions (MCQs).\n"
     "Produce only MCQs. For each MCQ include 4 options labeled A) through D) and indicate the correct answer.\n"
     "Return the questions as a JSON array of strings exactly, for example:\n"
     "[\"What is X? A) ... B) ... C) ... D) ... Answer: B\", \"What is Y? A) ... B) ... C) ... D) ... Answer: A\"]\n\n"
     "Each string must contain the question text, the four options, and the answer as shown above. "
-    "Do not include any additional text outside the JSON array."
+    "Do not include any additional text outside the JSON array.\n\n"
+    "Context: {context}\n\n"
+    "Topic/Query: {query}\n"
+    "Now generate exactly {remaining} MCQs."
+)
+
+
+# Appended to MCQ_GENERATOR_PROMPT when generation is sharded across parallel calls.
+# Use .format(shard_number=..., shard_total=...)
+MCQ_SHARD_HINT = (
+    "\n\nYou are writer {shard_number} of {shard_total} generating questions in parallel from the same context. "
+    "Prefer facts from part {shard_number} of {shard_total} of the context so the writers cover different material."
+)
+
+
+# Appended to MCQ_GENERATOR_PROMPT on later rounds. Use .format(accepted_json=...)
+MCQ_AVOID_HINT = (
+    "\n\nThese questions were already accepted; do not repeat or paraphrase them: {accepted_json}"
 )
 
 
 # Evaluator prompt template. Use .format(context=..., questions_json=...)
+# The candidates go last so every evaluator call for a request shares the context prefix.
 EVALUATOR_PROMPT = (
     "You are a strict quality controller for educational content.\n\n"
-    "Context: {context}\n"
-    "Candidate questions (JSON array): {questions_json}\n\n"
     "For each candidate question, determine if it is accurate and pedagogically sound according to the context.\n"
     "Return a JSON object with these fields:\n"
     "{{\n  \"passed_questions\": [ ... ],   # array of question strings that are acceptable\n"
     "  \"failed\": [ ... ],            # array of question strings that failed\n"
     "  \"evaluation\": \"...\"          # human-readable summary\n}}\n\n"
-    "Only return valid JSON."
+    "Only return valid JSON.\n\n"
+    "Context: {context}\n\n"
+    "Candidate questions (JSON array): {questions_json}\n"
 )